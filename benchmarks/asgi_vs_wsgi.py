@@ -0,0 +1,163 @@
+"""
+Load benchmark of the public CMS pages under WSGI and ASGI.
+
+Builds a fresh SQLite fixture, then serves the project once with a
+threaded WSGI server (gunicorn, or uvicorn's WSGI interface when gunicorn
+is missing) and once with uvicorn running venuenouveau.asgi, and drives
+both with the same keep-alive HTTP load. Reports requests/sec and
+p50/p99 latency for each.
+
+    python -m benchmarks.asgi_vs_wsgi --duration 20 --concurrency 64
+    python -m benchmarks.asgi_vs_wsgi --no-cache   # measure uncached renders
+
+Requires uvicorn (and optionally gunicorn) to be installed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PATHS = ['/cms/', '/cms/page/trendy-offers/', '/cms/page/page-0/', '/cms/page/page-1/']
+
+
+def build_fixture(db_path, media_root):
+    os.environ['BENCH_DB'] = str(db_path)
+    os.environ['BENCH_MEDIA_ROOT'] = str(media_root)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    from benchmarks.fixtures import create_fixture
+
+    call_command('migrate', verbosity=0)
+    create_fixture()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(kind, port, concurrency):
+    if kind == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'venuenouveau.asgi:application',
+                '--port', str(port), '--workers', '1', '--log-level', 'warning', '--no-access-log']
+    if shutil.which('gunicorn'):
+        return ['gunicorn', 'venuenouveau.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                '--workers', '1', '--threads', str(concurrency), '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'venuenouveau.wsgi:application', '--interface', 'wsgi',
+            '--port', str(port), '--workers', '1', '--log-level', 'warning', '--no-access-log']
+
+
+async def _get(reader, writer, path):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n'.encode())
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(port, deadline, latencies, errors, offset):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            path = PATHS[i % len(PATHS)]
+            i += 1
+            start = time.perf_counter()
+            status = await _get(reader, writer, path)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(port, duration, concurrency):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        _client(port, deadline, latencies, errors, i) for i in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def bench(kind, env, args):
+    port = free_port()
+    server = subprocess.Popen(server_command(kind, port, args.concurrency), cwd=ROOT, env=env)
+    try:
+        wait_for_port(port)
+        asyncio.run(run_load(port, 2, args.concurrency))  # warm-up
+        latencies, errors = asyncio.run(run_load(port, args.duration, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    return {
+        'server': kind,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10, help="Seconds of load per server")
+    parser.add_argument('--concurrency', type=int, default=32, help="Concurrent keep-alive connections")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the page cache")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'bench.sqlite3'
+        build_fixture(db_path, Path(tmp) / 'media')
+
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings')
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT), env.get('PYTHONPATH')]))
+        if args.no_cache:
+            env['BENCH_CACHE'] = '0'
+        results = [bench(kind, env, args) for kind in ('wsgi', 'asgi')]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'server':<8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['server']:<8}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
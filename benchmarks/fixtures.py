@@ -0,0 +1,49 @@
+"""
+Synthetic data for the benchmarks.
+"""
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from cms.models import GalleryItem, Page, PricingPackage, PricingPackageVersion, Year
+from cms.text import page_text, render_content
+
+# Roughly the size of an imported scraped page body
+PAGE_BODY = '<section><h2>Venue</h2>' + '<p>Ceremony and reception on the lawn.</p>' * 400 + '</section>'
+
+
+def create_fixture(pages=20, packages=12, versions=4, gallery_items=0):
+    """
+    Creates a home page, the trendy-offers pricing page, ``pages`` further
+    public pages, ``gallery_items`` gallery items spread over those pages
+    and ``packages`` approved packages with ``versions`` each.
+    """
+    Page.objects.create(title='Home', slug='home', content=PAGE_BODY)
+    Page.objects.create(title='Trendy Offers', slug='trendy-offers', content=PAGE_BODY)
+    # bulk_create() skips Page.save(), which fills search_text and the rendered body
+    Page.objects.bulk_create(
+        Page(title=f'Page {i}', slug=f'page-{i}', content=PAGE_BODY, search_text=page_text(PAGE_BODY),
+             **render_content(PAGE_BODY))
+        for i in range(pages)
+    )
+
+    page_ids = list(Page.objects.values_list('id', flat=True))
+    # Items share one stored file; only the rows matter to the read path
+    media = default_storage.save('gallery_media/item.gif', ContentFile(b'GIF89a')) if gallery_items else ''
+    GalleryItem.objects.bulk_create(
+        GalleryItem(page_id=page_ids[i % len(page_ids)], media_file=media, caption=f'Item {i}')
+        for i in range(gallery_items)
+    )
+
+    year, _ = Year.objects.get_or_create(year=2025)
+    segments = [choice for choice, _ in PricingPackage.SEGMENT_CHOICES]
+    for i in range(packages):
+        package = PricingPackage.objects.create(
+            segment=segments[i % len(segments)], year=year, package_name=f'Package {i}',
+            file=ContentFile(b'%PDF-1.4 benchmark ' + str(i).encode(), name=f'package-{i}.pdf'),
+            current_version=versions, approved=True,
+        )
+        for number in range(1, versions + 1):
+            PricingPackageVersion.objects.create(
+                pricing_package=package, version=number, package_name=package.package_name,
+                file=package.file, uploader='bench', approved=True,
+            )
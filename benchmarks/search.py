@@ -0,0 +1,124 @@
+"""
+Benchmark of page search on a synthetic corpus.
+
+Creates ``--pages`` pages of generated venue copy in a fresh SQLite
+database, timing how long the full-text index takes to build, then runs
+the same queries through ``cms.search.search_pages`` (indexed) and through
+a naive ``content__icontains`` scan. Reports p50/p99 latency of each query both ways.
+
+    python -m benchmarks.search --pages 10000 --repeat 20
+
+PostgreSQL can be measured by pointing DJANGO_SETTINGS_MODULE at settings
+with a PostgreSQL database; the indexed path then uses the tsvector column.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+QUERIES = ['weekday', 'ceremony', 'weekday ceremony', 'garden reception', 'winter wedding', 'buffet']
+
+WORDS = (
+    'venue lawn garden terrace hall marquee reception dinner buffet canapes champagne '
+    'guests seating tables chairs lighting music band florist bouquet photographer '
+    'parking accommodation bridal suite catering menu dessert cake evening afternoon '
+    'summer autumn spring winter weekend saturday sunday friday booking deposit '
+    'package offer discount price rate hire exclusive private celebration party'
+).split()
+
+# Rare terms, so queries return a realistic handful of pages
+RARE_WORDS = ['weekday', 'ceremony', 'wedding']
+
+
+def paragraph(rng, words=60):
+    text = rng.choices(WORDS, k=words)
+    if rng.random() < 0.005:
+        text[rng.randrange(words)] = rng.choice(RARE_WORDS)
+    return '<p>%s.</p>' % ' '.join(text).capitalize()
+
+
+def build_corpus(pages, seed=0):
+    from cms.models import Page
+    from cms.text import page_text
+
+    rng = random.Random(seed)
+    batch, start = [], time.perf_counter()
+    for i in range(pages):
+        content = '<section><h2>%s</h2>%s</section>' % (
+            rng.choice(WORDS).title(), ''.join(paragraph(rng) for _ in range(rng.randint(3, 12))),
+        )
+        batch.append(Page(title=f'Page {i}', slug=f'page-{i}', content=content, search_text=page_text(content)))
+        if len(batch) == 1000:
+            Page.objects.bulk_create(batch)
+            batch = []
+    Page.objects.bulk_create(batch)
+    return time.perf_counter() - start
+
+
+def timings(func, query, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(query)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples) * 1000, 2),
+        'p99_ms': round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=10000, help="Pages in the synthetic corpus")
+    parser.add_argument('--repeat', type=int, default=10, help="Runs of each query")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault('BENCH_DB', str(Path(tmp) / 'search.sqlite3'))
+        os.environ.setdefault('BENCH_MEDIA_ROOT', str(Path(tmp) / 'media'))
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+        import django
+        from django.core.management import call_command
+
+        django.setup()
+        from cms.models import Page
+        from cms.search import search_pages
+
+        call_command('migrate', verbosity=0)
+        build_seconds = build_corpus(args.pages)
+
+        def naive(query):
+            return list(Page.objects.filter(is_public=True, content__icontains=query).values('title', 'slug')[:20])
+
+        results = {
+            'pages': args.pages,
+            'index_build_s': round(build_seconds, 2),
+            'queries': {
+                query: {
+                    'hits': len(search_pages(query, limit=args.pages)),
+                    'indexed': timings(search_pages, query, args.repeat),
+                    'icontains': timings(naive, query, args.repeat),
+                }
+                for query in QUERIES
+            },
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.pages} pages, corpus and index built in {results['index_build_s']}s")
+    print(f"{'query':<20}{'hits':>7}{'indexed p50/p99 ms':>22}{'icontains p50/p99 ms':>24}")
+    for query, r in results['queries'].items():
+        indexed = '%s / %s' % (r['indexed']['p50_ms'], r['indexed']['p99_ms'])
+        naive = '%s / %s' % (r['icontains']['p50_ms'], r['icontains']['p99_ms'])
+        print(f"{query:<20}{r['hits']:>7}{indexed:>22}{naive:>24}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""
+Settings for the benchmarks: the project settings on a local SQLite fixture.
+
+The database file defaults to benchmarks/bench.sqlite3 and can be moved with
+BENCH_DB; uploaded fixture files go to BENCH_MEDIA_ROOT. Set BENCH_CACHE=0
+to measure uncached renders.
+"""
+import os
+
+from venuenouveau.settings import *  # noqa: F401,F403
+from venuenouveau.settings import BASE_DIR
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB', BASE_DIR / 'benchmarks' / 'bench.sqlite3'),
+    }
+}
+
+MEDIA_ROOT = os.environ.get('BENCH_MEDIA_ROOT', BASE_DIR / 'benchmarks' / 'media')
+
+if os.environ.get('BENCH_CACHE') == '0':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
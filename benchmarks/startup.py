@@ -0,0 +1,182 @@
+"""
+Cold-start benchmark: how long a fresh worker process takes to boot the
+project and answer its first request, per settings profile.
+
+Every run starts a new interpreter under ``python -X importtime`` that
+loads the WSGI application and serves one GET through it, and reports:
+
+    total ms          process start to first response, as seen from outside
+    import ms         time spent importing modules (top-level imports summed)
+    app ms            get_wsgi_application(): django.setup() and middleware
+    first request ms  the first response, including the lazily imported
+                      URLconf and views
+    modules           number of modules imported by then
+
+    python -m benchmarks.startup                     # both profiles
+    python -m benchmarks.startup --profile public    # CMS_PUBLIC_ONLY=1 only
+    python -m benchmarks.startup --check             # exit 1 over budget
+
+The public profile must answer within BUDGET_MS without importing any of
+PUBLIC_FORBIDDEN_MODULES. cms.tests enforces the imports, which do not
+depend on the machine; ``--check`` enforces both. Timings are medians of
+``--runs`` runs and only comparable on the same machine.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROFILES = {
+    'full': {'CMS_PUBLIC_ONLY': '0'},
+    'public': {'CMS_PUBLIC_ONLY': '1'},
+}
+
+# Process start to first response of a public-only node
+BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', 1000))
+
+# Modules a public-only node must not load to serve a page
+PUBLIC_FORBIDDEN_MODULES = (
+    'django.contrib.admin', 'django.contrib.sessions', 'django.contrib.messages',
+    'django.test', 'pypdfium2', 'PIL',
+)
+
+BOOT = """
+import json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+loaded = time.perf_counter()
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+    'wsgi.url_scheme': 'http', 'wsgi.input': sys.stdin.buffer, 'wsgi.errors': sys.stderr,
+}
+b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({
+    'status': int(status[0].split()[0]),
+    'app_ms': (loaded - started) * 1000,
+    'first_request_ms': (done - loaded) * 1000,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def import_time_ms(stderr):
+    """
+    Total import time from ``-X importtime`` output: the cumulative time of
+    every top-level (unindented) import.
+    """
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative_us, name = line.split('|', 2)
+        # Nested imports are indented below the one that triggered them
+        if cumulative_us.strip().isdigit() and not name.startswith('  '):
+            total += int(cumulative_us)
+    return total / 1000
+
+
+def boot(profile, url='/cms/search/', settings=None):
+    """
+    Boots one fresh process in ``profile`` and returns its measurements.
+    """
+    env = {**os.environ, **PROFILES[profile]}
+    if settings:
+        env['DJANGO_SETTINGS_MODULE'] = settings
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT), env.get('PYTHONPATH')]))
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT, url],
+        cwd=ROOT, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+    )
+    total_ms = (time.perf_counter() - start) * 1000
+    if process.returncode:
+        raise RuntimeError(f"{profile} boot failed:\n{process.stderr[-2000:]}")
+    result = json.loads(process.stdout.splitlines()[-1])
+    result.update(total_ms=total_ms, import_ms=import_time_ms(process.stderr))
+    return result
+
+
+def measure(profile, runs=5, url='/cms/search/', settings=None):
+    """
+    Medians of ``runs`` boots, plus the modules the last one imported.
+    """
+    boots = [boot(profile, url, settings) for _ in range(runs)]
+    result = {
+        key: round(statistics.median(b[key] for b in boots), 1)
+        for key in ('total_ms', 'import_ms', 'app_ms', 'first_request_ms')
+    }
+    result.update(status=boots[-1]['status'], modules=boots[-1]['modules'])
+    return result
+
+
+def forbidden_imports(result):
+    """
+    Which of PUBLIC_FORBIDDEN_MODULES a boot imported.
+    """
+    return sorted({
+        prefix for prefix in PUBLIC_FORBIDDEN_MODULES
+        for module in result['modules'] if module == prefix or module.startswith(prefix + '.')
+    })
+
+
+def check_public(result, budget_ms=BUDGET_MS):
+    """
+    Returns a list of ways a public-profile result breaks the budget.
+    """
+    problems = []
+    if result['status'] != 200:
+        problems.append(f"first request returned HTTP {result['status']}")
+    if result['total_ms'] > budget_ms:
+        problems.append(f"first response after {result['total_ms']:.0f} ms, budget {budget_ms} ms")
+    loaded = forbidden_imports(result)
+    if loaded:
+        problems.append(f"imports {', '.join(loaded)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=PROFILES, action='append', help="Only this profile (repeatable)")
+    parser.add_argument('--runs', type=int, default=5, help="Boots per profile")
+    parser.add_argument('--url', default='/cms/search/', help="Path of the first request")
+    parser.add_argument('--settings', default=None, help="Settings module (default: DJANGO_SETTINGS_MODULE, else benchmarks.settings)")
+    parser.add_argument('--check', action='store_true', help="Fail when the public profile breaks its budget")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        profile: measure(profile, args.runs, args.url, args.settings)
+        for profile in args.profile or PROFILES
+    }
+    if args.json:
+        print(json.dumps({p: {k: v for k, v in r.items() if k != 'modules'} for p, r in results.items()}, indent=2))
+    else:
+        print(f"{'profile':<10}{'total ms':>10}{'import ms':>11}{'app ms':>9}{'first req ms':>14}{'modules':>9}")
+        for profile, r in results.items():
+            print(
+                f"{profile:<10}{r['total_ms']:>10}{r['import_ms']:>11}{r['app_ms']:>9}"
+                f"{r['first_request_ms']:>14}{len(r['modules']):>9}"
+            )
+
+    if args.check and 'public' in results:
+        problems = check_public(results['public'])
+        for line in problems:
+            print(f"OVER BUDGET public: {line}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        print(f"Public profile within its {BUDGET_MS} ms budget.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Benchmark suite for the CMS read path and the admin write path.
+
+Builds a synthetic fixture (``--pages`` pages, ``--gallery`` gallery items,
+``--packages`` packages with ``--versions`` versions each) in a fresh
+SQLite database and runs every case in-process through the full
+middleware stack, reporting throughput, p50/p99 latency and the number of
+queries one steady-state operation costs:
+
+    home                  GET /cms/
+    page_detail           GET /cms/page/page-0/
+    page_detail_pricing   GET /cms/page/trendy-offers/
+    *_cold                the same two with the cache cleared before each request
+    navigation            base.html rendered with the menu context processor
+    navigation_rebuild    the same after invalidating the menu each time
+    admin_save_model      PricingPackageAdmin.save_model with a new file
+    admin_approve_view    POST to the package approve view
+
+    python -m benchmarks.suite                     # print results
+    python -m benchmarks.suite --save-baseline     # store benchmarks/baseline.json
+    python -m benchmarks.suite --compare           # exit 1 on regressions
+
+A case regresses when its p50 latency grows by more than ``--threshold``
+(a fraction) or it runs more queries than in the baseline. Latencies are
+only comparable between runs on the same machine; query counts always are.
+Set BENCH_CACHE=0 to measure with the page cache disabled.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+
+def setup(tmp, args):
+    os.environ['BENCH_DB'] = str(Path(tmp) / 'suite.sqlite3')
+    os.environ['BENCH_MEDIA_ROOT'] = str(Path(tmp) / 'media')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    from benchmarks.fixtures import create_fixture
+
+    call_command('migrate', verbosity=0)
+    create_fixture(pages=args.pages, packages=args.packages, versions=args.versions, gallery_items=args.gallery)
+
+
+def cases():
+    """
+    Name -> zero-argument callable performing one operation.
+    """
+    from django.contrib.admin import site
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.template.loader import render_to_string
+    from django.test import Client, RequestFactory
+
+    from cms.cache import invalidate_navigation
+    from cms.models import PricingPackage
+
+    public = Client()
+    user = User.objects.create_superuser('bench', password='bench')
+    staff = Client()
+    staff.force_login(user)
+    factory = RequestFactory()
+
+    package = PricingPackage.objects.order_by('pk').first()
+    package_admin = site._registry[PricingPackage]
+    approve_url = f'/admin/cms/pricingpackage/{package.pk}/approve/'
+
+    def get(client, url):
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        return run
+
+    def cold(run):
+        def run_cold():
+            cache.clear()
+            run()
+        return run_cold
+
+    def navigation():
+        render_to_string('cms/base.html', request=factory.get('/cms/'))
+
+    def navigation_rebuild():
+        invalidate_navigation()
+        navigation()
+
+    uploads = iter(range(10 ** 9))
+
+    def save_model():
+        request = factory.post('/admin/cms/pricingpackage/')
+        request.user = user
+        obj = PricingPackage.objects.get(pk=package.pk)
+        form_class = package_admin.get_form(request, obj, change=True)
+        form = form_class(
+            {'segment': obj.segment, 'year': obj.year_id, 'package_name': obj.package_name,
+             'current_version': obj.current_version},
+            {'file': SimpleUploadedFile('package.pdf', b'%%PDF-1.4 upload %d' % next(uploads))},
+            instance=obj,
+        )
+        assert form.is_valid(), form.errors
+        package_admin.save_model(request, form.save(commit=False), form, change=True)
+
+    def approve():
+        response = staff.post(approve_url, HTTP_REFERER='/admin/')
+        assert response.status_code == 302, response.status_code
+
+    return {
+        'home': get(public, '/cms/'),
+        'page_detail': get(public, '/cms/page/page-0/'),
+        'page_detail_pricing': get(public, '/cms/page/trendy-offers/'),
+        'page_detail_cold': cold(get(public, '/cms/page/page-0/')),
+        'page_detail_pricing_cold': cold(get(public, '/cms/page/trendy-offers/')),
+        'navigation': navigation,
+        'navigation_rebuild': navigation_rebuild,
+        'admin_save_model': save_model,
+        'admin_approve_view': approve,
+    }
+
+
+def measure(run, iterations, warmup=5):
+    from django.db import connection
+
+    from cms.metrics import RequestMetrics
+
+    for _ in range(warmup):
+        run()
+    # Counted with an execute wrapper: the query log is reset per request
+    counter = RequestMetrics()
+    with connection.execute_wrapper(counter):
+        run()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        'ops_per_s': round(iterations / elapsed, 1),
+        'p50_ms': round(statistics.median(samples) * 1000, 3),
+        'p99_ms': round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 3),
+        'queries': counter.queries,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of human-readable regressions against ``baseline``.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {base['queries']}")
+        if result['p50_ms'] > base['p50_ms'] * (1 + threshold):
+            regressions.append(
+                f"{name}: p50 {result['p50_ms']} ms, baseline {base['p50_ms']} ms "
+                f"(+{(result['p50_ms'] / base['p50_ms'] - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--gallery', type=int, default=200)
+    parser.add_argument('--packages', type=int, default=12)
+    parser.add_argument('--versions', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=200, help="Timed operations per case")
+    parser.add_argument('--case', action='append', help="Only run this case (repeatable)")
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="Fail when a case regresses against the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed p50 slowdown, as a fraction")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    fixture = {name: getattr(args, name) for name in ('pages', 'gallery', 'packages', 'versions')}
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(tmp, args)
+        results = {
+            name: measure(run, args.iterations)
+            for name, run in cases().items()
+            if not args.case or name in args.case
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'case':<26}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for name, r in results.items():
+            print(f"{name:<26}{r['ops_per_s']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['queries']:>9}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({'fixture': fixture, 'results': results}, indent=2) + '\n')
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+    if args.compare:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline['fixture'] != fixture:
+            print(f"Warning: baseline fixture {baseline['fixture']} differs from {fixture}", file=sys.stderr)
+        regressions = compare(results, baseline['results'], args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,91 @@
 # cms/admin.py
 
+import logging
+import tempfile
+
 from django.contrib import admin, messages
-from django.urls import path
-from django.http import HttpResponseRedirect
-from django.shortcuts import get_object_or_404
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.urls import path, reverse
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.template.defaultfilters import filesizeformat
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
 from django.utils import timezone
+from django.utils.html import format_html
+
+from .approvals import approve_packages, approve_version, bump_version
+from .bulk import HISTORY_FORMATS, import_packages, stream_export, stream_history
+from .forms import PackageImportForm
+from .models import (
+    ArchivedPricingPackage, ArchivedPricingPackageVersion, Job, Year, PricingPackage, PricingPackageVersion,
+)
 
-from .models import Year, PricingPackage, PricingPackageVersion
+logger = logging.getLogger(__name__)
 
 # Register Year for editing in admin
 admin.site.register(Year)
 
 
+# Query parameter of the version history page on the package change view
+VERSIONS_PAGE_VAR = 'versions_page'
+
+
+class VersionHistoryFormSet(BaseInlineFormSet):
+    """
+    Formset over one page of a package's versions, newest first, so the
+    change view loads ``per_page`` rows however long the history is.
+    """
+    per_page = 20
+    page_number = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            versions = super().get_queryset().order_by('-version')
+            self.page = Paginator(versions, self.per_page).get_page(self.page_number)
+            self._queryset = self.page.object_list
+        return self._queryset
+
+
 class PricingPackageVersionInline(admin.TabularInline):
     """
-    Read-only inline showing version history of a pricing package.
+    Read-only inline showing version history of a pricing package, a page
+    at a time.
     """
     model = PricingPackageVersion
+    formset = VersionHistoryFormSet
+    template = 'cms/admin/pricingpackageversion/tabular.html'
     extra = 0
     readonly_fields = (
-        'version', 'package_name', 'file',
+        'version', 'package_name', 'file', 'preview_image', 'page_count', 'size',
         'uploader', 'uploaded_at', 'approved',
         'approved_by', 'approved_at'
     )
     can_delete = False
 
+    def get_queryset(self, request):
+        # The extracted text is only kept for search
+        return super().get_queryset(request).defer('text')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.page_number = request.GET.get(VERSIONS_PAGE_VAR)
+        return formset
+
+    @admin.display(description="Preview")
+    def preview_image(self, obj):
+        if not obj.preview:
+            return "Pending" if obj.file_size is None else "-"
+        thumbnail = obj.preview['variants']['jpeg'][0]['name']
+        return format_html('<img src="{}" alt="" width="80" loading="lazy">', default_storage.url(thumbnail))
+
+    @admin.display(description="Size")
+    def size(self, obj):
+        return filesizeformat(obj.file_size) if obj.file_size is not None else "-"
+
     def has_add_permission(self, request, obj=None):
         # Disable adding inlines manually
         return False
@@ -34,10 +95,26 @@ class PricingPackageVersionInline(admin.TabularInline):
         return False
 
 
+class PricingPackageChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        # Loads only the listed columns; actions that need more reload them
+        return super().get_queryset(request, exclude_parameters).only(
+            'segment', 'package_name', 'current_version', 'approved', 'year__year',
+        )
+
+
 class PricingPackageAdmin(admin.ModelAdmin):
     list_display = ('segment', 'year', 'package_name', 'current_version', 'approved')
+    list_filter = ('approved', 'segment', 'year')
+    list_select_related = ('year',)
     inlines = [PricingPackageVersionInline]
-    readonly_fields = ('approved_by', 'approved_at')
+    # Versions only move through uploads, never by editing the number
+    readonly_fields = ('current_version', 'approved_by', 'approved_at')
+    actions = ['approve_selected', 'export_selected']
+    change_list_template = 'cms/admin/pricingpackage/change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return PricingPackageChangeList
 
     def get_inline_instances(self, request, obj=None):
         # Only show inlines on the change view
@@ -50,16 +127,20 @@ class PricingPackageAdmin(admin.ModelAdmin):
         Custom save logic:
         - If creating a new object, also create the first version
         - If updating and file changed, bump version and store new copy
+        - Otherwise write only the changed columns
         """
         try:
             if change:
                 if 'file' in form.changed_data:
-                    obj.current_version += 1
-                    obj.approved = False
-                    obj.approved_by = None
-                    obj.approved_at = None
+                    bump_version(obj, request.user.username, fields=form.changed_data)
+                else:
+                    # Leaves approval and version columns to concurrent approvals
+                    obj.save(update_fields=[*form.changed_data, 'updated_at'] if form.changed_data else [])
+            else:
+                with transaction.atomic():
+                    # Save initial package
                     super().save_model(request, obj, form, change)
-
+                    # Create version 1
                     PricingPackageVersion.objects.create(
                         pricing_package=obj,
                         version=obj.current_version,
@@ -67,21 +148,7 @@ class PricingPackageAdmin(admin.ModelAdmin):
                         file=obj.file,
                         uploader=request.user.username,
                     )
-                    return
-            else:
-                # Save initial package
-                super().save_model(request, obj, form, change)
-                # Create version 1
-                PricingPackageVersion.objects.create(
-                    pricing_package=obj,
-                    version=obj.current_version,
-                    package_name=obj.package_name,
-                    file=obj.file,
-                    uploader=request.user.username,
-                )
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
+        except Exception:
             logger.exception("Error saving PricingPackage:")
             raise
 
@@ -96,6 +163,10 @@ class PricingPackageAdmin(admin.ModelAdmin):
             path('<int:package_id>/approve_version/<int:version_id>/',
                  self.admin_site.admin_view(self.approve_version_view),
                  name='cms_pricingpackage_approve_version'),
+            path('import/', self.admin_site.admin_view(self.import_view),
+                 name='cms_pricingpackage_import'),
+            path('export.<str:format>', self.admin_site.admin_view(self.export_view),
+                 name='cms_pricingpackage_export'),
         ]
         return custom_urls + urls
 
@@ -108,16 +179,7 @@ class PricingPackageAdmin(admin.ModelAdmin):
             self.message_user(request, "Object not found.", level=messages.ERROR)
             return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/admin/'))
 
-        obj.approved = True
-        obj.approved_by = request.user.username
-        obj.approved_at = timezone.now()
-        obj.save()
-
-        obj.versions.filter(version=obj.current_version).update(
-            approved=True,
-            approved_by=request.user.username,
-            approved_at=timezone.now()
-        )
+        approve_packages([obj.pk], request.user.username)
 
         self.message_user(request, "Pricing package approved successfully.", level=messages.SUCCESS)
         return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/admin/'))
@@ -126,15 +188,137 @@ class PricingPackageAdmin(admin.ModelAdmin):
         """
         Approves a specific version in the inline history.
         """
-        version = get_object_or_404(PricingPackageVersion, id=version_id, pricing_package_id=package_id)
-
-        version.approved = True
-        version.approved_by = request.user.username
-        version.approved_at = timezone.now()
-        version.save()
+        if not approve_version(package_id, version_id, request.user.username):
+            raise Http404("No PricingPackageVersion matches the given query.")
 
         self.message_user(request, "Pricing package version approved successfully.", level=messages.SUCCESS)
         return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/admin/'))
 
 
+    def import_view(self, request):
+        """
+        Bulk-imports packages from an uploaded ZIP with a manifest.
+        """
+        if not self.has_add_permission(request):
+            return HttpResponseRedirect(reverse('admin:cms_pricingpackage_changelist'))
+
+        form = PackageImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            with tempfile.NamedTemporaryFile(suffix='.zip') as archive:
+                for chunk in form.cleaned_data['archive'].chunks():
+                    archive.write(chunk)
+                archive.flush()
+                try:
+                    created, updated = import_packages(archive.name, request.user.username)
+                except ValidationError as e:
+                    for message in e.messages:
+                        form.add_error('archive', message)
+                else:
+                    self.message_user(
+                        request,
+                        f"Imported {created} new packages and {updated} new versions.",
+                        level=messages.SUCCESS,
+                    )
+                    return HttpResponseRedirect(reverse('admin:cms_pricingpackage_changelist'))
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import pricing packages",
+            'form': form,
+        }
+        return TemplateResponse(request, 'cms/admin/pricingpackage/import_form.html', context)
+
+    def export_view(self, request, format):
+        """
+        Streams every version of every package, including the archive, as
+        CSV or JSON.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        if format not in HISTORY_FORMATS:
+            raise Http404(f"Unknown export format {format!r}.")
+        response = StreamingHttpResponse(stream_history(format), content_type=HISTORY_FORMATS[format])
+        response['Content-Disposition'] = f'attachment; filename="pricing-history.{format}"'
+        return response
+
+    @admin.action(description="Approve selected packages", permissions=['change'])
+    def approve_selected(self, request, queryset):
+        approved = approve_packages(queryset.values('pk'), request.user.username)
+        self.message_user(request, f"Approved {approved} pricing packages.", level=messages.SUCCESS)
+
+    @admin.action(description="Export selected packages as ZIP")
+    def export_selected(self, request, queryset):
+        response = StreamingHttpResponse(stream_export(queryset), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="pricing-packages.zip"'
+        return response
+
+
 admin.site.register(PricingPackage, PricingPackageAdmin)
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """
+    Read-only browsing of the pricing archive (see cms/archive.py).
+    """
+    date_hierarchy = 'archived_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Deleting an archived row could free a blob a live row shares
+        return False
+
+
+class ArchivedPricingPackageAdmin(ArchiveAdmin):
+    list_display = ('segment', 'year', 'package_name', 'current_version', 'approved', 'versions', 'archived_at')
+    list_filter = ('year', 'segment', 'approved')
+    list_select_related = ('year',)
+    search_fields = ('package_name',)
+
+    @admin.display(description="Versions")
+    def versions(self, obj):
+        url = reverse('admin:cms_archivedpricingpackageversion_changelist')
+        return format_html('<a href="{}?package_id={}">History</a>', url, obj.pk)
+
+
+class ArchivedPricingPackageVersionAdmin(ArchiveAdmin):
+    list_display = ('package_id', 'version', 'package_name', 'uploader', 'uploaded_at', 'approved', 'archived_at')
+    list_filter = ('approved',)
+    search_fields = ('package_name', '=package_id')
+    ordering = ('package_id', '-version')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('text')
+
+
+admin.site.register(ArchivedPricingPackage, ArchivedPricingPackageAdmin)
+admin.site.register(ArchivedPricingPackageVersion, ArchivedPricingPackageVersionAdmin)
+
+
+class JobAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the background job queue, with a retry action.
+    """
+    list_display = ('task', 'key', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('key',)
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ['retry_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected jobs", permissions=['change'])
+    def retry_selected(self, request, queryset):
+        retried = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(), last_error='', finished_at=None,
+        )
+        self.message_user(request, f"Queued {retried} jobs again.", level=messages.SUCCESS)
+
+
+admin.site.register(Job, JobAdmin)
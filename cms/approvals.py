@@ -0,0 +1,88 @@
+# cms/approvals.py
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import PRICING_PAGE_SLUG, invalidate_pricing
+from .models import PricingPackage, PricingPackageVersion
+from .tasks import queue_warm
+
+# Columns written when a new file becomes the package's current version
+VERSION_FIELDS = ('file', 'current_version', 'approved', 'approved_by', 'approved_at', 'updated_at')
+
+
+def approve_packages(packages, username):
+    """
+    Approves the given packages (a queryset or ids) and their current
+    versions in one transaction, in a constant number of queries however
+    many packages there are. Rows that are already approved are left alone.
+
+    The packages are locked in primary key order first, so approvals
+    cannot interleave with a concurrent version bump or deadlock with
+    each other. Returns the number of packages whose approval changed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            PricingPackage.objects.select_for_update()
+            .filter(pk__in=packages)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if not ids:
+            return 0
+        # updated_at moves too: it drives the pricing page's Last-Modified
+        approved = PricingPackage.objects.filter(pk__in=ids, approved=False).update(
+            approved=True, approved_by=username, approved_at=now, updated_at=now,
+        )
+        versions = PricingPackageVersion.objects.filter(
+            pricing_package__in=ids,
+            version=F('pricing_package__current_version'),
+            approved=False,
+        ).update(approved=True, approved_by=username, approved_at=now)
+        if approved or versions:
+            # update() bypasses post_save, so invalidate the pricing page here
+            invalidate_pricing(*ids)
+            queue_warm(PRICING_PAGE_SLUG)
+    return approved
+
+
+def approve_version(package_id, version_id, username):
+    """
+    Approves one version of a package. Returns False when no such version
+    exists.
+    """
+    versions = PricingPackageVersion.objects.filter(pk=version_id, pricing_package_id=package_id)
+    with transaction.atomic():
+        updated = versions.filter(approved=False).update(
+            approved=True, approved_by=username, approved_at=timezone.now(),
+        )
+        if updated:
+            invalidate_pricing(package_id)
+            queue_warm(PRICING_PAGE_SLUG)
+    return bool(updated) or versions.exists()
+
+
+def bump_version(package, uploader, fields=()):
+    """
+    Saves ``package`` with a newly uploaded file as its next, unapproved
+    version, writing only the version columns and the other changed
+    ``fields``.
+
+    The version number is incremented in the database rather than from the
+    value loaded with the form, so concurrent uploads never reuse a number,
+    and the UPDATE holds the row lock until the new version row exists.
+    """
+    with transaction.atomic():
+        package.current_version = F('current_version') + 1
+        package.approved, package.approved_by, package.approved_at = False, None, None
+        package.save(update_fields={*fields, *VERSION_FIELDS})
+        package.refresh_from_db(fields=['current_version'])
+        return PricingPackageVersion.objects.create(
+            pricing_package=package,
+            version=package.current_version,
+            package_name=package.package_name,
+            file=package.file,
+            uploader=uploader,
+        )
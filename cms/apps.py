@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cms'
+
+    def ready(self):
+        # Connect cache invalidation receivers and register job tasks
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,79 @@
+# cms/archive.py
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    ArchivedPricingPackage, ArchivedPricingPackageVersion, PricingPackage, PricingPackageVersion,
+)
+
+# Columns copied from the live rows; the archive models mirror them
+PACKAGE_FIELDS = (
+    'id', 'segment', 'year_id', 'package_name', 'file', 'current_version', 'approved',
+    'approved_by', 'approved_at', 'updated_at',
+)
+VERSION_FIELDS = (
+    'id', 'version', 'package_name', 'file', 'sha256', 'page_count', 'file_size', 'preview',
+    'text', 'uploader', 'uploaded_at', 'approved', 'approved_by', 'approved_at',
+)
+
+
+def _archive_versions(versions, now):
+    rows = versions.values(*VERSION_FIELDS, package_id=F('pricing_package_id'))
+    ArchivedPricingPackageVersion.objects.bulk_create(
+        [ArchivedPricingPackageVersion(archived_at=now, **row) for row in rows],
+    )
+
+
+def _batches(queryset, batch_size):
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        yield ids[start:start + batch_size]
+
+
+def archive_pricing(before_year=None, batch_size=500):
+    """
+    Moves pricing history out of the live tables, which then only hold
+    what the pricing page and the admin work with:
+
+    - packages of years before ``before_year`` (by default the current
+      year), with all their versions
+    - versions of the remaining packages older than their current version
+
+    Each batch of ``batch_size`` packages or versions is copied and
+    deleted in its own transaction, so the job can be interrupted and run
+    again. An archived row already holding the id of a row being moved
+    raises IntegrityError and leaves that batch live. Files stay in
+    storage: archived rows still reference them. Returns (packages
+    archived, versions archived).
+    """
+    before_year = before_year or timezone.now().year
+    packages_archived = versions_archived = 0
+
+    past = PricingPackage.objects.filter(year__year__lt=before_year)
+    for ids in _batches(past, batch_size):
+        now = timezone.now()
+        with transaction.atomic():
+            _archive_versions(PricingPackageVersion.objects.filter(pricing_package__in=ids), now)
+            ArchivedPricingPackage.objects.bulk_create(
+                [
+                    ArchivedPricingPackage(archived_at=now, **row)
+                    for row in PricingPackage.objects.filter(pk__in=ids).values(*PACKAGE_FIELDS)
+                ],
+            )
+            versions_archived += PricingPackageVersion.objects.filter(pricing_package__in=ids).count()
+            # Cascades to the versions copied above; post_delete
+            # invalidates the pricing page
+            PricingPackage.objects.filter(pk__in=ids).delete()
+        packages_archived += len(ids)
+
+    superseded = PricingPackageVersion.objects.filter(version__lt=F('pricing_package__current_version'))
+    for ids in _batches(superseded, batch_size):
+        with transaction.atomic():
+            versions = PricingPackageVersion.objects.filter(pk__in=ids)
+            _archive_versions(versions, timezone.now())
+            versions.delete()
+        versions_archived += len(ids)
+
+    return packages_archived, versions_archived
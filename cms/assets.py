@@ -0,0 +1,281 @@
+# cms/assets.py
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+
+# Per-page copies of the scraped stylesheets, named index.php_<page>_<name>
+# (pages other than the home page) or index.php_<name> (home page).
+SCRAPED_PREFIX = 'index.php_'
+
+# Cascade order of the stylesheets within a page bundle, following the
+# original Joomla template. Unknown sheets go last, alphabetically.
+CSS_ORDER = [
+    'css',  # web fonts
+    'bootstrap.min.css',
+    'bootstrap-responsive.min.css',
+    'bootstrap-extended.css',
+    'font-awesome.min.css',
+    'jquery-ui.min.css',
+    'legacy.css',
+    'animate.min.css',
+    'magnific-popup.css',
+    'slick.css',
+    'layerslider.css',
+    'sppagebuilder.css',
+    'pagebuilder.css',
+    'ce.css',
+    'template.css',
+    'preset7.css',
+    'style.css',
+]
+
+# Classes added by JavaScript at runtime, which no template mentions.
+DEFAULT_SAFELIST = {
+    'active', 'collapse', 'collapsed', 'collapsing', 'show', 'fade', 'in', 'open',
+    'animated', 'mfp-ready', 'mfp-removing', 'slick-active', 'slick-current',
+    'slick-initialized', 'modal-open', 'modal-backdrop', 'sticky',
+}
+
+BUNDLE_DIR = 'bundles'
+MANIFEST_NAME = 'manifest.json'
+
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+STRING_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+NOT_RE = re.compile(r':not\([^)]*\)')
+SELECTOR_TOKEN_RE = re.compile(r'[.#](-?[_a-zA-Z][-\w]*)')
+ATTRIBUTE_RE = re.compile(r'''\b(?:class|id)\s*=\s*(["'])(.*?)\1''', re.S | re.I)
+WORD_RE = re.compile(r'-?[_a-zA-Z][-\w]*')
+
+# At-rules whose blocks contain style rules that can be purged
+NESTED_AT_RULES = ('@media', '@supports', '@document', '@layer')
+
+
+def scraped_css_groups(source_dir):
+    """
+    Groups the scraped stylesheets by page: ``{page_slug: [Path, ...]}`` in
+    cascade order. Sheets without a page prefix belong to the home page.
+    """
+    groups = {}
+    for path in sorted(Path(source_dir).iterdir()):
+        if not path.name.startswith(SCRAPED_PREFIX):
+            continue
+        page, _, sheet = path.name[len(SCRAPED_PREFIX):].rpartition('_')
+        groups.setdefault(page or 'home', []).append((sheet, path))
+
+    def position(item):
+        sheet = item[0]
+        return (CSS_ORDER.index(sheet), '') if sheet in CSS_ORDER else (len(CSS_ORDER), sheet)
+
+    return {page: [path for _, path in sorted(sheets, key=position)] for page, sheets in groups.items()}
+
+
+def used_tokens(html_sources):
+    """
+    Class and id names used by the given HTML/template strings.
+    """
+    tokens = set()
+    for html in html_sources:
+        for _, value in ATTRIBUTE_RE.findall(html):
+            tokens.update(WORD_RE.findall(value))
+    return tokens
+
+
+def _split_blocks(css):
+    """
+    Splits CSS into top-level (prelude, body) pairs; body is None for
+    statements such as ``@import ...;``. Assumes comments are removed.
+    """
+    blocks = []
+    i, n = 0, len(css)
+    while i < n:
+        start, depth, prelude_end = i, 0, None
+        while i < n:
+            char = css[i]
+            if char in '"\'':
+                match = STRING_RE.match(css, i)
+                i = match.end() if match else i + 1
+                continue
+            if char == ';' and depth == 0:
+                blocks.append((css[start:i].strip(), None))
+                i += 1
+                break
+            if char == '{':
+                if depth == 0:
+                    prelude_end = i
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth <= 0:
+                    if prelude_end is not None:
+                        blocks.append((css[start:prelude_end].strip(), css[prelude_end + 1:i]))
+                    i += 1
+                    break
+            i += 1
+        else:
+            if css[start:].strip():
+                blocks.append((css[start:].strip(), None))
+    return [(prelude, body) for prelude, body in blocks if prelude]
+
+
+def _compact(text, selector=False):
+    # Collapses whitespace outside string literals
+    parts = STRING_RE.split(text)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[index])
+        part = re.sub(r'\s*([;,{}])\s*', r'\1', part).replace(';}', '}')
+        if selector:
+            part = re.sub(r'\s*([>+~])\s*', r'\1', part)
+        else:
+            part = re.sub(r'\s*:\s*', ':', part)
+        parts[index] = part
+    return ''.join(parts).strip()
+
+
+def _minify_declarations(body):
+    return _compact(body).rstrip(';')
+
+
+def _keep_selector(selector, used):
+    tokens = SELECTOR_TOKEN_RE.findall(NOT_RE.sub('', selector))
+    return all(token in used for token in tokens)
+
+
+def _process(css, used):
+    # Minifies (and purges, when ``used`` is given) a comment-free sheet
+    output = []
+    for prelude, body in _split_blocks(css):
+        if body is None:
+            if not prelude.lower().startswith('@charset'):
+                output.append(_compact(prelude) + ';')
+            continue
+        if prelude.startswith('@'):
+            keyword = prelude.split(None, 1)[0].lower()
+            if keyword in NESTED_AT_RULES:
+                inner = _process(body, used)
+                if inner:
+                    output.append('%s{%s}' % (_compact(prelude), inner))
+            else:
+                # @font-face, @keyframes, @page, ...: kept verbatim, minified
+                output.append('%s{%s}' % (_compact(prelude), _minify_declarations(body)))
+            continue
+        selectors = [s.strip() for s in prelude.split(',')]
+        if used is not None:
+            selectors = [s for s in selectors if _keep_selector(s, used)]
+        declarations = _minify_declarations(body)
+        if selectors and declarations:
+            output.append('%s{%s}' % (_compact(','.join(selectors), selector=True), declarations))
+    return ''.join(output)
+
+
+def minify_css(css, used=None):
+    """
+    Minifies a stylesheet. With a set of ``used`` class/id names, also drops
+    selectors that reference any class or id outside that set.
+    """
+    return _process(COMMENT_RE.sub('', css), used)
+
+
+class BundleBuilder:
+    """
+    Builds one minified, fingerprinted CSS bundle per scraped page.
+
+    Identical sheets (by SHA-256) are read and processed once, however many
+    pages carry a copy; assets referenced through relative ``url()``s are
+    copied next to the bundles under content-hashed names.
+    """
+
+    def __init__(self, output_dir, used=None):
+        self.output_dir = Path(output_dir)
+        self.used = used
+        self._sheets = {}  # sha256 -> processed css
+        self._assets = {}  # source path -> bundle-relative url
+
+    def _rewrite_urls(self, css, source):
+        def replace(match):
+            quote, url = match.groups()
+            if re.match(r'^(?:[a-z][a-z0-9+.-]*:|//|/|#)', url, re.I):
+                return match.group(0)
+            path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+            target = (source.parent / path).resolve()
+            if not target.is_file():
+                return match.group(0)
+            if target not in self._assets:
+                digest = hashlib.sha256(target.read_bytes()).hexdigest()[:12]
+                name = f'assets/{digest}{target.suffix}'
+                (self.output_dir / 'assets').mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(target, self.output_dir / name)
+                self._assets[target] = name
+            return 'url(%s%s%s%s)' % (quote, self._assets[target], suffix, quote)
+        return URL_RE.sub(replace, css)
+
+    def sheet(self, path):
+        raw = path.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest not in self._sheets:
+            css = raw.decode('utf-8', errors='replace')
+            self._sheets[digest] = minify_css(self._rewrite_urls(css, path), self.used)
+        return self._sheets[digest]
+
+    def bundle(self, page, paths):
+        """
+        Writes the bundle of one page and returns its name within STATIC.
+        """
+        sheets = [self.sheet(path) for path in paths]
+        # @import is only valid ahead of every other rule
+        imports, rules = [], []
+        for css in sheets:
+            for prelude, body in _split_blocks(css):
+                target = imports if body is None and prelude.lower().startswith('@import') else rules
+                target.append(prelude + ';' if body is None else '%s{%s}' % (prelude, body))
+        content = ''.join(imports + rules).encode()
+        name = f'{page}.{hashlib.sha256(content).hexdigest()[:12]}.css'
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        (self.output_dir / name).write_bytes(content)
+        return f'{BUNDLE_DIR}/{name}'
+
+    @property
+    def unique_sheets(self):
+        return len(self._sheets)
+
+
+def build_bundles(source_dir, output_dir, used=None):
+    """
+    Bundles every scraped page and writes ``manifest.json`` mapping page
+    slugs to bundle names. Bundles from earlier builds are removed.
+    Returns (manifest, builder).
+    """
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    builder = BundleBuilder(output_dir, used)
+    manifest = {
+        page: builder.bundle(page, paths)
+        for page, paths in scraped_css_groups(source_dir).items()
+    }
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest, builder
+
+
+_manifest = (None, {})  # (mtime, manifest) of the loaded bundle manifest
+
+
+def bundle_manifest():
+    """
+    Page slug -> bundle static name, re-read only when the manifest changes.
+    """
+    global _manifest
+    path = Path(getattr(settings, 'CMS_CSS_BUNDLE_DIR', settings.BASE_DIR / 'static' / BUNDLE_DIR)) / MANIFEST_NAME
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return {}
+    if _manifest[0] != mtime:
+        _manifest = (mtime, json.loads(path.read_text()))
+    return _manifest[1]
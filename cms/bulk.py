@@ -0,0 +1,303 @@
+# cms/bulk.py
+
+import csv
+import io
+import json
+import posixpath
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidate_pricing
+from .models import (
+    ArchivedPricingPackage, ArchivedPricingPackageVersion, PricingPackage, PricingPackageVersion, Year,
+)
+from .jobs import enqueue
+from .tasks import queue_scan
+
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+MANIFEST_FIELDS = ('segment', 'year', 'name', 'file')
+
+# Columns of the version history export, one row per version
+HISTORY_FIELDS = (
+    'package_id', 'segment', 'year', 'current_version', 'version', 'package_name', 'file', 'sha256',
+    'page_count', 'file_size', 'uploader', 'uploaded_at', 'approved', 'approved_by', 'approved_at',
+    'archived',
+)
+HISTORY_FORMATS = {'csv': 'text/csv', 'json': 'application/json'}
+
+# Rows fetched per query by the history export
+HISTORY_CHUNK_SIZE = 2000
+
+SEGMENTS = dict(PricingPackage.SEGMENT_CHOICES)
+SEGMENT_LABELS = {label.lower(): key for key, label in PricingPackage.SEGMENT_CHOICES}
+
+
+class PackageSource:
+    """
+    Read access to a directory or ZIP archive of package files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+
+    def names(self):
+        if self.zip:
+            return [info.filename for info in self.zip.infolist() if not info.is_dir()]
+        root = Path(self.path)
+        return [p.relative_to(root).as_posix() for p in root.rglob('*') if p.is_file()]
+
+    def open(self, name):
+        if self.zip:
+            return self.zip.open(name)
+        return open(Path(self.path, name), 'rb')
+
+    def read_text(self, name):
+        with self.open(name) as f:
+            return f.read().decode('utf-8-sig')
+
+
+def parse_manifest(source, manifest=None):
+    """
+    Reads the import manifest (CSV with a header row, or a JSON list of
+    objects) with the fields segment, year, name and file. Returns a list
+    of validated rows or raises ValidationError.
+    """
+    if manifest is not None:
+        name, text = manifest, Path(manifest).read_text(encoding='utf-8-sig')
+    else:
+        name = next((n for n in source.names() if posixpath.basename(n) in MANIFEST_NAMES), None)
+        if name is None:
+            raise ValidationError("No manifest.csv or manifest.json found.")
+        text = source.read_text(name)
+
+    if name.endswith('.json'):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValidationError(f"Invalid JSON in {posixpath.basename(name)}: {e}.")
+        if not isinstance(rows, list):
+            raise ValidationError(f"{posixpath.basename(name)} must hold a list of objects.")
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    files = set(source.names())
+    errors, parsed, seen = [], [], set()
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f"Row {number}: not an object.")
+            continue
+        # Short CSV rows have None for their missing cells
+        row = {
+            key.strip().lower(): str(value).strip()
+            for key, value in row.items() if key and value is not None
+        }
+        missing = [field for field in MANIFEST_FIELDS if not row.get(field)]
+        if missing:
+            errors.append(f"Row {number}: missing {', '.join(missing)}.")
+            continue
+        segment = row['segment'] if row['segment'] in SEGMENTS else SEGMENT_LABELS.get(row['segment'].lower())
+        if segment is None:
+            errors.append(f"Row {number}: unknown segment {row['segment']!r}.")
+        if not row['year'].isdigit():
+            errors.append(f"Row {number}: invalid year {row['year']!r}.")
+        if row['file'] not in files:
+            errors.append(f"Row {number}: file {row['file']!r} not found.")
+        key = (segment, row['year'], row['name'])
+        if key in seen:
+            errors.append(f"Row {number}: duplicate package {row['name']!r}.")
+        seen.add(key)
+        parsed.append({'segment': segment, 'year': row['year'], 'name': row['name'], 'file': row['file']})
+    if errors:
+        raise ValidationError(errors)
+    return [dict(row, year=int(row['year'])) for row in parsed]
+
+
+def _store(source, name):
+    storage = PricingPackage._meta.get_field('file').storage
+    with source.open(name) as f:
+        return storage.save('packages/' + posixpath.basename(name), File(f, name=posixpath.basename(name)))
+
+
+def import_packages(path, uploader, manifest=None, workers=4):
+    """
+    Imports the packages listed in a directory or ZIP manifest.
+
+    Files are written in parallel first. Years, packages and versions are
+    then created with bulk queries in one transaction. A row matching an
+    existing (segment, year, name) package becomes that package's next
+    version, awaiting approval. Returns (created, updated) counts.
+    """
+    source = PackageSource(path)
+    rows = parse_manifest(source, manifest)
+
+    # Each file is written once, however many rows list it; identical
+    # content under different names is stored once by the storage itself
+    names = sorted({row['file'] for row in rows})
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stored = dict(zip(names, pool.map(lambda name: _store(source, name), names)))
+    storage = PricingPackage._meta.get_field('file').storage
+
+    now = timezone.now()
+    with transaction.atomic():
+        years = {row['year'] for row in rows}
+        Year.objects.bulk_create([Year(year=year) for year in years], ignore_conflicts=True)
+        year_ids = dict(Year.objects.filter(year__in=years).values_list('year', 'id'))
+
+        existing = {
+            (package.segment, package.year_id, package.package_name): package
+            for package in PricingPackage.objects.select_for_update().filter(year_id__in=year_ids.values())
+        }
+        created, updated = [], []
+        for row in rows:
+            key = (row['segment'], year_ids[row['year']], row['name'])
+            package = existing.get(key)
+            if package is None:
+                package = PricingPackage(
+                    segment=row['segment'], year_id=key[1], package_name=row['name'],
+                    file=stored[row['file']],
+                )
+                created.append(package)
+            elif package.file.name != stored[row['file']]:
+                package.file = stored[row['file']]
+                package.current_version += 1
+                package.approved, package.approved_by, package.approved_at = False, None, None
+                # bulk_update() skips auto_now
+                package.updated_at = now
+                updated.append(package)
+
+        PricingPackage.objects.bulk_create(created)
+        PricingPackage.objects.bulk_update(
+            updated, ['file', 'current_version', 'approved', 'approved_by', 'approved_at', 'updated_at'],
+        )
+        versions = PricingPackageVersion.objects.bulk_create([
+            PricingPackageVersion(
+                pricing_package=package, version=package.current_version,
+                package_name=package.package_name, file=package.file.name,
+                sha256=storage.content_hash(package.file.name) or '', uploader=uploader,
+            )
+            for package in created + updated
+        ])
+        # Bulk queries send no model signals
+        invalidate_pricing(*[package.pk for package in updated])
+        for version in versions:
+            enqueue('package_preview', key=f'preview:{version.pk}', version_id=version.pk)
+        for name in {package.file.name for package in created + updated}:
+            queue_scan('packages', name)
+    return len(created), len(updated)
+
+
+class _Sink(io.RawIOBase):
+    # Unseekable buffer that ZipFile streams into
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_export(queryset, chunk_size=64 * 1024):
+    """
+    Yields a ZIP of the packages' current files plus a manifest.csv that
+    ``import_packages`` accepts. Files are streamed chunk by chunk, so
+    memory use does not grow with the archive.
+    """
+    sink = _Sink()
+    written = set()
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(MANIFEST_FIELDS)
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        packages = queryset.select_related('year').only('segment', 'package_name', 'file', 'year__year')
+        for package in packages.iterator(chunk_size=200):
+            if not package.file:
+                continue
+            name = f'files/{posixpath.basename(package.file.name)}'
+            if name not in written:
+                written.add(name)
+                with package.file.open('rb') as source, archive.open(name, 'w') as target:
+                    for chunk in source.chunks(chunk_size):
+                        target.write(chunk)
+                        yield sink.pop()
+            writer.writerow([package.segment, package.year, package.package_name, name])
+        archive.writestr('manifest.csv', manifest.getvalue())
+    yield sink.pop()
+
+
+class _Echo:
+    # File-like object csv.writer writes a row into, returning it
+    def write(self, value):
+        return value
+
+
+def _package_column(field):
+    # The package of an archived version may be live or archived itself
+    return Coalesce(*(
+        Subquery(model.objects.filter(pk=OuterRef('package_id')).values(field)[:1])
+        for model in (PricingPackage, ArchivedPricingPackage)
+    ))
+
+
+def history_rows(chunk_size=HISTORY_CHUNK_SIZE):
+    """
+    Yields every package version, live then archived, as a tuple of
+    HISTORY_FIELDS. Rows are fetched ``chunk_size`` at a time and never
+    become model instances, so memory use does not grow with the history.
+    """
+    live = PricingPackageVersion.objects.annotate(
+        package_id=F('pricing_package_id'),
+        segment=F('pricing_package__segment'),
+        year=F('pricing_package__year__year'),
+        current_version=F('pricing_package__current_version'),
+        archived=Value(False),
+    )
+    archived = ArchivedPricingPackageVersion.objects.annotate(
+        segment=_package_column('segment'),
+        year=_package_column('year__year'),
+        current_version=_package_column('current_version'),
+        archived=Value(True),
+    )
+    for queryset in (live, archived):
+        yield from (
+            queryset.order_by('package_id', 'version')
+            .values_list(*HISTORY_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+
+
+def stream_history(format='csv', chunk_size=HISTORY_CHUNK_SIZE):
+    """
+    Yields the version history export as CSV with a header row, or as a
+    JSON list of objects, one row at a time (see HISTORY_FORMATS).
+    """
+    rows = history_rows(chunk_size)
+    if format == 'json':
+        encoder = DjangoJSONEncoder()
+        yield '['
+        for number, row in enumerate(rows):
+            yield (',\n' if number else '\n') + encoder.encode(dict(zip(HISTORY_FIELDS, row)))
+        yield '\n]\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HISTORY_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,305 @@
+# cms/cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import edge
+from .models import Page
+from .routers import fence_replica
+
+# Slug of the page served at the site root.
+HOME_PAGE_SLUG = 'home'
+
+# Slug of the page that also lists the approved pricing packages.
+PRICING_PAGE_SLUG = 'trendy-offers'
+
+# How long a rendered page may live in the cache. Entries are never served
+# stale because every invalidation moves the page onto a new version key.
+PAGE_CACHE_TIMEOUT = getattr(settings, 'CMS_PAGE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+# Rendered pages kept in each process on top of the shared cache, sparing
+# the transfer of the page body on a hit. Entries are keyed like the shared
+# ones, so they go out of use with them; 0 disables the local copies.
+LOCAL_PAGE_CACHE_SIZE = getattr(settings, 'CMS_LOCAL_PAGE_CACHE_SIZE', 64)
+
+# Site-wide generation: bumping it orphans every cached page and menu, in
+# the shared cache and in every process's memo, e.g. after a deploy that
+# changed templates.
+GENERATION_KEY = 'cms:generation'
+VERSION_KEY = 'cms:page-version:{slug}'
+PAGE_KEY = 'cms:page:{generation}:{view}:{slug}:{version}'
+NAVIGATION_GENERATION_KEY = 'cms:navigation-generation'
+NAVIGATION_KEY = 'cms:navigation:{generation}:{navigation}'
+
+# Response headers kept with a cached page, so hits carry the edge tags too
+CACHED_HEADERS = ('Cache-Control', edge.SURROGATE_KEY_HEADER)
+
+# ((generation, navigation generation), items) of the navigation menu last
+# built by this process
+_navigation = (None, None)
+
+# Cache key -> entry of the pages this process served last
+_local_pages = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _counter(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never restarts at a
+        # number that still has stale entries stored against it.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+async def _acounter(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), None)
+        version = await cache.aget(key)
+    return version
+
+
+def _counters(*keys):
+    """
+    Values of several counters in one cache round trip.
+    """
+    found = cache.get_many(keys)
+    return tuple(found[key] if key in found else _counter(key) for key in keys)
+
+
+async def _acounters(*keys):
+    found = await cache.aget_many(keys)
+    return tuple([found[key] if key in found else await _acounter(key) for key in keys])
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def _invalidate(key):
+    # The new version is rendered from the primary until the replica catches up
+    fence_replica()
+    _bump(key)
+
+
+def page_version(slug):
+    """
+    Returns the current content version of a page, creating it if needed.
+    """
+    return _counter(VERSION_KEY.format(slug=slug))
+
+
+def bump_page_version(slug):
+    """
+    Moves a page onto a new version, orphaning its cached responses.
+    """
+    _bump(VERSION_KEY.format(slug=slug))
+
+
+def cache_generation():
+    """
+    Returns the current site-wide cache generation.
+    """
+    return _counter(GENERATION_KEY)
+
+
+def bump_generation():
+    """
+    Orphans every cached page and menu across all processes and hosts
+    sharing the cache. Each process notices on its next request.
+    """
+    _bump(GENERATION_KEY)
+
+
+def invalidate_page(slug):
+    """
+    Invalidates the cached page, here and at the edge, once the current
+    transaction commits.
+    """
+    if slug:
+        transaction.on_commit(lambda: _invalidate(VERSION_KEY.format(slug=slug)))
+        edge.purge(edge.page_key(slug))
+
+
+def invalidate_pricing(*package_ids):
+    """
+    Invalidates every page that renders pricing packages, and the edge
+    copies of responses tagged with the given packages.
+    """
+    invalidate_page(PRICING_PAGE_SLUG)
+    edge.purge(*[edge.package_key(pk) for pk in package_ids])
+
+
+def _navigation_queryset():
+    return Page.objects.filter(is_public=True).order_by('pk').values('title', 'slug')
+
+
+def get_navigation():
+    """
+    Returns the public navigation menu as a list of ``{'title', 'slug'}`` dicts.
+
+    The menu is memoised per process and shared through the cache; both are
+    rebuilt only after ``invalidate_navigation()`` moves the generation on.
+    """
+    global _navigation
+    generation = _counters(GENERATION_KEY, NAVIGATION_GENERATION_KEY)
+    if _navigation[0] == generation:
+        return _navigation[1]
+
+    key = NAVIGATION_KEY.format(generation=generation[0], navigation=generation[1])
+    items = cache.get(key)
+    if items is None:
+        items = list(_navigation_queryset())
+        cache.set(key, items, PAGE_CACHE_TIMEOUT)
+    _navigation = (generation, items)
+    return items
+
+
+async def aget_navigation():
+    """
+    Async counterpart of ``get_navigation()`` sharing the same memo and cache.
+    """
+    global _navigation
+    generation = await _acounters(GENERATION_KEY, NAVIGATION_GENERATION_KEY)
+    if _navigation[0] == generation:
+        return _navigation[1]
+
+    key = NAVIGATION_KEY.format(generation=generation[0], navigation=generation[1])
+    items = await cache.aget(key)
+    if items is None:
+        items = [item async for item in _navigation_queryset()]
+        await cache.aset(key, items, PAGE_CACHE_TIMEOUT)
+    _navigation = (generation, items)
+    return items
+
+
+def invalidate_navigation():
+    """
+    Rebuilds the navigation menu once the current transaction commits.
+    """
+    transaction.on_commit(lambda: _invalidate(NAVIGATION_GENERATION_KEY))
+    edge.purge(edge.NAVIGATION_KEY)
+
+
+def is_cacheable_request(request):
+    # Anyone carrying a session (e.g. a logged-in admin) bypasses the cache,
+    # which also keeps anonymous hits from touching the session table.
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def _page_key(view_func, slug, generation, version):
+    return PAGE_KEY.format(generation=generation, view=view_func.__name__, slug=slug, version=version)
+
+
+def _local_entry(key):
+    with _local_lock:
+        entry = _local_pages.get(key)
+        if entry is not None:
+            _local_pages.move_to_end(key)
+        return entry
+
+
+def _keep_local(key, entry):
+    if not LOCAL_PAGE_CACHE_SIZE:
+        return
+    with _local_lock:
+        _local_pages[key] = entry
+        _local_pages.move_to_end(key)
+        while len(_local_pages) > LOCAL_PAGE_CACHE_SIZE:
+            _local_pages.popitem(last=False)
+
+
+def _entry_from_response(response):
+    # Only complete, successful responses are worth keeping
+    if response.status_code != 200 or response.streaming:
+        return None
+    return {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': '"%s"' % hashlib.md5(response.content).hexdigest(),
+        'last_modified': parse_http_date_safe(response.get('Last-Modified')),
+        'headers': {name: response[name] for name in CACHED_HEADERS if response.has_header(name)},
+    }
+
+
+def _response_from_entry(request, entry):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    for name, value in entry.get('headers', {}).items():
+        response[name] = value
+    if entry['last_modified'] is not None:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    return get_conditional_response(
+        request,
+        etag=entry['etag'],
+        last_modified=entry['last_modified'],
+        response=response,
+    )
+
+
+def cached_page(view_func):
+    """
+    Caches full responses of a page view keyed by slug and content version.
+
+    Views without a slug in their URL (i.e. home) are keyed by the home
+    page slug. Cached hits answer conditional requests with 304 Not Modified.
+    Works for both sync and async views.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return await view_func(request, *args, **kwargs)
+
+            slug = kwargs.get('slug', HOME_PAGE_SLUG)
+            versions = await _acounters(GENERATION_KEY, VERSION_KEY.format(slug=slug))
+            key = _page_key(view_func, slug, *versions)
+            entry = _local_entry(key) or await cache.aget(key)
+            if entry is None:
+                response = await view_func(request, *args, **kwargs)
+                entry = _entry_from_response(response)
+                if entry is None:
+                    return response
+                await cache.aset(key, entry, PAGE_CACHE_TIMEOUT)
+            _keep_local(key, entry)
+            return _response_from_entry(request, entry)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return view_func(request, *args, **kwargs)
+
+        slug = kwargs.get('slug', HOME_PAGE_SLUG)
+        versions = _counters(GENERATION_KEY, VERSION_KEY.format(slug=slug))
+        key = _page_key(view_func, slug, *versions)
+        entry = _local_entry(key) or cache.get(key)
+        if entry is None:
+            response = view_func(request, *args, **kwargs)
+            entry = _entry_from_response(response)
+            if entry is None:
+                return response
+            cache.set(key, entry, PAGE_CACHE_TIMEOUT)
+        _keep_local(key, entry)
+        return _response_from_entry(request, entry)
+    return wrapper
@@ -0,0 +1,158 @@
+# cms/compression.py
+
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico', '.eot', '.ttf', '.otf',
+)
+
+# Files smaller than this are not worth compressing.
+MIN_SIZE = getattr(settings, 'CMS_COMPRESS_MIN_SIZE', 1024)
+
+MANIFEST_NAME = 'compression.json'
+
+# Encodings in order of preference, with the sibling suffix they use.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Name contains a ManifestStaticFilesStorage/CSS bundle content hash
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+# Maximum levels for files compressed once at collectstatic/export time;
+# fast ones for responses compressed while the client waits
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': getattr(settings, 'CMS_COMPRESS_BROTLI_QUALITY', 5), 'gzip': 6}
+
+
+def compress(data, encoding, levels=STATIC_LEVELS):
+    if encoding == 'br':
+        return brotli.compress(data, quality=levels['br'])
+    return gzip.compress(data, compresslevel=levels['gzip'], mtime=0)
+
+
+def available_encodings():
+    return [(encoding, suffix) for encoding, suffix in ENCODINGS if encoding != 'br' or brotli]
+
+
+def precompress(root, names):
+    """
+    Writes ``.br``/``.gz`` siblings of every compressible file in ``names``
+    (relative to ``root``) that shrinks, and records their sizes in the
+    compression manifest at the root. Returns the manifest entries.
+    """
+    root = Path(root)
+    manifest_path = root / MANIFEST_NAME
+    files = json.loads(manifest_path.read_text())['files'] if manifest_path.exists() else {}
+    for name in names:
+        if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+            continue
+        path = root / name
+        data = path.read_bytes()
+        if len(data) < MIN_SIZE:
+            continue
+        entry = {'identity': len(data)}
+        for encoding, suffix in available_encodings():
+            compressed = compress(data, encoding)
+            sibling = path.with_name(path.name + suffix)
+            if len(compressed) < len(data):
+                sibling.write_bytes(compressed)
+                entry[encoding] = len(compressed)
+            elif sibling.exists():
+                sibling.unlink()
+        files[name] = entry
+    manifest_path.write_text(json.dumps({'version': 1, 'files': files}, sort_keys=True))
+    return files
+
+
+def accepted_encodings(header):
+    """
+    Content codings the client accepts (q > 0), from an Accept-Encoding value.
+    """
+    accepted = set()
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+_manifests = {}  # document root -> (mtime, files)
+
+
+def _manifest_files(document_root):
+    path = os.path.join(document_root, MANIFEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    cached = _manifests.get(document_root)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = _manifests[document_root] = (mtime, json.load(f)['files'])
+    return cached[1]
+
+
+def _pick_encoding(request, document_root, path, fullpath):
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+    files = _manifest_files(document_root)
+    for encoding, suffix in ENCODINGS:
+        if encoding not in accepted and not (encoding == 'gzip' and '*' in accepted):
+            continue
+        if files is not None:
+            # The manifest already knows which siblings exist
+            if encoding in files.get(path, ()):
+                return encoding, Path(str(fullpath) + suffix)
+        elif os.path.exists(str(fullpath) + suffix):
+            return encoding, Path(str(fullpath) + suffix)
+    return None, fullpath
+
+
+def serve_precompressed(request, path, document_root=None):
+    """
+    Drop-in replacement for ``django.views.static.serve`` that sends the
+    ``.br``/``.gz`` sibling written at collectstatic time when the client
+    accepts it. Nothing is compressed per request.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = Path(safe_join(document_root, path))
+    if not fullpath.is_file():
+        raise Http404(f"“{path}” does not exist")
+    statobj = fullpath.stat()
+    if not was_modified_since(request.headers.get('If-Modified-Since'), statobj.st_mtime):
+        return HttpResponseNotModified()
+
+    encoding, sendpath = _pick_encoding(request, str(document_root), path, fullpath)
+    content_type = mimetypes.guess_type(str(fullpath))[0] or 'application/octet-stream'
+    response = FileResponse(sendpath.open('rb'), content_type=content_type, filename=fullpath.name)
+    response['Last-Modified'] = http_date(statobj.st_mtime)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if path.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+        response['Vary'] = 'Accept-Encoding'
+    if FINGERPRINT_RE.search(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
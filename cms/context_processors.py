@@ -1,5 +1,11 @@
-from .models import Page
+from django.utils.functional import SimpleLazyObject
 
+from .cache import get_navigation
+from .metrics import timed
+
+
+@timed('processors', 'navigation_pages')
 def navigation_pages(request):
-    pages = Page.objects.filter(is_public=True)
-    return {'navigation_pages': pages}
+    # Only resolved when a template actually renders the menu; the lookup is
+    # then timed as part of this processor
+    return {'navigation_pages': SimpleLazyObject(timed('processors', 'navigation_pages')(get_navigation))}
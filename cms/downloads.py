@@ -0,0 +1,151 @@
+# cms/downloads.py
+
+import mimetypes
+import posixpath
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date
+
+CHUNK_SIZE = 64 * 1024
+
+# Downloads are addressed by version, whose file never changes once uploaded.
+DOWNLOAD_MAX_AGE = getattr(settings, 'CMS_DOWNLOAD_MAX_AGE', 60 * 60 * 24)
+
+# None serves files from Django; 'nginx' uses X-Accel-Redirect and
+# 'x-sendfile' (Apache mod_xsendfile, lighttpd) uses X-Sendfile.
+SENDFILE_BACKEND = getattr(settings, 'CMS_SENDFILE_BACKEND', None)
+
+# Internal nginx location that maps onto MEDIA_ROOT.
+SENDFILE_URL_PREFIX = getattr(settings, 'CMS_SENDFILE_URL_PREFIX', '/protected-media/')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Parses a single ``bytes=`` range into inclusive (start, end) offsets.
+
+    Returns None when there is no usable range (absent, malformed or
+    multi-range), in which case the whole file is sent. Raises
+    RangeNotSatisfiable when the range lies outside the file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _iter_range(file, start, length):
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _range_applies(request, etag, last_modified):
+    # If-Range only allows a partial response for an unchanged representation
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return last_modified is not None and if_range == http_date(last_modified)
+
+
+def _sendfile_response(field_file, content_type):
+    response = HttpResponse(content_type=content_type)
+    if SENDFILE_BACKEND == 'nginx':
+        response['X-Accel-Redirect'] = SENDFILE_URL_PREFIX + field_file.name
+    else:
+        response['X-Sendfile'] = field_file.path
+    return response
+
+
+def weak_etag(field_file):
+    """
+    Weak ETag from a stored file's size and modification time, for files
+    whose digest is not known yet. None when the storage has no mtimes.
+    """
+    storage = field_file.storage
+    try:
+        modified = storage.get_modified_time(field_file.name)
+    except NotImplementedError:
+        return None
+    return 'W/"%x-%x"' % (storage.size(field_file.name), int(modified.timestamp()))
+
+
+def serve_file(request, field_file, etag, last_modified=None):
+    """
+    Serves a stored file as an attachment, streaming it in chunks with
+    support for single byte ranges and conditional requests, or hands it
+    off to the front-end server when CMS_SENDFILE_BACKEND is set.
+    ``etag`` may be None.
+    """
+    timestamp = last_modified.timestamp() if last_modified else None
+    filename = posixpath.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        if SENDFILE_BACKEND:
+            response = _sendfile_response(field_file, content_type)
+        else:
+            storage = field_file.storage
+            size = storage.size(field_file.name)
+            try:
+                byte_range = None
+                if _range_applies(request, etag, timestamp):
+                    byte_range = parse_range(request.headers.get('Range'), size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+            file = storage.open(field_file.name, 'rb')
+            if byte_range is None:
+                response = FileResponse(file, content_type=content_type)
+                response.block_size = CHUNK_SIZE
+            else:
+                start, end = byte_range
+                response = StreamingHttpResponse(
+                    _iter_range(file, start, end - start + 1),
+                    status=206, content_type=content_type,
+                )
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+                response['Content-Length'] = str(end - start + 1)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        response['Accept-Ranges'] = 'bytes'
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+
+    if etag:
+        response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=DOWNLOAD_MAX_AGE)
+    return response
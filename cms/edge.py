@@ -0,0 +1,189 @@
+# cms/edge.py
+
+import logging
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import get_max_age, patch_cache_control
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# How long a shared cache (CDN, Varnish, nginx) may keep tagged responses.
+# Browsers always revalidate; purges keep the edge copy current.
+EDGE_MAX_AGE = getattr(settings, 'CMS_EDGE_MAX_AGE', 60 * 60 * 6)
+
+# Response header carrying the keys: Surrogate-Key (Fastly, Varnish with
+# vmod_xkey configured for it), xkey (Varnish default) or Cache-Tag.
+SURROGATE_KEY_HEADER = getattr(settings, 'CMS_SURROGATE_KEY_HEADER', 'Surrogate-Key')
+
+# Seconds purges are collected for before one batched purge is sent.
+PURGE_WINDOW = getattr(settings, 'CMS_EDGE_PURGE_WINDOW', 0.5)
+
+# Keys per purge request, keeping the header well below proxy limits
+PURGE_CHUNK_SIZE = 200
+
+NAVIGATION_KEY = 'nav'
+
+
+def page_key(slug):
+    return f'page:{slug}'
+
+
+def package_key(pk):
+    return f'package:{pk}'
+
+
+def tag_response(response, keys, max_age=None):
+    """
+    Adds surrogate ``keys`` to a response and lets shared caches keep it
+    for ``max_age`` (default CMS_EDGE_MAX_AGE) seconds. Browsers revalidate
+    every time unless the response already set its own max-age.
+    """
+    existing = response.get(SURROGATE_KEY_HEADER, '').split()
+    response[SURROGATE_KEY_HEADER] = ' '.join(dict.fromkeys(existing + list(keys)))
+    directives = {'public': True, 's_maxage': EDGE_MAX_AGE if max_age is None else max_age}
+    if get_max_age(response) is None:
+        directives['max_age'] = 0
+    patch_cache_control(response, **directives)
+    return response
+
+
+class NullPurgeBackend:
+    """
+    Default backend: there is no shared cache to purge.
+    """
+
+    def purge(self, keys):
+        pass
+
+
+class HTTPPurgeBackend:
+    """
+    Sends ``PURGE`` requests listing the keys in the surrogate key header
+    to every URL in CMS_EDGE_PURGE_URLS, as Varnish (vmod_xkey) and nginx
+    purge modules expect. Method and header can be changed in settings.
+    """
+
+    def __init__(self, urls=None, method=None, header=None, timeout=5):
+        self.urls = urls if urls is not None else getattr(settings, 'CMS_EDGE_PURGE_URLS', [])
+        self.method = method or getattr(settings, 'CMS_EDGE_PURGE_METHOD', 'PURGE')
+        self.header = header or SURROGATE_KEY_HEADER
+        self.timeout = timeout
+
+    def purge(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), PURGE_CHUNK_SIZE):
+            value = ' '.join(keys[start:start + PURGE_CHUNK_SIZE])
+            for url in self.urls:
+                request = urllib.request.Request(url, method=self.method, headers={self.header: value})
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+
+
+class PurgeDispatcher:
+    """
+    Collects surrogate keys to purge and sends them to the backend in one
+    deduplicated batch per ``window`` seconds, from a timer thread so
+    neither commits nor requests wait on the edge.
+    """
+
+    def __init__(self, backend, window=PURGE_WINDOW):
+        self.backend = backend
+        self.window = window
+        self._pending = set()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def queue(self, keys):
+        with self._lock:
+            self._pending.update(keys)
+            if self.window > 0 and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.window <= 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends everything queued so far. Returns the purged keys.
+        """
+        with self._lock:
+            keys, self._pending = self._pending, set()
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        if keys:
+            try:
+                self.backend.purge(sorted(keys))
+            except Exception:
+                logger.exception("Edge purge of %d keys failed", len(keys))
+        return keys
+
+
+_dispatcher = None
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        backend = getattr(settings, 'CMS_EDGE_PURGE_BACKEND', None) or 'cms.edge.NullPurgeBackend'
+        _dispatcher = PurgeDispatcher(import_string(backend)())
+    return _dispatcher
+
+
+def purge(*keys):
+    """
+    Purges surrogate keys from the edge once the current transaction
+    commits. Keys purged close together are sent as one batch.
+    """
+    keys = [key for key in keys if key]
+    if keys:
+        transaction.on_commit(lambda: get_dispatcher().queue(keys))
+
+
+class PurgeStandIn:
+    """
+    Local HTTP stand-in for a purging proxy, for tests and development:
+    records the keys of every purge request it receives.
+
+        with PurgeStandIn() as edge:
+            ...  # point HTTPPurgeBackend at edge.url
+            edge.requests  # [(method, [keys]), ...]
+    """
+
+    def __init__(self, header=None):
+        self.header = header or SURROGATE_KEY_HEADER
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _purge(self):
+                stand_in.requests.append((self.command, self.headers.get(stand_in.header, '').split()))
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_PURGE = do_POST = do_BAN = _purge
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def keys(self):
+        return [key for _, keys in self.requests for key in keys]
@@ -0,0 +1,374 @@
+# cms/export.py
+
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.handlers.base import BaseHandler
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .assets import bundle_manifest
+from .cache import HOME_PAGE_SLUG, PRICING_PAGE_SLUG, get_navigation
+from .compression import ENCODINGS, precompress
+from .gallery import gallery_page
+from .images import derivative_names, is_image, load_manifests
+from .models import GalleryItem, Page, PricingPackage
+
+MANIFEST_NAME = 'export-manifest.json'
+MANIFEST_VERSION = 1
+
+
+class ExportError(Exception):
+    pass
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def build_signature():
+    """
+    Digest of what every exported page depends on besides its own rows:
+    the navigation menu and the fingerprinted static and CSS bundle names.
+    When it changes, every page is rendered again.
+    """
+    static_manifest = None
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        static_manifest = staticfiles_storage.hashed_files
+    return _digest([get_navigation(), bundle_manifest(), static_manifest])
+
+
+def _pricing_stamp(offers):
+    # Approving a version is a queryset update that leaves updated_at alone,
+    # so the current versions are part of the stamp too, as are their
+    # previews, which appear once the job worker has made them.
+    stamp = []
+    for package in offers:
+        version = package.current_approved_version
+        stamp.append((package.pk, package.updated_at, getattr(version, 'pk', None), getattr(version, 'preview', None)))
+    return stamp
+
+
+def gallery_pages(page_id):
+    """
+    Every page of tiles of a page's gallery, following the cursors.
+    """
+    pages = [gallery_page(page_id)]
+    while pages[-1]['next']:
+        pages.append(gallery_page(page_id, pages[-1]['next']))
+    return pages
+
+
+def export_galleries():
+    """
+    Slug -> gallery_pages() of every public page.
+    """
+    return {slug: gallery_pages(pk) for pk, slug in Page.objects.filter(is_public=True).values_list('id', 'slug')}
+
+
+def gallery_file(slug, cursor):
+    # Export name of the gallery tiles after ``cursor``, standing in for the
+    # page_gallery endpoint, which the front-end server cannot answer
+    return reverse('cms:page_gallery', args=[slug]).strip('/') + f'/{cursor}.json'
+
+
+def gallery_links(galleries):
+    """
+    page_gallery endpoint URL -> export file URL, for every infinite-scroll
+    fetch the exported pages make.
+    """
+    links = {}
+    for slug, pages in galleries.items():
+        endpoint = reverse('cms:page_gallery', args=[slug])
+        for page in pages[:-1]:
+            links[f"{endpoint}?after={page['next']}"] = '/' + gallery_file(slug, page['next'])
+    return links
+
+
+def write_gallery(output_dir, slug, pages):
+    """
+    Writes the gallery pages after the first (which the page itself shows)
+    as JSON files, each linking the next through ``next_url``. Returns
+    their names.
+    """
+    names = []
+    for previous, page in zip(pages, pages[1:]):
+        name = gallery_file(slug, previous['next'])
+        data = dict(page, next_url='/' + gallery_file(slug, page['next']) if page['next'] else None)
+        path = Path(output_dir, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data, cls=DjangoJSONEncoder))
+        names.append(name)
+    return names
+
+
+def export_targets(offers, galleries):
+    """
+    URL -> stamp of every public page, given the current pricing ``offers``
+    and the public pages' ``galleries``. A page is rendered again when its
+    stamp differs from the one recorded by the previous export.
+    """
+    pages = Page.objects.filter(is_public=True).values_list('slug', 'last_updated')
+    targets = {}
+    for slug, last_updated in pages:
+        # The gallery tiles cover item edits and thumbnails becoming available
+        stamp = [last_updated, galleries.get(slug)]
+        if slug == PRICING_PAGE_SLUG:
+            stamp.append(_pricing_stamp(offers))
+        targets[reverse('cms:page_detail', args=[slug])] = _digest(stamp)
+    # The site root serves the home page whether or not it is public
+    home = Page.objects.filter(slug=HOME_PAGE_SLUG).values_list('last_updated', flat=True).first()
+    if home is not None:
+        targets[reverse('cms:home')] = _digest([home])
+    return targets
+
+
+def download_links(offers=None):
+    """
+    Download view URL -> MEDIA_URL of the file, for every current approved
+    version. Exported pages link to the file itself, which the front-end
+    server sends without Django.
+    """
+    if offers is None:
+        offers = PricingPackage.objects.current_offers()
+    links = {}
+    for package in offers:
+        version = package.current_approved_version
+        if version is not None and version.file:
+            links[reverse('cms:package_download', args=[version.pk])] = version.file
+    return links
+
+
+def default_host():
+    # A host that passes ALLOWED_HOSTS validation
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0] if hosts else 'localhost'
+
+
+def page_file(url):
+    return url.strip('/') + '/index.html' if url.strip('/') else 'index.html'
+
+
+_handler = None
+
+
+def _get_handler():
+    global _handler
+    if _handler is None:
+        # Published only once loaded: cache warming calls this from threads
+        handler = BaseHandler()
+        handler.load_middleware()
+        _handler = handler
+    return _handler
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def render_pages(output_dir, urls, host, links):
+    """
+    Renders ``urls`` through the full middleware stack and writes them
+    under ``output_dir``. Returns {url: sha256 of the written HTML}.
+    """
+    factory = RequestFactory(SERVER_NAME=host)
+    handler = _get_handler()
+    written = {}
+    for url in urls:
+        response = handler.get_response(factory.get(url))
+        if response.status_code != 200:
+            raise ExportError(f"{url} returned HTTP {response.status_code}")
+        html = response.content.decode(response.charset)
+        for download, media_url in links.items():
+            html = html.replace(f'"{download}"', f'"{media_url}"')
+        data = html.encode()
+
+        path = Path(output_dir, page_file(url))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed, so the server never sends half a page
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        written[url] = hashlib.sha256(data).hexdigest()
+    return written
+
+
+def sync_file(source, target):
+    """
+    Copies ``source`` to ``target`` unless an identical-looking copy
+    (same size and mtime) is already there. Returns True if copied.
+    """
+    source, target = Path(source), Path(target)
+    stat = source.stat()
+    try:
+        existing = target.stat()
+        if existing.st_size == stat.st_size and int(existing.st_mtime) == int(stat.st_mtime):
+            return False
+    except FileNotFoundError:
+        pass
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(source, target)
+    return True
+
+
+def _remove(output_dir, name):
+    path = Path(output_dir, name)
+    for candidate in [path] + [path.with_name(path.name + suffix) for _, suffix in ENCODINGS]:
+        candidate.unlink(missing_ok=True)
+
+
+def _media_dir(output_dir):
+    return Path(output_dir, settings.MEDIA_URL.strip('/'))
+
+
+def export_media(output_dir, files):
+    """
+    Copies the given media FieldFiles, or default storage names, into the
+    export's MEDIA_URL tree.
+    """
+    copied = 0
+    for file in files:
+        name, storage = (file, default_storage) if isinstance(file, str) else (file.name, file.storage)
+        try:
+            source = storage.path(name)
+        except NotImplementedError:  # remote storage; nothing to copy
+            continue
+        if os.path.exists(source):
+            copied += sync_file(source, _media_dir(output_dir) / name)
+    return copied
+
+
+def derivative_files(offers, gallery_names):
+    """
+    Storage names of the package previews and gallery image derivatives
+    the exported pages link to.
+    """
+    names = []
+    for package in offers:
+        preview = getattr(package.current_approved_version, 'preview', None)
+        if preview:
+            names += derivative_names(preview)
+    for manifest in load_manifests([name for name in gallery_names if is_image(name)]).values():
+        if manifest:
+            names += derivative_names(manifest)
+    return names
+
+
+def export_static(output_dir):
+    """
+    Mirrors STATIC_ROOT (after collectstatic) into the export's STATIC_URL
+    tree. The names are fingerprinted, so only new files are copied.
+    """
+    root = Path(settings.STATIC_ROOT)
+    target = Path(output_dir, settings.STATIC_URL.strip('/'))
+    copied = 0
+    for path in root.rglob('*'):
+        if path.is_file():
+            copied += sync_file(path, target / path.relative_to(root))
+    return copied
+
+
+def load_export_manifest(output_dir):
+    path = Path(output_dir, MANIFEST_NAME)
+    if not path.exists():
+        return {}
+    manifest = json.loads(path.read_text())
+    return manifest if manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def export_site(output_dir, host=None, workers=None, full=False):
+    """
+    Renders every public page into ``output_dir`` as ``<url>/index.html``,
+    plus the media they link to and the JSON files their galleries scroll
+    through. Only pages whose stamp (or the build
+    signature) changed since the previous export are rendered; pages no
+    longer public are removed. Rendering is spread over ``workers``
+    processes; with one worker it runs in this process.
+
+    Returns a dict with the rendered, unchanged and removed URLs and the
+    number of media files copied.
+    """
+    output_dir = Path(output_dir)
+    previous = load_export_manifest(output_dir)
+    previous_pages = previous.get('pages', {})
+    signature = build_signature()
+    # Stamps only count when nothing shared by every page has changed
+    stamps = {} if full or previous.get('signature') != signature else previous_pages
+
+    offers = list(PricingPackage.objects.current_offers())
+    downloads = download_links(offers)
+    galleries = export_galleries()
+    links = {url: settings.MEDIA_URL + f.name for url, f in downloads.items()}
+    links.update(gallery_links(galleries))
+    targets = export_targets(offers, galleries)
+    stale = sorted(
+        url for url, stamp in targets.items()
+        if stamps.get(url, {}).get('stamp') != stamp or not (output_dir / page_file(url)).exists()
+    )
+
+    host = host or default_host()
+    workers = workers or os.cpu_count() or 1
+    written = {}
+    if workers == 1 or len(stale) < 2:
+        written = render_pages(output_dir, stale, host, links)
+    else:
+        chunks = [stale[i::workers] for i in range(workers) if stale[i::workers]]
+        # Workers open their own database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker) as pool:
+            for result in pool.map(render_pages, [output_dir] * len(chunks), chunks,
+                                   [host] * len(chunks), [links] * len(chunks)):
+                written.update(result)
+
+    gallery_files = {url: previous_pages.get(url, {}).get('gallery', []) for url in targets}
+    for slug, pages in galleries.items():
+        url = reverse('cms:page_detail', args=[slug])
+        if url in written:
+            gallery_files[url] = write_gallery(output_dir, slug, pages)
+            for name in set(previous_pages.get(url, {}).get('gallery', [])) - set(gallery_files[url]):
+                _remove(output_dir, name)
+
+    removed = sorted(set(previous_pages) - set(targets))
+    for url in removed:
+        for name in [previous_pages[url]['file']] + previous_pages[url].get('gallery', []):
+            _remove(output_dir, name)
+    if written:
+        precompress(output_dir, [page_file(url) for url in written] + [
+            name for url in written for name in gallery_files[url]
+        ])
+
+    files = list(downloads.values())
+    files += [item.media_file for item in GalleryItem.objects.filter(page__is_public=True).exclude(media_file='')]
+    files += derivative_files(offers, [f.name for f in files[len(downloads):]])
+    copied = export_media(output_dir, files)
+
+    pages = {
+        url: {
+            'stamp': stamp,
+            'file': page_file(url),
+            'sha256': written.get(url) or previous_pages.get(url, {}).get('sha256'),
+            'gallery': gallery_files[url],
+        }
+        for url, stamp in targets.items()
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    Path(output_dir, MANIFEST_NAME).write_text(json.dumps(
+        {'version': MANIFEST_VERSION, 'signature': signature, 'pages': pages}, indent=2, sort_keys=True,
+    ))
+    return {
+        'rendered': sorted(written),
+        'unchanged': sorted(set(targets) - set(written)),
+        'removed': removed,
+        'media': copied,
+    }
@@ -1,9 +1,7 @@
 from django import forms
-from .models import PricingDocument
 
-class PricingDocumentForm(forms.ModelForm):
-    class Meta:
-        model = PricingDocument
-        # We'll allow selection of the PricingYear via the ForeignKey,
-        # and file upload; version, approval, etc. are managed automatically.
-        fields = ['year', 'file']
+
+class PackageImportForm(forms.Form):
+    archive = forms.FileField(
+        help_text="ZIP of package PDFs with a manifest.csv or manifest.json (segment, year, name, file).",
+    )
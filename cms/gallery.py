@@ -0,0 +1,123 @@
+# cms/gallery.py
+
+import base64
+import binascii
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db.models import Q
+
+from .images import SOURCE_TYPES, is_image, load_manifests, srcset
+from .models import GalleryItem
+
+# Items per gallery page, in the page itself and per infinite-scroll fetch
+GALLERY_PAGE_SIZE = getattr(settings, 'CMS_GALLERY_PAGE_SIZE', 24)
+MAX_GALLERY_PAGE_SIZE = 100
+
+# Rendered width of a gallery thumbnail, for the browser's srcset choice
+THUMBNAIL_SIZES = '(max-width: 480px) 50vw, (max-width: 1200px) 33vw, 25vw'
+
+
+def encode_cursor(item):
+    """
+    Opaque keyset cursor pointing just past ``item``.
+    """
+    raw = f'{item.uploaded_at.isoformat()}|{item.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    (uploaded_at, id) from a cursor; raises ValueError when malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Invalid gallery cursor {cursor!r}") from e
+
+
+def gallery_queryset(page_id, after=None):
+    """
+    The page's items in upload order, starting after the ``after`` cursor.
+    Served by the (page, uploaded_at, id) index without an OFFSET scan.
+    """
+    items = (
+        GalleryItem.objects.filter(page_id=page_id)
+        .only('id', 'caption', 'media_file', 'uploaded_at')
+        .order_by('uploaded_at', 'id')
+    )
+    if after:
+        uploaded_at, pk = decode_cursor(after)
+        items = items.filter(Q(uploaded_at__gt=uploaded_at) | Q(uploaded_at=uploaded_at, id__gt=pk))
+    return items
+
+
+def item_data(item, manifest):
+    """
+    What a gallery tile needs, as plain data for the template and the JSON
+    endpoint. Tiles start from the smallest derivative; ``full`` is the
+    largest one, or the original while derivatives are pending.
+    """
+    url = item.media_file.storage.url
+    data = {
+        'id': item.pk,
+        'caption': item.caption,
+        'full': item.media_file.url,
+        'thumbnail': None,
+        'srcset': '',
+        'sources': [],
+        'width': None,
+        'height': None,
+    }
+    if manifest:
+        variants = manifest['variants']
+        jpeg = variants['jpeg']
+        data.update(
+            full=url(jpeg[-1]['name']),
+            thumbnail=url(jpeg[0]['name']),
+            srcset=srcset(jpeg, url),
+            sources=[
+                {'type': mime, 'srcset': srcset(variants[fmt], url)}
+                for fmt, mime in SOURCE_TYPES if variants.get(fmt)
+            ],
+            width=jpeg[0]['width'],
+            height=round(manifest['height'] * jpeg[0]['width'] / manifest['width']),
+        )
+    elif is_image(item.media_file.name):
+        data['thumbnail'] = data['full']
+    return data
+
+
+def _page_data(items, limit, manifests):
+    return {
+        'items': [item_data(item, manifests.get(item.media_file.name)) for item in items[:limit]],
+        'next': encode_cursor(items[limit - 1]) if len(items) > limit else None,
+        'sizes': THUMBNAIL_SIZES,
+    }
+
+
+def _image_names(items, limit):
+    return [item.media_file.name for item in items[:limit] if is_image(item.media_file.name)]
+
+
+def gallery_page(page_id, after=None, limit=GALLERY_PAGE_SIZE):
+    """
+    One page of gallery tiles: ``{'items': [...], 'next': cursor or None,
+    'sizes': thumbnail sizes attribute}``.
+    """
+    items = list(gallery_queryset(page_id, after)[:limit + 1])
+    return _page_data(items, limit, load_manifests(_image_names(items, limit)))
+
+
+async def agallery_page(page_id, after=None, limit=GALLERY_PAGE_SIZE):
+    """
+    Async counterpart of ``gallery_page()``. The items come from the async
+    ORM; derivative manifests are read from storage in a thread.
+    """
+    items = [item async for item in gallery_queryset(page_id, after)[:limit + 1]]
+    manifests = await sync_to_async(load_manifests)(_image_names(items, limit))
+    return _page_data(items, limit, manifests)
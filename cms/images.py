@@ -0,0 +1,178 @@
+# cms/images.py
+
+import io
+import json
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+
+from .jobs import enqueue
+
+logger = logging.getLogger(__name__)
+
+# Widths (px) of the generated variants. Wider ones than the source are skipped.
+BREAKPOINTS = getattr(settings, 'CMS_IMAGE_BREAKPOINTS', (480, 768, 1200, 1920))
+
+# Output formats in order of preference, with their Pillow save options.
+FORMATS = {
+    'avif': {'quality': 50},
+    'webp': {'quality': 75, 'method': 4},
+    'jpeg': {'quality': 80, 'optimize': True, 'progressive': True},
+}
+
+# MIME types of the <source> elements, best compression first
+SOURCE_TYPES = (('avif', 'image/avif'), ('webp', 'image/webp'))
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_CACHE_KEY = 'cms:image-manifest:{name}'
+
+# How long "no derivatives yet" is remembered, sparing a storage lookup per
+# image per request. Generating derivatives replaces the entry at once.
+MISSING_MANIFEST_TIMEOUT = 300
+
+
+def is_image(name):
+    return bool(name) and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def derivatives_dir(name):
+    """
+    Directory next to the original that holds its variants and manifest,
+    e.g. ``gallery_media/cake.jpg`` -> ``gallery_media/cake.derivatives``.
+    """
+    return posixpath.splitext(name)[0] + '.derivatives'
+
+
+def static_source_storage():
+    """
+    Storage over the project's static source directory (not STATIC_ROOT).
+    """
+    return FileSystemStorage(location=settings.BASE_DIR / 'static', base_url=settings.STATIC_URL)
+
+
+def pillow():
+    """
+    Returns Pillow's (Image, ImageOps, features) modules, or None when it
+    is not installed. Imported on first use: serving pages never needs it.
+    """
+    try:
+        from PIL import Image, ImageOps, features
+    except ImportError:  # Pillow is optional; without it no derivatives are made
+        return None
+    return Image, ImageOps, features
+
+
+def _supported_formats(features):
+    return [fmt for fmt in FORMATS if fmt == 'jpeg' or features.check(fmt)]
+
+
+def generate_derivatives(name, storage=default_storage):
+    """
+    Writes resized variants of an image at every breakpoint and in every
+    supported format, plus a manifest describing them. Returns the manifest,
+    or None if the file is not a readable image.
+    """
+    modules = pillow()
+    if modules is None:
+        logger.warning("Pillow is not installed; skipping derivatives for %s", name)
+        return None
+    Image, ImageOps, features = modules
+
+    with storage.open(name, 'rb') as source:
+        try:
+            original = Image.open(source)
+            original.load()
+        except (OSError, Image.DecompressionBombError):
+            logger.exception("Could not read image %s", name)
+            return None
+    original = ImageOps.exif_transpose(original)
+
+    width, height = original.size
+    widths = [w for w in BREAKPOINTS if w < width] + [min(width, max(BREAKPOINTS))]
+    directory = derivatives_dir(name)
+    manifest = {'source': name, 'width': width, 'height': height, 'variants': {}}
+
+    for fmt in _supported_formats(features):
+        image = original
+        if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        variants = []
+        for target in sorted(set(widths)):
+            resized = image.resize((target, round(height * target / width)), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), **FORMATS[fmt])
+            variant_name = posixpath.join(directory, f'{target}.{"jpg" if fmt == "jpeg" else fmt}')
+            if storage.exists(variant_name):
+                storage.delete(variant_name)
+            variant_name = storage.save(variant_name, ContentFile(buffer.getvalue()))
+            variants.append({'width': target, 'name': variant_name})
+        manifest['variants'][fmt] = variants
+
+    manifest_name = posixpath.join(directory, MANIFEST_NAME)
+    if storage.exists(manifest_name):
+        storage.delete(manifest_name)
+    storage.save(manifest_name, ContentFile(json.dumps(manifest).encode()))
+    cache.set(MANIFEST_CACHE_KEY.format(name=name), manifest, None)
+    return manifest
+
+
+def derivative_names(manifest):
+    """
+    Storage names of every variant listed in a manifest.
+    """
+    return [variant['name'] for variants in manifest['variants'].values() for variant in variants]
+
+
+def srcset(variants, url):
+    """
+    A srcset value over derivative ``variants``, with ``url`` turning a
+    storage name into its public URL.
+    """
+    return ', '.join(f"{url(variant['name'])} {variant['width']}w" for variant in variants)
+
+
+def load_manifests(names, storage=default_storage):
+    """
+    Returns {name: manifest or None} for several images, with one cache
+    round trip for all of them.
+    """
+    keys = {MANIFEST_CACHE_KEY.format(name=name): name for name in names}
+    cached = cache.get_many(keys)
+    manifests = {}
+    for key, name in keys.items():
+        manifest = cached.get(key)
+        if manifest is None:
+            manifest_name = posixpath.join(derivatives_dir(name), MANIFEST_NAME)
+            if storage.exists(manifest_name):
+                with storage.open(manifest_name, 'rb') as f:
+                    manifest = json.load(f)
+                cache.set(key, manifest, None)
+            else:
+                # An empty dict marks "none yet" in the cache
+                manifest = {}
+                cache.set(key, manifest, MISSING_MANIFEST_TIMEOUT)
+        manifests[name] = manifest or None
+    return manifests
+
+
+def load_manifest(name, storage=default_storage):
+    """
+    Returns the derivative manifest of an image, or None if none exists yet.
+    """
+    return load_manifests([name], storage)[name]
+
+
+def schedule_derivatives(name, page_id=None):
+    """
+    Queues derivative generation as a background job, so uploads never
+    wait for image encoding. Once the derivatives are written, cached
+    copies of page ``page_id`` showing the original are dropped.
+    """
+    if is_image(name):
+        enqueue('gallery_derivatives', key=f'derivatives:{name}', name=name, page_id=page_id)
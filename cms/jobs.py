@@ -0,0 +1,189 @@
+# cms/jobs.py
+
+import logging
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Attempts before a job is marked failed
+MAX_ATTEMPTS = getattr(settings, 'CMS_JOB_MAX_ATTEMPTS', 5)
+
+# Retry delay after the first failure; it doubles on every further failure
+# up to MAX_BACKOFF.
+BACKOFF = getattr(settings, 'CMS_JOB_BACKOFF', 10)
+MAX_BACKOFF = 60 * 60
+
+# A running job whose worker has been silent this long is picked up again
+LOCK_TIMEOUT = getattr(settings, 'CMS_JOB_LOCK_TIMEOUT', 60 * 10)
+
+TASKS = {}
+
+
+class PermanentFailure(Exception):
+    """
+    Raised by a task to fail its job at once, without further attempts.
+    """
+
+
+def task(name):
+    """
+    Registers a function as the handler of jobs named ``name``. It is
+    called with the job's payload as keyword arguments, at least once:
+    handlers must be safe to run again after a partial failure.
+    """
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(task_name, /, key=None, **payload):
+    """
+    Queues a job in the current transaction, so it exists exactly when the
+    data it works on does. The payload must be JSON-serialisable.
+
+    With a ``key``, a job with that key that is still queued absorbs this
+    one; a finished or running one is queued to run again.
+    """
+    if task_name not in TASKS:
+        raise KeyError(f"Unknown job task {task_name!r}")
+    if getattr(settings, 'CMS_JOBS_EAGER', False):
+        # Runs the handler after commit in this process, e.g. in development
+        transaction.on_commit(lambda: _run_eagerly(task_name, payload))
+        return
+    if key is None:
+        Job.objects.create(task=task_name, payload=payload)
+        return
+    requeued = Job.objects.filter(key=key).exclude(status=Job.QUEUED).update(
+        task=task_name, payload=payload, status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+        locked_by='', locked_at=None, last_error='', finished_at=None,
+    )
+    if not requeued:
+        Job.objects.bulk_create([Job(task=task_name, payload=payload, key=key)], ignore_conflicts=True)
+
+
+def _run_eagerly(task_name, payload):
+    try:
+        TASKS[task_name](**payload)
+    except Exception:
+        logger.exception("Job %s failed", task_name)
+
+
+def backoff(attempts):
+    """
+    Seconds to wait before retrying a job that failed ``attempts`` times.
+    """
+    return min(BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit):
+    """
+    Marks up to ``limit`` due jobs as running for ``worker`` and returns
+    them. Rows other workers are claiming are skipped rather than waited
+    for, so any number of workers can poll the same table.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=LOCK_TIMEOUT)
+    due = Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+    lock = {'skip_locked': True} if connection.features.has_select_for_update_skip_locked else {}
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(**lock).filter(due)
+            .order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # Re-checked here for backends without row locks
+        Job.objects.filter(due, pk__in=ids).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(pk__in=ids, status=Job.RUNNING, locked_by=worker, locked_at=now))
+
+
+def run(job):
+    """
+    Runs one claimed job and records the outcome. A failed job is queued
+    again after ``backoff()`` until it has used MAX_ATTEMPTS attempts.
+    Returns True on success.
+    """
+    mine = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+    try:
+        handler = TASKS.get(job.task)
+        if handler is None:
+            raise PermanentFailure(f"Unknown job task {job.task!r}")
+        handler(**job.payload)
+    except Exception as e:
+        error = traceback.format_exc()
+        if isinstance(e, PermanentFailure) or job.attempts >= MAX_ATTEMPTS:
+            logger.error("Job %s failed after %d attempts: %s", job, job.attempts, e)
+            mine.update(status=Job.FAILED, last_error=error, finished_at=timezone.now())
+        else:
+            logger.warning("Job %s failed, retrying: %s", job, e)
+            run_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+            mine.update(status=Job.QUEUED, last_error=error, run_at=run_at, locked_by='', locked_at=None)
+        return False
+    # No-op when the key was queued again while this ran
+    mine.update(status=Job.DONE, finished_at=timezone.now())
+    return True
+
+
+def _run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        # Each pool thread has its own connection
+        connection.close()
+
+
+def work(workers=1, batch=None, once=False, poll_interval=1.0, worker=None):
+    """
+    Claims and runs due jobs, ``workers`` at a time in a thread pool. With
+    ``once`` it returns when no job is due, otherwise it polls every
+    ``poll_interval`` seconds. Returns the number of jobs run.
+    """
+    worker = worker or worker_name()
+    batch = batch or workers
+    processed = 0
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cms-jobs') if workers > 1 else None
+    try:
+        while True:
+            jobs = claim(worker, batch)
+            if jobs:
+                if pool is None:
+                    for job in jobs:
+                        run(job)
+                else:
+                    list(pool.map(_run_in_thread, jobs))
+                processed += len(jobs)
+                continue
+            if once:
+                return processed
+            close_old_connections()
+            time.sleep(poll_interval)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def prune(older_than):
+    """
+    Deletes jobs that finished more than ``older_than`` (a timedelta) ago.
+    """
+    cutoff = timezone.now() - older_than
+    return Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff).delete()[0]
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from cms.archive import archive_pricing
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves packages of past years, and versions superseded by a newer "
+        "one, into the read-only pricing archive. Safe to run repeatedly, "
+        "e.g. once a year after the new year's packages are approved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before-year', type=int, default=None,
+            help="Archive packages of years before this one (default: the current year)",
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        packages, versions = archive_pricing(options['before_year'], batch_size=options['batch_size'])
+        self.stdout.write(f"Archived {packages} packages and {versions} versions.")
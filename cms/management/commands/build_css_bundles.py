@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cms.assets import DEFAULT_SAFELIST, build_bundles, used_tokens
+from cms.models import Page
+
+
+class Command(BaseCommand):
+    help = (
+        "Bundles the scraped per-page stylesheets into one minified, "
+        "fingerprinted CSS file per page, purging selectors not used by "
+        "the templates or page content."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=settings.CMS_CSS_SOURCE_DIR, help="Directory of scraped CSS")
+        parser.add_argument('--output', default=settings.CMS_CSS_BUNDLE_DIR, help="Bundle output directory")
+        parser.add_argument('--no-purge', action='store_true', help="Keep every selector")
+        parser.add_argument(
+            '--safelist', action='append', default=[], metavar='CLASS',
+            help="Class or id to keep even if unused (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        used = None
+        if not options['no_purge']:
+            sources = [path.read_text(errors='replace') for path in Path(settings.BASE_DIR, 'Templates').rglob('*.html')]
+            sources += Page.objects.values_list('content', flat=True)
+            used = used_tokens(sources) | DEFAULT_SAFELIST | set(options['safelist'])
+
+        manifest, builder = build_bundles(options['source'], options['output'], used)
+        for page, name in sorted(manifest.items()):
+            size = (Path(options['output']) / Path(name).name).stat().st_size
+            self.stdout.write(f"{page}: {name} ({size // 1024} KB)")
+        self.stdout.write(f"{builder.unique_sheets} unique stylesheets bundled into {len(manifest)} pages.")
@@ -0,0 +1,50 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cms.models import (
+    ArchivedPricingPackage, ArchivedPricingPackageVersion, PricingPackage, PricingPackageVersion,
+)
+from cms.storage import get_package_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves package and version files stored before content addressing "
+        "into the shared blob store, so identical files are kept once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-originals', action='store_true',
+            help="Delete the old per-row copies once every row points at a blob.",
+        )
+
+    def handle(self, *args, **options):
+        storage = get_package_storage()
+        blobs = {}  # old name -> blob name
+        moved = 0
+
+        with transaction.atomic():
+            for model in (
+                PricingPackage, PricingPackageVersion, ArchivedPricingPackage, ArchivedPricingPackageVersion,
+            ):
+                for obj in model.objects.exclude(file='').only('pk', 'file'):
+                    name = obj.file.name
+                    if storage.content_hash(name):
+                        continue
+                    if name not in blobs:
+                        if not default_storage.exists(name):
+                            self.stderr.write(f"Missing file {name} for {model.__name__} {obj.pk}")
+                            continue
+                        with default_storage.open(name, 'rb') as f:
+                            blobs[name] = storage.save(name, f)
+                    model.objects.filter(pk=obj.pk).update(file=blobs[name])
+                    moved += 1
+
+        if options['delete_originals']:
+            for name in blobs:
+                default_storage.delete(name)
+
+        unique = len(set(blobs.values()))
+        self.stdout.write(f"Moved {moved} rows from {len(blobs)} files into {unique} blobs.")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from cms.bulk import stream_export
+from cms.models import PricingPackage
+
+
+class Command(BaseCommand):
+    help = "Exports pricing packages as a ZIP that import_packages can read back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="ZIP file to write")
+        parser.add_argument('--year', type=int, action='append', help="Only these years (repeatable)")
+        parser.add_argument('--approved', action='store_true', help="Only approved packages")
+
+    def handle(self, *args, **options):
+        queryset = PricingPackage.objects.order_by('year__year', 'segment', 'package_name')
+        if options['year']:
+            queryset = queryset.filter(year__year__in=options['year'])
+        if options['approved']:
+            queryset = queryset.filter(approved=True)
+        with open(options['output'], 'wb') as f:
+            for chunk in stream_export(queryset):
+                f.write(chunk)
+        self.stdout.write(f"Wrote {options['output']}.")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from cms.bulk import HISTORY_FORMATS, stream_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes every version of every pricing package, including the "
+        "archive, as CSV or JSON. Rows are streamed, so memory use stays "
+        "flat however long the history is."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write")
+        parser.add_argument('--format', choices=HISTORY_FORMATS, default='csv')
+
+    def handle(self, *args, **options):
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for chunk in stream_history(options['format']):
+                f.write(chunk)
+        self.stdout.write(f"Wrote {options['output']}.")
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from cms.export import ExportError, export_site, export_static
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-renders every public page, the pricing downloads and gallery "
+        "media into a static tree that nginx can serve without Django. "
+        "Only pages changed since the previous export are rendered again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.CMS_EXPORT_DIR, help="Export directory")
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (default: CPU count)")
+        parser.add_argument('--full', action='store_true', help="Render every page, e.g. after template changes")
+        parser.add_argument('--host', default=None, help="Host name the pages are rendered for")
+        parser.add_argument(
+            '--skip-static', action='store_true',
+            help="Do not run collectstatic or copy STATIC_ROOT into the export",
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if not options['skip_static']:
+            if not isinstance(staticfiles_storage, ManifestFilesMixin):
+                raise CommandError(
+                    "Exported pages need fingerprinted static files: run with DEBUG off "
+                    "(FingerprintedStaticFilesStorage) or pass --skip-static."
+                )
+            call_command('collectstatic', interactive=False, verbosity=0)
+            copied = export_static(output)
+            self.stdout.write(f"Copied {copied} static files.")
+
+        try:
+            result = export_site(
+                output, host=options['host'],
+                workers=options['workers'], full=options['full'],
+            )
+        except ExportError as e:
+            raise CommandError(e)
+        for url in result['rendered']:
+            self.stdout.write(f"Rendered {url}")
+        for url in result['removed']:
+            self.stdout.write(f"Removed {url}")
+        self.stdout.write(
+            f"{len(result['rendered'])} pages rendered, {len(result['unchanged'])} unchanged, "
+            f"{len(result['removed'])} removed; {result['media']} media files copied."
+        )
@@ -0,0 +1,34 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from cms.images import generate_derivatives, is_image, static_source_storage
+from cms.models import GalleryItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates responsive image derivatives. Without arguments, processes "
+        "every GalleryItem image; otherwise the given media names."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Media storage names, e.g. page_backgrounds/VN_Slide_0.jpg")
+        parser.add_argument(
+            '--static', action='append', default=[], metavar='PATH',
+            help="Image path under the static directory, e.g. images/VN_Slide_0.jpg (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        jobs = [(name, default_storage) for name in options['names']]
+        jobs += [(path, static_source_storage()) for path in options['static']]
+        if not jobs:
+            names = GalleryItem.objects.values_list('media_file', flat=True)
+            jobs = [(name, default_storage) for name in names if is_image(name)]
+
+        for name, storage in jobs:
+            manifest = generate_derivatives(name, storage)
+            if manifest is None:
+                self.stderr.write(f"Skipped {name}")
+                continue
+            count = sum(len(variants) for variants in manifest['variants'].values())
+            self.stdout.write(f"{name}: {count} variants")
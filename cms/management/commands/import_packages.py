@@ -0,0 +1,27 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from cms.bulk import import_packages
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports pricing packages from a directory or ZIP of PDFs with a "
+        "manifest.csv/manifest.json (segment, year, name, file)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Directory or ZIP archive")
+        parser.add_argument('--manifest', help="Manifest path, if not inside the source")
+        parser.add_argument('--uploader', default='import', help="Uploader recorded on new versions")
+        parser.add_argument('--workers', type=int, default=4, help="Parallel file writers")
+
+    def handle(self, *args, **options):
+        try:
+            created, updated = import_packages(
+                options['source'], options['uploader'],
+                manifest=options['manifest'], workers=options['workers'],
+            )
+        except ValidationError as e:
+            raise CommandError('\n'.join(e.messages))
+        self.stdout.write(f"Created {created} packages, added new versions to {updated}.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from cms.search import rebuild_search_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the searchable text of every page. Needed after pages "
+        "are written without Page.save(), e.g. by bulk_create() or raw SQL; "
+        "the full-text index follows the column automatically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = rebuild_search_text(batch_size=options['batch_size'])
+        self.stdout.write(f"Updated search text of {updated} pages.")
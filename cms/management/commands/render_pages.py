@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from cms.tasks import queue_render, rerender_pages
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-renders the content of pages rendered by an older version of the "
+        "content pipeline, or never rendered (e.g. written by bulk_create()). "
+        "migrate queues this as a background job by itself; use --queue to "
+        "queue it, or run it here to render everything at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--queue', action='store_true', help="Queue the background job instead")
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            queue_render()
+            self.stdout.write("Queued the page re-render.")
+            return
+        rendered = rerender_pages(batch_size=options['batch_size'])
+        self.stdout.write(f"Re-rendered {rendered} pages.")
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from cms.jobs import prune, work
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs background jobs (image derivatives, file hashing, upload scans) "
+        "from the job table. Any number of workers can run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Jobs run in parallel, in threads")
+        parser.add_argument('--batch', type=int, help="Jobs claimed per poll (default: --workers)")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle")
+        parser.add_argument(
+            '--prune-days', type=int, default=7,
+            help="Delete finished jobs older than this many days on start (0 keeps them)",
+        )
+
+    def handle(self, *args, **options):
+        if options['prune_days']:
+            pruned = prune(timedelta(days=options['prune_days']))
+            if pruned:
+                self.stdout.write(f"Pruned {pruned} finished jobs.")
+        processed = work(
+            workers=options['workers'],
+            batch=options['batch'],
+            once=options['once'],
+            poll_interval=options['poll_interval'],
+        )
+        self.stdout.write(f"Ran {processed} jobs.")
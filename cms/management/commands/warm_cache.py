@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from cms.cache import bump_generation
+from cms.warmup import warm_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the shared page cache by requesting the site root, the pricing "
+        "page and every other public page in parallel. Run it after a deploy, "
+        "with --new-generation when templates or the page rendering changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Pages requested in parallel")
+        parser.add_argument(
+            '--new-generation', action='store_true',
+            help="Orphan every cached page and menu in all processes first",
+        )
+        parser.add_argument(
+            '--base-url', default=None,
+            help="Request the pages from this running server instead of rendering them here",
+        )
+        parser.add_argument('--host', default=None, help="Host name the pages are rendered for")
+
+    def handle(self, *args, **options):
+        if options['new_generation']:
+            bump_generation()
+            self.stdout.write("Started a new cache generation.")
+        statuses = warm_cache(workers=options['workers'], base_url=options['base_url'], host=options['host'])
+        for url, status in statuses.items():
+            if status != 200:
+                self.stderr.write(f"{url} returned {status or 'no response'}")
+        warmed = sum(status == 200 for status in statuses.values())
+        self.stdout.write(f"Warmed {warmed} of {len(statuses)} pages.")
@@ -0,0 +1,176 @@
+# cms/metrics.py
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django import shortcuts
+from django.db import connections
+
+# Upper bounds of the histogram buckets. Seconds for durations, plain
+# numbers for query counts and bytes.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Cumulative Prometheus-style histogram, one series per label value.
+    Observing costs a bisect and a locked increment.
+    """
+
+    def __init__(self, name, documentation, label, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        """
+        Yields (label value, [(le, cumulative count), ...], sum, count).
+        """
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_value, series in sorted(snapshot.items()):
+            cumulative, total = [], 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                total += count
+                cumulative.append((bound, total))
+            yield label_value, cumulative, series[-1], total
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_SECONDS = Histogram(
+    'cms_request_duration_seconds', "Time spent handling the request.", 'view', DURATION_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'cms_request_db_queries', "ORM queries executed per request.", 'view', COUNT_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    'cms_request_db_seconds', "Time spent in database queries per request.", 'view', DURATION_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    'cms_response_size_bytes', "Size of the response body as sent.", 'view', SIZE_BUCKETS,
+)
+TEMPLATE_SECONDS = Histogram(
+    'cms_template_render_seconds', "Template render time, including templates it extends or includes.",
+    'template', DURATION_BUCKETS,
+)
+CONTEXT_PROCESSOR_SECONDS = Histogram(
+    'cms_context_processor_seconds', "Time spent in a context processor, including lazy values it returned.",
+    'processor', DURATION_BUCKETS,
+)
+
+HISTOGRAMS = (
+    REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, RESPONSE_BYTES, TEMPLATE_SECONDS, CONTEXT_PROCESSOR_SECONDS,
+)
+
+
+class RequestMetrics:
+    """
+    Timings collected while one request is handled.
+    """
+    __slots__ = ('queries', 'db_seconds', 'templates', 'processors')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.templates = {}
+        self.processors = {}
+
+    def add(self, kind, name, seconds):
+        totals = getattr(self, kind)
+        totals[name] = totals.get(name, 0.0) + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+current = ContextVar('cms_request_metrics', default=None)
+
+
+def timed(kind, name):
+    """
+    Decorator adding the wrapped call's duration to the current request's
+    ``kind`` totals ('templates' or 'processors') under ``name``. Outside
+    an instrumented request it calls straight through.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = current.get()
+            if metrics is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.add(kind, name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def queries_recorded(request_metrics):
+    """
+    Counts and times, through connection.execute_wrapper(), the queries run
+    on every configured database while the block is active. Connections
+    are per thread, so only queries run in the calling thread are seen.
+    """
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(request_metrics))
+        yield
+
+
+def render(request, template_name, context=None, **kwargs):
+    """
+    ``django.shortcuts.render``, adding the render time (including templates
+    it extends or includes) to the current request's template totals.
+    """
+    return timed('templates', template_name)(shortcuts.render)(request, template_name, context, **kwargs)
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """
+    All histograms in the Prometheus text exposition format (0.0.4).
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.append(f'# HELP {histogram.name} {histogram.documentation}')
+        lines.append(f'# TYPE {histogram.name} histogram')
+        for label_value, buckets, total, count in histogram.samples():
+            label = '%s="%s"' % (histogram.label, label_value.replace('\\', r'\\').replace('"', r'\"'))
+            for bound, cumulative in buckets:
+                lines.append(f'{histogram.name}_bucket{{{label},le="{_format(bound)}"}} {cumulative}')
+            lines.append(f'{histogram.name}_sum{{{label}}} {_format(total)}')
+            lines.append(f'{histogram.name}_count{{{label}}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,194 @@
+# cms/middleware.py
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.utils.cache import has_vary_header, patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+from . import metrics
+from .compression import DYNAMIC_LEVELS, MIN_SIZE, accepted_encodings, available_encodings, compress
+
+COMPRESSIBLE_TYPES = _lazy_re_compile(r'^(text/|application/(json|javascript|xml)|image/svg\+xml)')
+
+
+class CompressionMiddleware:
+    """
+    Compresses dynamic text responses (Brotli when available, else gzip)
+    once they exceed CMS_COMPRESS_MIN_SIZE, at the fast DYNAMIC_LEVELS.
+
+    Public responses carrying a strong ETag (e.g. from the page cache) have
+    their compressed bytes memoised, so repeat hits on a cached page are not
+    recompressed. Responses that may hold secrets (CSRF tokens, anything
+    private or per-cookie) are gzipped with random padding against BREACH,
+    like GZipMiddleware does, and never memoised. Static and media files
+    are served precompressed instead; see cms.compression.
+    """
+    sync_capable = True
+    async_capable = True
+
+    memo_size = 128
+    # As in django.middleware.gzip.GZipMiddleware
+    max_random_bytes = 100
+    # Bodies at least this large are compressed off the event loop under ASGI
+    offload_size = 32 * 1024
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._memo = OrderedDict()  # (etag, encoding) -> compressed bytes
+        self._memo_lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if not response.streaming and len(response.content) >= self.offload_size:
+            return await sync_to_async(self.process_response, thread_sensitive=False)(request, response)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not COMPRESSIBLE_TYPES.match(response.get('Content-Type', ''))
+            or len(response.content) < MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+        etag = response.get('ETag')
+        if _is_public(response):
+            encoding = next((e for e, _ in available_encodings() if e in accepted), None)
+            if encoding is None:
+                return response
+            key = (etag, encoding) if etag and not etag.startswith('W/') else None
+            compressed = self._memoised(key, lambda: compress(response.content, encoding, DYNAMIC_LEVELS))
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        if etag and not etag.startswith('W/'):
+            # The representation differs per coding; see GZipMiddleware
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def _memoised(self, key, compress_content):
+        if key is None:
+            return compress_content()
+        with self._memo_lock:
+            compressed = self._memo.get(key)
+            if compressed is not None:
+                self._memo.move_to_end(key)
+                return compressed
+        # Compressed outside the lock; a concurrent miss does the same work
+        compressed = compress_content()
+        with self._memo_lock:
+            self._memo[key] = compressed
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return compressed
+
+
+def _is_public(response):
+    """
+    Whether a response is the same for every visitor: one that sets no
+    cookie, does not vary on them and is not private or uncacheable.
+    """
+    cache_control = response.get('Cache-Control', '').lower()
+    return not (
+        response.cookies
+        or has_vary_header(response, 'Cookie')
+        or 'private' in cache_control
+        or 'no-store' in cache_control
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Records per request the ORM query count and time, total time and
+    response size, and the times of the templates and context processors
+    timed by cms.metrics, into its in-process histograms (exported by the
+    ``metrics`` view).
+
+    With CMS_SERVER_TIMING on, the same figures are sent in a Server-Timing
+    header. Place it first in MIDDLEWARE so it sees the final response.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'CMS_SERVER_TIMING', False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        try:
+            with metrics.queries_recorded(request_metrics):
+                response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.record(request, response, request_metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        request_metrics = metrics.RequestMetrics()
+        # Copied into the threads the ORM's async methods run in
+        token = metrics.current.set(request_metrics)
+        # Connections are per thread: the hooks go on the ones of the
+        # thread-sensitive executor those methods run queries in
+        queries = ExitStack()
+        await sync_to_async(queries.enter_context)(metrics.queries_recorded(request_metrics))
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.close)()
+            metrics.current.reset(token)
+        return self.record(request, response, request_metrics, time.perf_counter() - start)
+
+    def record(self, request, response, request_metrics, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.REQUEST_SECONDS.observe(view, elapsed)
+        metrics.DB_QUERIES.observe(view, request_metrics.queries)
+        metrics.DB_SECONDS.observe(view, request_metrics.db_seconds)
+        if not response.streaming:
+            metrics.RESPONSE_BYTES.observe(view, len(response.content))
+        for name, seconds in request_metrics.templates.items():
+            metrics.TEMPLATE_SECONDS.observe(name, seconds)
+        for name, seconds in request_metrics.processors.items():
+            metrics.CONTEXT_PROCESSOR_SECONDS.observe(name, seconds)
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join(
+                ['db;dur=%.2f;desc="%d queries"' % (request_metrics.db_seconds * 1000, request_metrics.queries)]
+                # Template times are inclusive, so the outermost one is the render
+                + ['tpl;dur=%.2f' % (max(request_metrics.templates.values(), default=0) * 1000)]
+                + ['cp;dur=%.2f' % (sum(request_metrics.processors.values()) * 1000)]
+                + ['total;dur=%.2f' % (elapsed * 1000)]
+            )
+        return response
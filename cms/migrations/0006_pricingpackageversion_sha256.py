@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0005_year_remove_pricingpackage_package_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricingpackageversion',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:06
+
+import cms.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0006_pricingpackageversion_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pricingpackage',
+            name='file',
+            field=models.FileField(storage=cms.storage.get_package_storage, upload_to='packages/'),
+        ),
+        migrations.AlterField(
+            model_name='pricingpackageversion',
+            name='file',
+            field=models.FileField(storage=cms.storage.get_package_storage, upload_to='packages/versions/'),
+        ),
+    ]
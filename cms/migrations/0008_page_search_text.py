@@ -0,0 +1,97 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:20
+
+import html
+import re
+
+from django.db import migrations, models
+
+
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE cms_page ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(search_text, '')), 'B')
+        ) STORED
+    """,
+    "CREATE INDEX cms_page_search_vector_gin ON cms_page USING gin (search_vector)",
+]
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS cms_page_search_vector_gin",
+    "ALTER TABLE cms_page DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE cms_page_fts USING fts5(title, body, tokenize='porter unicode61')",
+    "INSERT INTO cms_page_fts(rowid, title, body) SELECT id, title, search_text FROM cms_page",
+    """
+    CREATE TRIGGER cms_page_fts_insert AFTER INSERT ON cms_page BEGIN
+        INSERT INTO cms_page_fts(rowid, title, body) VALUES (new.id, new.title, new.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER cms_page_fts_update AFTER UPDATE OF title, search_text ON cms_page BEGIN
+        DELETE FROM cms_page_fts WHERE rowid = old.id;
+        INSERT INTO cms_page_fts(rowid, title, body) VALUES (new.id, new.title, new.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER cms_page_fts_delete AFTER DELETE ON cms_page BEGIN
+        DELETE FROM cms_page_fts WHERE rowid = old.id;
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS cms_page_fts_insert",
+    "DROP TRIGGER IF EXISTS cms_page_fts_update",
+    "DROP TRIGGER IF EXISTS cms_page_fts_delete",
+    "DROP TABLE IF EXISTS cms_page_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+# Frozen copy of cms.text.page_text() as of this migration, so later
+# changes to the text pipeline do not change what it writes
+NON_CONTENT_RE = re.compile(r'<(script|style|noscript)\b.*?</\1\s*>', re.S | re.I)
+TAG_RE = re.compile(r'<[^>]*>')
+
+
+def page_text(content):
+    text = TAG_RE.sub('', NON_CONTENT_RE.sub(' ', content or ''))
+    return ' '.join(html.unescape(text).split())
+
+
+def fill_search_text(apps, schema_editor):
+    Page = apps.get_model('cms', 'Page')
+    pages = list(Page.objects.only('id', 'content'))
+    for page in pages:
+        page.search_text = page_text(page.content)
+    Page.objects.bulk_update(pages, ['search_text'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0007_content_addressed_package_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        # The index lives outside the model: a generated tsvector column
+        # with a GIN index on PostgreSQL, an FTS5 table on SQLite.
+        migrations.RunPython(
+            _run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0008_page_search_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='galleryitem',
+            index=models.Index(fields=['page', 'uploaded_at', 'id'], name='cms_gallery_page_keyset'),
+        ),
+    ]
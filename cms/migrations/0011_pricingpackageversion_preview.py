@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+def queue_previews(apps, schema_editor):
+    # Existing versions get their previews from the job worker
+    Job = apps.get_model('cms', 'Job')
+    PricingPackageVersion = apps.get_model('cms', 'PricingPackageVersion')
+    Job.objects.bulk_create(
+        [
+            Job(task='package_preview', key=f'preview:{pk}', payload={'version_id': pk})
+            for pk in PricingPackageVersion.objects.values_list('pk', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricingpackageversion',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pricingpackageversion',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pricingpackageversion',
+            name='preview',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pricingpackageversion',
+            name='text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(queue_previews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+# Adding NOT NULL columns rebuilds cms_page on SQLite, which drops the
+# triggers keeping the FTS5 index of migration 0008 in sync.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS cms_page_fts_insert AFTER INSERT ON cms_page BEGIN
+        INSERT INTO cms_page_fts(rowid, title, body) VALUES (new.id, new.title, new.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cms_page_fts_update AFTER UPDATE OF title, search_text ON cms_page BEGIN
+        DELETE FROM cms_page_fts WHERE rowid = old.id;
+        INSERT INTO cms_page_fts(rowid, title, body) VALUES (new.id, new.title, new.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cms_page_fts_delete AFTER DELETE ON cms_page BEGIN
+        DELETE FROM cms_page_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0011_pricingpackageversion_preview'),
+    ]
+
+    # The rendered columns are filled by the render_pages job, which
+    # migrate queues once it finishes (see cms/signals.py).
+    operations = [
+        # Runs last when unapplying, after the columns are dropped again
+        migrations.RunPython(migrations.RunPython.noop, restore_sqlite_triggers),
+        migrations.AddField(
+            model_name='page',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='render_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='rendered_content',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(restore_sqlite_triggers, migrations.RunPython.noop),
+    ]
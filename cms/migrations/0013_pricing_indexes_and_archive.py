@@ -0,0 +1,99 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:55
+
+import cms.storage
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def renumber_duplicate_versions(apps, schema_editor):
+    """
+    Version numbers are allocated in the database since bump_version(), but
+    older rows may repeat one. Later duplicates move past the package's
+    highest number so the unique constraint can be added.
+    """
+    PricingPackageVersion = apps.get_model('cms', 'PricingPackageVersion')
+    duplicates = (
+        PricingPackageVersion.objects.values('pricing_package', 'version')
+        .annotate(rows=Count('id')).filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        versions = PricingPackageVersion.objects.filter(pricing_package=duplicate['pricing_package'])
+        highest = versions.aggregate(Max('version'))['version__max']
+        extra = versions.filter(version=duplicate['version']).order_by('pk')[1:]
+        for offset, version in enumerate(extra, start=1):
+            version.version = highest + offset
+            version.save(update_fields=['version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0012_page_rendered_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPricingPackage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('segment', models.CharField(choices=[('all_inclusive', 'All Inclusive Wedding Package'), ('venue_inclusive', 'Venue Inclusive Package'), ('weekday', 'Weekday Package')], max_length=20)),
+                ('package_name', models.CharField(max_length=255)),
+                ('file', models.FileField(storage=cms.storage.get_package_storage, upload_to='packages/')),
+                ('current_version', models.PositiveIntegerField()),
+                ('approved', models.BooleanField()),
+                ('approved_by', models.CharField(blank=True, max_length=100, null=True)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPricingPackageVersion',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('package_id', models.BigIntegerField()),
+                ('version', models.PositiveIntegerField()),
+                ('package_name', models.CharField(max_length=255)),
+                ('file', models.FileField(storage=cms.storage.get_package_storage, upload_to='packages/versions/')),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('file_size', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('preview', models.JSONField(blank=True, null=True)),
+                ('text', models.TextField(blank=True)),
+                ('uploader', models.CharField(max_length=100)),
+                ('uploaded_at', models.DateTimeField()),
+                ('approved', models.BooleanField()),
+                ('approved_by', models.CharField(blank=True, max_length=100, null=True)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pricingpackage',
+            index=models.Index(fields=['approved', 'segment', 'year'], name='cms_package_listing'),
+        ),
+        migrations.AddIndex(
+            model_name='pricingpackageversion',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['pricing_package', 'version'], name='cms_version_approved'),
+        ),
+        migrations.RunPython(renumber_duplicate_versions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pricingpackageversion',
+            constraint=models.UniqueConstraint(fields=('pricing_package', 'version'), name='cms_version_unique'),
+        ),
+        migrations.AddField(
+            model_name='archivedpricingpackage',
+            name='year',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='cms.year'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpricingpackageversion',
+            index=models.Index(fields=['package_id', 'version'], name='cms_archived_version_package'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpricingpackage',
+            index=models.Index(fields=['year', 'segment'], name='cms_archived_package_year'),
+        ),
+    ]
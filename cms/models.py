@@ -1,9 +1,33 @@
 # cms/models.py
 
+import hashlib
+
 from django.db import models
+from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 from django.utils import timezone
 
+from .storage import get_package_storage
+from .text import RENDERED_FIELDS, page_text, render_content
+
+def file_sha256(field_file, chunk_size=64 * 1024):
+    """
+    Hex SHA-256 digest of a FieldFile's content, read in chunks.
+    Content-addressed files already carry their digest in their name.
+    """
+    content_hash = getattr(field_file.storage, 'content_hash', None)
+    if content_hash is not None and content_hash(field_file.name):
+        return content_hash(field_file.name)
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks(chunk_size):
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
 class Page(models.Model):
     """
     Represents a single CMS-managed page with rich content.
@@ -13,13 +37,38 @@ class Page(models.Model):
     content = models.TextField()
     is_public = models.BooleanField(default=True)
     last_updated = models.DateTimeField(auto_now=True)
+    # Tag-stripped content; the database's full-text index is built from it
+    search_text = models.TextField(blank=True, editable=False)
+    # Output of the content pipeline in cms/text.py, computed on save; pages
+    # rendered by an older pipeline version are re-rendered in the background
+    rendered_content = models.TextField(blank=True, editable=False)
+    excerpt = models.TextField(blank=True, editable=False)
+    render_version = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         # Auto-generate slug from title if not set
         if not self.slug:
             self.slug = slugify(self.title)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.search_text = page_text(self.content)
+            for field, value in render_content(self.content).items():
+                setattr(self, field, value)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_text', *RENDERED_FIELDS}
         super().save(*args, **kwargs)
 
+    @property
+    def body(self):
+        """
+        The rendered content, safe for templates. Rows written without
+        save() (e.g. bulk_create) are rendered on the fly until the
+        background re-render reaches them.
+        """
+        if not self.render_version:
+            return mark_safe(render_content(self.content)['rendered_content'])
+        return mark_safe(self.rendered_content)
+
     def __str__(self):
         return self.title
 
@@ -33,8 +82,17 @@ class GalleryItem(models.Model):
     caption = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a page's gallery (see cms/gallery.py)
+            models.Index(fields=['page', 'uploaded_at', 'id'], name='cms_gallery_page_keyset'),
+        ]
+
     def __str__(self):
-        return f"{self.page.title} - {self.caption}"
+        # Only use the page title when it was loaded with select_related()
+        if GalleryItem.page.is_cached(self):
+            return f"{self.page.title} - {self.caption}"
+        return f"Page {self.page_id} - {self.caption}"
 
 
 class Year(models.Model):
@@ -47,6 +105,28 @@ class Year(models.Model):
         return str(self.year)
 
 
+class PricingPackageQuerySet(models.QuerySet):
+    def with_current_version(self):
+        """
+        Joins each package's year and prefetches only its current approved
+        version, available as ``package.current_approved_version``.
+        Always costs two queries, regardless of packages or version history.
+        """
+        current_versions = PricingPackageVersion.objects.filter(
+            approved=True,
+            version=models.F('pricing_package__current_version'),
+        ).defer('text')
+        return self.select_related('year').prefetch_related(
+            models.Prefetch('versions', queryset=current_versions, to_attr='current_versions')
+        )
+
+    def current_offers(self):
+        """
+        Approved packages ready to be listed on the public pricing page.
+        """
+        return self.filter(approved=True).with_current_version()
+
+
 class PricingPackage(models.Model):
     """
     Main model for storing pricing packages per segment and year.
@@ -61,16 +141,34 @@ class PricingPackage(models.Model):
     segment = models.CharField(max_length=20, choices=SEGMENT_CHOICES)
     year = models.ForeignKey(Year, on_delete=models.CASCADE, null=True)
     package_name = models.CharField(max_length=255)
-    file = models.FileField(upload_to='packages/')
+    file = models.FileField(upload_to='packages/', storage=get_package_storage)
     current_version = models.PositiveIntegerField(default=1)
     approved = models.BooleanField(default=False)
     approved_by = models.CharField(max_length=100, blank=True, null=True)
     approved_at = models.DateTimeField(blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PricingPackageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # current_offers() and the admin's approved/segment/year filters
+            models.Index(fields=['approved', 'segment', 'year'], name='cms_package_listing'),
+        ]
+
     def __str__(self):
         return f"{self.get_segment_display()} - {self.year}"
 
+    @property
+    def current_approved_version(self):
+        """
+        The approved version matching ``current_version``, or None.
+        Uses the prefetch from ``with_current_version()`` when available.
+        """
+        if hasattr(self, 'current_versions'):
+            return self.current_versions[0] if self.current_versions else None
+        return self.versions.filter(version=self.current_version, approved=True).first()
+
     def clean(self):
         # Debug log (optional): ensure required fields are filled
         print("DEBUG CLEAN:")
@@ -88,12 +186,134 @@ class PricingPackageVersion(models.Model):
     pricing_package = models.ForeignKey(PricingPackage, related_name='versions', on_delete=models.CASCADE)
     version = models.PositiveIntegerField()
     package_name = models.CharField(max_length=255)
-    file = models.FileField(upload_to='packages/versions/')
+    file = models.FileField(upload_to='packages/versions/', storage=get_package_storage)
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    # Extracted from the PDF after upload (see cms/previews.py)
+    page_count = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    file_size = models.PositiveBigIntegerField(blank=True, null=True, editable=False)
+    preview = models.JSONField(blank=True, null=True, editable=False)
+    text = models.TextField(blank=True, editable=False)
     uploader = models.CharField(max_length=100)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     approved = models.BooleanField(default=False)
     approved_by = models.CharField(max_length=100, blank=True, null=True)
     approved_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pricing_package', 'version'], name='cms_version_unique'),
+        ]
+        indexes = [
+            # The current approved version of each listed package
+            models.Index(
+                fields=['pricing_package', 'version'], condition=models.Q(approved=True),
+                name='cms_version_approved',
+            ),
+        ]
+
     def __str__(self):
         return f"Version {self.version} for {self.pricing_package}"
+
+    def save(self, *args, **kwargs):
+        # Content-addressed files carry their digest, which downloads use as
+        # their ETag; other files are hashed by a background job.
+        if self.file and not self.sha256:
+            content_hash = getattr(self.file.storage, 'content_hash', None)
+            self.sha256 = (content_hash and content_hash(self.file.name)) or ''
+        super().save(*args, **kwargs)
+
+
+class ArchivedPricingPackage(models.Model):
+    """
+    A package of a past year, moved out of PricingPackage by
+    ``manage.py archive_pricing`` (see cms/archive.py). Keeps its id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    segment = models.CharField(max_length=20, choices=PricingPackage.SEGMENT_CHOICES)
+    year = models.ForeignKey(Year, on_delete=models.CASCADE, null=True)
+    package_name = models.CharField(max_length=255)
+    file = models.FileField(upload_to='packages/', storage=get_package_storage)
+    current_version = models.PositiveIntegerField()
+    approved = models.BooleanField()
+    approved_by = models.CharField(max_length=100, blank=True, null=True)
+    approved_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['year', 'segment'], name='cms_archived_package_year'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_segment_display()} - {self.year}"
+
+
+class ArchivedPricingPackageVersion(models.Model):
+    """
+    A superseded version, or any version of an archived package, moved out
+    of PricingPackageVersion. Keeps its id; ``package_id`` is the id of its
+    package, live or archived.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    package_id = models.BigIntegerField()
+    version = models.PositiveIntegerField()
+    package_name = models.CharField(max_length=255)
+    file = models.FileField(upload_to='packages/versions/', storage=get_package_storage)
+    sha256 = models.CharField(max_length=64, blank=True)
+    page_count = models.PositiveIntegerField(blank=True, null=True)
+    file_size = models.PositiveBigIntegerField(blank=True, null=True)
+    preview = models.JSONField(blank=True, null=True)
+    text = models.TextField(blank=True)
+    uploader = models.CharField(max_length=100)
+    uploaded_at = models.DateTimeField()
+    approved = models.BooleanField()
+    approved_by = models.CharField(max_length=100, blank=True, null=True)
+    approved_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['package_id', 'version'], name='cms_archived_version_package'),
+        ]
+
+    def __str__(self):
+        return f"Version {self.version} of package {self.package_id}"
+
+
+class Job(models.Model):
+    """
+    Background job run by ``manage.py run_jobs`` (see cms/jobs.py).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # Enqueueing a key that is still queued adds no second job
+    key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for due jobs in this order
+            models.Index(fields=['status', 'run_at', 'id'], name='cms_job_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
@@ -0,0 +1,91 @@
+# cms/previews.py
+
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # optional; without it only the file size is recorded
+    pdfium = None
+
+from .cache import invalidate_pricing
+from .images import generate_derivatives
+from .models import PricingPackageVersion
+
+logger = logging.getLogger(__name__)
+
+# Width (px) the first page is rendered at; derivatives are made down from it
+PREVIEW_WIDTH = getattr(settings, 'CMS_PACKAGE_PREVIEW_WIDTH', 1200)
+
+# Extracted text is kept for search, not for reading; longer text is cut
+TEXT_LIMIT = 100_000
+
+PREVIEW_DIR = 'package_previews'
+
+# Columns filled in by extract_preview()
+PREVIEW_FIELDS = ('page_count', 'file_size', 'preview', 'text')
+
+
+def preview_name(version):
+    # Versions of identical files share one preview
+    return posixpath.join(PREVIEW_DIR, version.sha256 or f'version-{version.pk}', 'page-1.jpg')
+
+
+def read_pdf(field_file):
+    """
+    Returns (page count, first page as a PIL image, text) of a PDF.
+    """
+    with field_file.open('rb') as f:
+        pdf = pdfium.PdfDocument(f.read())
+    try:
+        page = pdf[0]
+        image = page.render(scale=PREVIEW_WIDTH / page.get_width()).to_pil()
+        texts, length = [], 0
+        for index in range(len(pdf)):
+            text = ' '.join(pdf[index].get_textpage().get_text_bounded().split())
+            texts.append(text)
+            length += len(text)
+            if length >= TEXT_LIMIT:
+                break
+        return len(pdf), image, '\n'.join(texts)[:TEXT_LIMIT]
+    finally:
+        pdf.close()
+
+
+def extract_preview(version, storage=default_storage):
+    """
+    Records the page count, size, text and a responsive first-page preview
+    of a version's PDF, so pages show them without opening the file.
+    Returns the values written.
+    """
+    values = {'file_size': version.file.size}
+    shared = (
+        PricingPackageVersion.objects.filter(sha256=version.sha256, page_count__isnull=False)
+        .exclude(pk=version.pk).values(*PREVIEW_FIELDS).first()
+    ) if version.sha256 else None
+    if shared is not None:
+        values = shared
+    elif pdfium is None:
+        logger.warning("pypdfium2 is not installed; skipping the preview of %s", version.file.name)
+    else:
+        try:
+            page_count, image, text = read_pdf(version.file)
+        except pdfium.PdfiumError:
+            logger.exception("Could not read PDF %s", version.file.name)
+        else:
+            buffer = io.BytesIO()
+            image.convert('RGB').save(buffer, format='JPEG', quality=90)
+            name = preview_name(version)
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(buffer.getvalue()))
+            values.update(page_count=page_count, text=text, preview=generate_derivatives(name, storage))
+
+    PricingPackageVersion.objects.filter(pk=version.pk).update(**values)
+    invalidate_pricing(version.pricing_package_id)
+    return values
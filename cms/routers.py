@@ -0,0 +1,94 @@
+# cms/routers.py
+
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Alias of the read replica in settings.DATABASES
+REPLICA = 'replica'
+
+# Seconds public reads stay on the primary after a CMS write commits, which
+# must cover the replica's usual lag. Pages and the menu are re-rendered
+# right after an invalidation; rendering them from a lagging replica would
+# cache the old content under the new version.
+REPLICA_LAG = getattr(settings, 'CMS_REPLICA_LAG', 10)
+
+FENCE_KEY = 'cms:replica-fence'
+
+# Database alias reads of cms models go to in the current context
+_read_alias = ContextVar('cms_read_alias', default=None)
+
+
+def fence_replica():
+    """
+    Keeps public reads on the primary for the next REPLICA_LAG seconds.
+    Called once CMS writes have committed.
+    """
+    cache.set(FENCE_KEY, time.time() + REPLICA_LAG, REPLICA_LAG)
+
+
+def _has_replica():
+    return REPLICA in connections.databases
+
+
+def _unfenced(fence):
+    return REPLICA if fence is None or fence <= time.time() else None
+
+
+def replica_reads(view_func):
+    """
+    Sends the cms model reads of a public, read-only view to the replica,
+    unless a recent write fenced it off. Works for sync and async views.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            alias = _unfenced(await cache.aget(FENCE_KEY)) if _has_replica() else None
+            token = _read_alias.set(alias)
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        alias = _unfenced(cache.get(FENCE_KEY)) if _has_replica() else None
+        token = _read_alias.set(alias)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Routes cms reads made inside ``replica_reads`` views to the replica and
+    everything else, including every write, to the primary ('default').
+    Once a view writes, its remaining reads stay on the primary too.
+
+    To try it locally, point DB_NAME and DB_REPLICA_NAME at two SQLite
+    files with DB_ENGINE=django.db.backends.sqlite3 and run migrate for
+    both aliases; a real replica gets its schema through replication.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'cms':
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes for the rest of this request
+        _read_alias.set(None)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
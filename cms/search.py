@@ -0,0 +1,123 @@
+# cms/search.py
+
+import re
+
+from django.db import connections, router
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Page
+from .text import page_text
+
+# Full-text index maintained by the database from Page.search_text (see
+# migration 0008): a generated tsvector column with a GIN index on
+# PostgreSQL, and an FTS5 table kept in sync by triggers on SQLite.
+FTS_TABLE = 'cms_page_fts'
+SEARCH_CONFIG = 'english'
+
+# Markers placed around matches by the database, swapped for <mark> tags
+# once the snippet has been escaped.
+START, STOP = '\x02', '\x03'
+
+WORD_RE = re.compile(r'\w+', re.U)
+
+
+def _snippet(text):
+    return mark_safe(escape(text).replace(START, '<mark>').replace(STOP, '</mark>'))
+
+
+def _search_postgresql(connection, query, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT p.id, ts_rank(p.search_vector, q) AS rank,
+                   ts_headline(%s, p.search_text, q,
+                               'StartSel=' || chr(2) || ',StopSel=' || chr(3) || ',MaxFragments=2,MaxWords=30')
+            FROM cms_page p, websearch_to_tsquery(%s, %s) q
+            WHERE p.is_public AND p.search_vector @@ q
+            ORDER BY rank DESC, p.id
+            LIMIT %s
+            """,
+            [SEARCH_CONFIG, SEARCH_CONFIG, query, limit],
+        )
+        return cursor.fetchall()
+
+
+def _search_sqlite(connection, query, limit):
+    terms = WORD_RE.findall(query)
+    if not terms:
+        return []
+    # Quoted terms are taken literally; the last one also matches as prefix
+    match = ' '.join('"%s"' % term for term in terms) + '*'
+    # Ranked through FTS5's rank column, which orders matches without
+    # materialising them; snippets are then made for the top rows only.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT top.rowid, top.rank,
+                   (SELECT snippet({FTS_TABLE}, 1, char(2), char(3), '…', 24)
+                    FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = top.rowid)
+            FROM (
+                SELECT f.rowid, f.rank
+                FROM {FTS_TABLE} f JOIN cms_page p ON p.id = f.rowid
+                WHERE {FTS_TABLE} MATCH %s AND f.rank MATCH 'bm25(10.0, 1.0)' AND p.is_public
+                ORDER BY f.rank, f.rowid
+                LIMIT %s
+            ) top
+            ORDER BY top.rank, top.rowid
+            """,
+            [match, match, limit],
+        )
+        return cursor.fetchall()
+
+
+def _search_fallback(connection, query, limit):
+    # Unindexed scan, for backends without full-text support
+    rows = Page.objects.using(connection.alias).filter(is_public=True, search_text__icontains=query).values_list('id', 'search_text')[:limit]
+    return [(pk, 0, text[:200]) for pk, text in rows]
+
+
+def search_pages(query, limit=20):
+    """
+    Ranks public pages against ``query`` using the database's full-text
+    index. Returns a list of dicts with title, slug, rank and an HTML-safe
+    snippet with matches wrapped in <mark>.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    # The replica, when the calling view reads from it
+    connection = connections[router.db_for_read(Page)]
+    backend = {
+        'postgresql': _search_postgresql,
+        'sqlite': _search_sqlite,
+    }.get(connection.vendor, _search_fallback)
+    rows = backend(connection, query, limit)
+
+    pages = Page.objects.using(connection.alias).only('title', 'slug').in_bulk([row[0] for row in rows])
+    return [
+        {'title': pages[pk].title, 'slug': pages[pk].slug, 'rank': rank, 'snippet': _snippet(snippet or '')}
+        for pk, rank, snippet in rows
+        if pk in pages
+    ]
+
+
+def rebuild_search_text(batch_size=500):
+    """
+    Recomputes Page.search_text for every page, e.g. after rows were
+    written with bulk_create() or after changing ``page_text()``.
+    The database index follows the column by itself.
+    """
+    updated = 0
+    batch = []
+    for page in Page.objects.only('id', 'content', 'search_text').iterator(chunk_size=batch_size):
+        text = page_text(page.content)
+        if text != page.search_text:
+            page.search_text = text
+            batch.append(page)
+        if len(batch) >= batch_size:
+            updated += Page.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        updated += Page.objects.bulk_update(batch, ['search_text'])
+    return updated
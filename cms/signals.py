@@ -0,0 +1,154 @@
+# cms/signals.py
+
+from django.apps import apps as global_apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_navigation, invalidate_page, invalidate_pricing
+from .images import schedule_derivatives
+from .jobs import enqueue
+from .models import (
+    ArchivedPricingPackage, ArchivedPricingPackageVersion, GalleryItem, Page, PricingPackage,
+    PricingPackageVersion,
+)
+from .tasks import queue_render, queue_scan
+from .text import RENDER_VERSION
+
+# Page fields that appear in the navigation menu
+NAVIGATION_FIELDS = ('slug', 'title', 'is_public')
+
+
+@receiver(pre_save, sender=Page)
+def remember_previous_page(sender, instance, raw, **kwargs):
+    """
+    Keeps the stored values of an edited page so post_save can tell what changed.
+    """
+    instance._previous = None
+    if instance.pk and not raw:
+        instance._previous = (
+            Page.objects.filter(pk=instance.pk)
+            .values(*NAVIGATION_FIELDS)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def invalidate_page_cache(sender, instance, **kwargs):
+    invalidate_page(instance.slug)
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['slug'] != instance.slug:
+        # The old URL must stop serving the renamed page
+        invalidate_page(previous['slug'])
+
+
+@receiver(post_save, sender=Page)
+def invalidate_navigation_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None or any(
+        previous[field] != getattr(instance, field) for field in NAVIGATION_FIELDS
+    ):
+        invalidate_navigation()
+
+
+@receiver(post_delete, sender=Page)
+def invalidate_navigation_on_delete(sender, instance, **kwargs):
+    invalidate_navigation()
+
+
+@receiver(post_migrate)
+def queue_stale_renders(sender, app_config, using, apps=global_apps, **kwargs):
+    """
+    Queues the background re-render after a deploy that bumped the content
+    pipeline's RENDER_VERSION, or when pages were never rendered.
+    """
+    if app_config.name != 'cms' or using != DEFAULT_DB_ALIAS:
+        return
+    try:
+        # Historical model: the migration plan may end before the field
+        HistoricalPage = apps.get_model('cms', 'Page')
+        HistoricalPage._meta.get_field('render_version')
+    except (LookupError, FieldDoesNotExist):
+        return
+    if HistoricalPage.objects.filter(render_version__lt=RENDER_VERSION).exists():
+        queue_render()
+
+
+@receiver(post_save, sender=PricingPackage)
+@receiver(post_delete, sender=PricingPackage)
+def invalidate_pricing_cache(sender, instance, **kwargs):
+    invalidate_pricing(instance.pk)
+
+
+@receiver(post_save, sender=PricingPackageVersion)
+@receiver(post_delete, sender=PricingPackageVersion)
+def invalidate_version_pricing_cache(sender, instance, **kwargs):
+    invalidate_pricing(instance.pricing_package_id)
+
+
+@receiver(pre_save, sender=GalleryItem)
+def remember_previous_media_file(sender, instance, raw, **kwargs):
+    instance._previous_media_file = None
+    if instance.pk and not raw:
+        instance._previous_media_file = (
+            GalleryItem.objects.filter(pk=instance.pk)
+            .values_list('media_file', flat=True)
+            .first()
+        )
+
+
+def _page_slug(page_id):
+    return Page.objects.filter(pk=page_id).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=GalleryItem)
+def process_gallery_upload(sender, instance, raw, **kwargs):
+    name = instance.media_file.name
+    if not raw and name and name != getattr(instance, '_previous_media_file', None):
+        schedule_derivatives(name, page_id=instance.page_id)
+        queue_scan('default', name)
+
+
+@receiver(post_save, sender=GalleryItem)
+@receiver(post_delete, sender=GalleryItem)
+def invalidate_gallery_page(sender, instance, **kwargs):
+    slug = _page_slug(instance.page_id)
+    if slug:
+        invalidate_page(slug)
+
+
+@receiver(post_save, sender=PricingPackageVersion)
+def process_package_upload(sender, instance, created, raw, **kwargs):
+    # Every package file is stored through a version row
+    if raw or not instance.file:
+        return
+    if not instance.sha256:
+        enqueue('hash_package_version', key=f'hash:{instance.pk}', version_id=instance.pk)
+    if created:
+        enqueue('package_preview', key=f'preview:{instance.pk}', version_id=instance.pk)
+        queue_scan('packages', instance.file.name)
+
+
+def package_file_references(name):
+    # Archived rows keep their files (see cms/archive.py)
+    return sum(
+        model.objects.filter(file=name).count()
+        for model in (
+            PricingPackage, PricingPackageVersion, ArchivedPricingPackage, ArchivedPricingPackageVersion,
+        )
+    )
+
+
+@receiver(post_delete, sender=PricingPackage)
+@receiver(post_delete, sender=PricingPackageVersion)
+def release_package_file(sender, instance, **kwargs):
+    """
+    Frees a package blob once no package or version, live or archived,
+    points at it anymore.
+    """
+    name = instance.file.name
+    storage = instance.file.storage
+    if name and hasattr(storage, 'release'):
+        transaction.on_commit(lambda: storage.release(name, package_file_references(name)))
@@ -0,0 +1,132 @@
+# cms/storage.py
+
+import hashlib
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+from .assets import BUNDLE_DIR
+from .compression import precompress
+
+BLOB_DIR = 'blobs'
+
+# Static prefix of the scraped site assets (see STATICFILES_DIRS)
+SCRAPED_DIR = 'scraped'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once under ``blobs/<aa>/<sha256>/<filename>``,
+    whatever name or upload_to it was saved with. Saving content that is
+    already stored returns the existing blob without writing anything.
+
+    Blobs are shared between rows; see ``release()`` for how they are freed.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content, so an existing name is a match,
+        # not a collision to be renamed.
+        if self.content_hash(name) and self.exists(name):
+            # Another writer stored the same content first; see _save()
+            raise FileExistsError(name)
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        existing = self.blob_name(sha256)
+        if existing is not None:
+            return existing
+        blob_name = posixpath.join(self.blob_dir(sha256), posixpath.basename(name))
+        try:
+            return super()._save(blob_name, content)
+        except FileExistsError:
+            # A concurrent save of the same content won: same name, same bytes
+            return blob_name
+
+    @staticmethod
+    def blob_dir(sha256):
+        return posixpath.join(BLOB_DIR, sha256[:2], sha256)
+
+    def blob_name(self, sha256):
+        """
+        Name of the stored blob with the given digest, or None.
+        """
+        directory = self.blob_dir(sha256)
+        if not self.exists(directory):
+            return None
+        files = self.listdir(directory)[1]
+        return posixpath.join(directory, files[0]) if files else None
+
+    def content_hash(self, name):
+        """
+        SHA-256 of a blob, read from its name rather than its content.
+        Returns None for files stored outside the blob tree.
+        """
+        parts = name.split('/')
+        if len(parts) == 4 and parts[0] == BLOB_DIR and len(parts[2]) == 64:
+            return parts[2]
+        return None
+
+    def release(self, name, references):
+        """
+        Deletes a blob once ``references`` (its remaining row count) is zero.
+        """
+        if references == 0 and self.exists(name):
+            self.delete(name)
+
+
+_package_storage = None
+
+
+def get_package_storage():
+    """
+    Storage shared by PricingPackage.file and PricingPackageVersion.file.
+    """
+    global _package_storage
+    if _package_storage is None:
+        _package_storage = ContentAddressedStorage()
+    return _package_storage
+
+
+class FingerprintedStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that leaves the CSS bundles alone: they are
+    already minified, content-hashed and have their url()s rewritten by
+    ``build_css_bundles``, so they keep their names in the manifest.
+
+    Every compressible file is also written with ``.br``/``.gz`` siblings
+    for ``cms.compression.serve_precompressed`` or the front-end server.
+    """
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        self._fingerprinted = [name for name in paths if name.startswith(BUNDLE_DIR + '/')]
+        others = {name: value for name, value in paths.items() if name not in self._fingerprinted}
+        processed = set(self._fingerprinted)
+        for name, hashed_name, was_processed in super().post_process(others, dry_run, **options):
+            processed.update(n for n in (name, hashed_name) if isinstance(n, str))
+            yield name, hashed_name, was_processed
+        for name in self._fingerprinted:
+            yield name, name, False
+        if not dry_run:
+            precompress(self.location, sorted(processed))
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # The scraped stylesheets reference fonts and images that were
+            # never scraped; keep those url()s as they are.
+            if content is None and name.startswith(SCRAPED_DIR + '/'):
+                return name
+            raise
+
+    def save_manifest(self):
+        for name in getattr(self, '_fingerprinted', ()):
+            self.hashed_files[self.hash_key(name)] = name
+        super().save_manifest()
@@ -0,0 +1,162 @@
+# cms/tasks.py
+
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .cache import invalidate_page, invalidate_pricing
+from .images import generate_derivatives
+from .jobs import PermanentFailure, enqueue, task
+from .models import Page, PricingPackage, PricingPackageVersion, file_sha256
+from .storage import get_package_storage
+from .text import RENDER_VERSION, render_content
+
+logger = logging.getLogger(__name__)
+
+# Pages re-rendered per render_pages job; the job queues itself again
+# until every page is rendered by the current pipeline.
+RENDER_BATCH_SIZE = getattr(settings, 'CMS_RENDER_BATCH_SIZE', 200)
+
+# Storages uploads can be scanned in, by the name jobs refer to them with
+STORAGES = {
+    'default': lambda: default_storage,
+    'packages': get_package_storage,
+}
+
+
+class InfectedFile(PermanentFailure):
+    """
+    Raised by an upload scanner that found malware in a file.
+    """
+
+
+def upload_scanners():
+    """
+    Callables listed in CMS_UPLOAD_SCANNERS. Each is called with a storage
+    and a file name; it raises InfectedFile to reject the file, or any other
+    exception to have the scan retried.
+    """
+    return [import_string(path) for path in getattr(settings, 'CMS_UPLOAD_SCANNERS', [])]
+
+
+def queue_scan(storage, name):
+    """
+    Queues the upload scanners for a file, if any are configured.
+    """
+    if getattr(settings, 'CMS_UPLOAD_SCANNERS', None):
+        enqueue('scan_upload', key=f'scan:{storage}:{name}', storage=storage, name=name)
+
+
+@task('gallery_derivatives')
+def gallery_derivatives(name, page_id=None):
+    generate_derivatives(name)
+    if page_id is not None:
+        # Cached pages show the original until the thumbnails exist
+        invalidate_page(Page.objects.filter(pk=page_id).values_list('slug', flat=True).first())
+
+
+@task('hash_package_version')
+def hash_package_version(version_id):
+    version = PricingPackageVersion.objects.filter(pk=version_id, sha256='').first()
+    if version is not None and version.file:
+        PricingPackageVersion.objects.filter(pk=version_id, sha256='').update(sha256=file_sha256(version.file))
+
+
+@task('package_preview')
+def package_preview(version_id):
+    # Imported on use: pypdfium2 is slow to load, and every process
+    # imports this module to register the tasks
+    from .previews import extract_preview
+
+    version = PricingPackageVersion.objects.defer('text').filter(pk=version_id).first()
+    if version is not None and version.file:
+        extract_preview(version)
+
+
+def rerender_pages(batch_size=RENDER_BATCH_SIZE, limit=None):
+    """
+    Re-renders pages whose rendered content came from an older pipeline
+    version (or none), ``batch_size`` per transaction. A page saved in the
+    meantime keeps its fresher rendering. Returns the number re-rendered.
+    """
+    stale = (
+        Page.objects.filter(render_version__lt=RENDER_VERSION)
+        .only('id', 'slug', 'content').order_by('pk')
+    )
+    pages = list(stale[:limit]) if limit is not None else stale.iterator(chunk_size=batch_size)
+    rendered = 0
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) >= batch_size:
+            rendered += _save_rendered(batch)
+            batch = []
+    if batch:
+        rendered += _save_rendered(batch)
+    return rendered
+
+
+def _save_rendered(pages):
+    updated = 0
+    with transaction.atomic():
+        for page in pages:
+            if Page.objects.filter(pk=page.pk, render_version__lt=RENDER_VERSION).update(
+                **render_content(page.content)
+            ):
+                updated += 1
+                invalidate_page(page.slug)
+    return updated
+
+
+def queue_render():
+    """
+    Queues the background re-render of stale pages.
+    """
+    enqueue('render_pages', key='render-pages')
+
+
+@task('render_pages')
+def render_pages():
+    rerender_pages(limit=RENDER_BATCH_SIZE)
+    if Page.objects.filter(render_version__lt=RENDER_VERSION).exists():
+        # One batch per job keeps other jobs from waiting behind a full re-render
+        queue_render()
+
+
+def queue_warm(*slugs):
+    """
+    Queues re-rendering the given pages into the shared cache, so the
+    first visitor after an approval does not pay for it.
+    """
+    for slug in slugs:
+        enqueue('warm_pages', key=f'warm:{slug}', slugs=[slug])
+
+
+@task('warm_pages')
+def warm_pages(slugs):
+    # Imported on use, like the previews: it loads the test request factory
+    from .warmup import page_urls, warm_cache
+
+    for url, status in warm_cache(page_urls(slugs), workers=1).items():
+        if status != 200:
+            logger.warning("Warming %s returned %s", url, status)
+
+
+@task('scan_upload')
+def scan_upload(storage, name):
+    try:
+        for scanner in upload_scanners():
+            scanner(STORAGES[storage](), name)
+    except InfectedFile:
+        if storage == 'packages':
+            # Nothing serving the file may stay approved
+            packages = list(PricingPackage.objects.filter(file=name).values_list('pk', flat=True))
+            packages += PricingPackageVersion.objects.filter(file=name).values_list('pricing_package_id', flat=True)
+            PricingPackage.objects.filter(file=name).update(approved=False)
+            PricingPackageVersion.objects.filter(file=name).update(approved=False)
+            invalidate_pricing(*packages)
+        logger.error("Upload scan rejected %s in %s storage", name, storage)
+        raise
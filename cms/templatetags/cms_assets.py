@@ -0,0 +1,18 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from ..assets import bundle_manifest
+
+register = template.Library()
+
+
+@register.simple_tag
+def css_bundle(slug):
+    """
+    Links the page's CSS bundle built by ``build_css_bundles``, if any.
+    """
+    name = bundle_manifest().get(slug)
+    if name is None:
+        return ''
+    return format_html('<link rel="stylesheet" href="{}">', static(name))
@@ -0,0 +1,57 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from ..images import SOURCE_TYPES, load_manifest, srcset, static_source_storage
+
+register = template.Library()
+
+
+def _picture(name, url, manifest, alt, sizes, css_class, loading):
+    if manifest is None:
+        # No derivatives yet: fall back to the original
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            url(name), alt, css_class, loading,
+        )
+
+    variants = manifest['variants']
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, srcset(variants[fmt], url), sizes) for fmt, mime in SOURCE_TYPES if variants.get(fmt)),
+    )
+    fallback = variants['jpeg']
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'alt="{}" class="{}" loading="{}" decoding="async"></picture>',
+        sources, url(fallback[-1]['name']), srcset(fallback, url), sizes,
+        manifest['width'], manifest['height'], alt, css_class, loading,
+    )
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', css_class='', loading='lazy', manifest=None):
+    """
+    Renders an uploaded image (FieldFile or storage name) as a <picture>
+    with srcset/sizes over its generated derivatives. A derivative
+    ``manifest`` stored elsewhere (e.g. a package preview) spares the lookup.
+    """
+    if manifest:
+        return _picture(manifest['source'], default_storage.url, manifest, alt, sizes, css_class, loading)
+    name = getattr(image, 'name', image)
+    if not name:
+        return ''
+    return _picture(
+        name, default_storage.url, load_manifest(name), alt, sizes, css_class, loading,
+    )
+
+
+@register.simple_tag
+def responsive_static_image(path, alt='', sizes='100vw', css_class='', loading='lazy'):
+    """
+    Like ``responsive_image`` for images under the project's static directory.
+    """
+    return _picture(
+        path, static, load_manifest(path, static_source_storage()), alt, sizes, css_class, loading,
+    )
@@ -1,3 +1,1206 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, router
+from django.http import Http404, HttpResponse
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmarks import startup
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from .cache import aget_navigation, bump_generation, get_navigation
+from .previews import pdfium
+from . import bulk, edge, jobs, views
+from .approvals import approve_packages, bump_version
+from .archive import archive_pricing
+from .assets import build_bundles, minify_css
+from .bulk import import_packages, stream_export
+from .compression import DYNAMIC_LEVELS, compress, precompress, serve_precompressed
+from .export import export_site
+from .gallery import GALLERY_PAGE_SIZE, gallery_page
+from . import metrics
+from .middleware import CompressionMiddleware, InstrumentationMiddleware
+from .images import derivative_names, derivatives_dir, generate_derivatives
+from .models import (
+    ArchivedPricingPackage, ArchivedPricingPackageVersion, GalleryItem, Job, Page, PricingPackage,
+    PricingPackageVersion, Year,
+)
+from .routers import REPLICA, replica_reads
+from .search import search_pages
+from .storage import get_package_storage
+from .tasks import InfectedFile, queue_render
+from .text import RENDER_VERSION
+from .warmup import warm_cache
+
+# Tests write to the primary, so public reads stay there except in
+# ReplicaRoutingTests, which fill a separate replica themselves.
+_primary_reads = mock.patch('cms.routers._has_replica', return_value=False)
+
+
+def setUpModule():
+    _primary_reads.start()
+
+
+def tearDownModule():
+    _primary_reads.stop()
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.page = Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        self.url = reverse('cms:page_detail', args=[self.page.slug])
+
+    def test_repeat_view_is_served_without_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Offers')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_conditional_request_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_page_save_invalidates(self):
+        self.client.get(self.url)
+        self.page.content = '<p>New offers</p>'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.save()
+        self.assertContains(self.client.get(self.url), 'New offers')
+
+    def test_package_approval_invalidates(self):
+        self.client.get(self.url)
+        package = PricingPackage.objects.create(
+            segment='weekday', year=Year.objects.create(year=2025),
+            package_name='Weekday Special', file='packages/weekday.pdf',
+        )
+        PricingPackageVersion.objects.create(
+            pricing_package=package, version=1, package_name=package.package_name,
+            file=package.file, uploader='admin', approved=True,
+        )
+        package.approved = True
+        with self.captureOnCommitCallbacks(execute=True):
+            package.save()
+        self.assertContains(self.client.get(self.url), 'Weekday Special')
+
+
+class PricingListQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        self.year = Year.objects.create(year=2025)
+        self.url = reverse('cms:page_detail', args=['trendy-offers'])
+
+    def create_packages(self, count, versions):
+        for i in range(count):
+            package = PricingPackage.objects.create(
+                segment='weekday', year=self.year, package_name=f'Package {i}',
+                file=f'packages/{i}.pdf', current_version=versions, approved=True,
+            )
+            for number in range(1, versions + 1):
+                PricingPackageVersion.objects.create(
+                    pricing_package=package, version=number, package_name=package.package_name,
+                    file=f'packages/versions/{i}-{number}.pdf', uploader='admin', approved=True,
+                )
+
+    def test_query_count_does_not_scale_with_packages_or_versions(self):
+        # Page, first gallery page, packages joined with year, current versions
+        for count, versions in ((1, 1), (10, 5)):
+            with self.subTest(count=count, versions=versions):
+                cache.clear()
+                self.create_packages(count, versions)
+                with self.assertNumQueries(4):
+                    response = self.client.get(self.url)
+                self.assertContains(response, 'Download Package (Version %d)' % versions)
+
+    def test_only_current_approved_version_is_linked(self):
+        self.create_packages(1, 2)
+        PricingPackageVersion.objects.filter(version=2).update(approved=False)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Package 0')
+        self.assertNotContains(response, 'Download Package')
+
+
+class NavigationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.page = Page.objects.create(title='About', slug='about', content='x' * 10000)
+
+    def test_navigation_is_built_once(self):
+        self.assertEqual(get_navigation(), [{'title': 'About', 'slug': 'about'}])
+        with self.assertNumQueries(0):
+            get_navigation()
+
+    def test_content_edit_keeps_navigation(self):
+        get_navigation()
+        self.page.content = 'changed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.save()
+        with self.assertNumQueries(0):
+            get_navigation()
+
+    def test_title_change_rebuilds_navigation(self):
+        get_navigation()
+        self.page.title = 'About Us'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.save()
+        self.assertEqual(get_navigation(), [{'title': 'About Us', 'slug': 'about'}])
+
+    def test_async_navigation_shares_the_memo(self):
+        self.assertEqual(async_to_sync(aget_navigation)(), [{'title': 'About', 'slug': 'about'}])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_navigation(), [{'title': 'About', 'slug': 'about'}])
+
+
+@skipIf(Image is None, "Pillow is not installed")
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), 'white').save(buffer, format='JPEG')
+        self.name = default_storage.save('gallery_media/cake.jpg', ContentFile(buffer.getvalue()))
+
+    def render(self):
+        return Template("{% load cms_images %}{% responsive_image name alt='Cake' %}").render(
+            Context({'name': self.name})
+        )
+
+    def test_variants_are_written_next_to_original(self):
+        manifest = generate_derivatives(self.name)
+        self.assertEqual([v['width'] for v in manifest['variants']['jpeg']], [480, 768, 1000])
+        for variants in manifest['variants'].values():
+            for variant in variants:
+                self.assertTrue(variant['name'].startswith(derivatives_dir(self.name) + '/'))
+                self.assertTrue(default_storage.exists(variant['name']))
+
+    def test_tag_emits_srcset_once_generated(self):
+        self.assertNotIn('srcset', self.render())
+        generate_derivatives(self.name)
+        html = self.render()
+        self.assertIn('<picture>', html)
+        self.assertIn('.derivatives/480.jpg 480w', html)
+        self.assertIn('sizes="100vw"', html)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PackageDownloadTests(TestCase):
+    def setUp(self):
+        name = default_storage.save('packages/versions/offer.pdf', ContentFile(b'%PDF-' + b'x' * 1000))
+        package = PricingPackage.objects.create(segment='weekday', package_name='Offer', file=name)
+        self.version = PricingPackageVersion.objects.create(
+            pricing_package=package, version=1, package_name='Offer',
+            file=name, uploader='admin', approved=True,
+        )
+        # Files outside the blob tree are hashed by a background job
+        jobs.work(once=True)
+        self.version.refresh_from_db()
+        self.url = reverse('cms:package_download', args=[self.version.id])
+
+    def test_full_download_is_streamed_with_strong_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-' + b'x' * 1000)
+        self.assertEqual(response['ETag'], '"%s"' % self.version.sha256)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-4/1005')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_conditional_request(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"%s"' % self.version.sha256)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unapproved_version_is_not_downloadable(self):
+        PricingPackageVersion.objects.update(approved=False)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_unhashed_version_is_served_with_a_weak_etag(self):
+        PricingPackageVersion.objects.update(sha256='')
+        with mock.patch('cms.models.hashlib.sha256') as sha256:
+            response = self.client.get(self.url)
+        sha256.assert_not_called()
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        # Hashing is left to the job
+        jobs.work(once=True)
+        self.version.refresh_from_db()
+        self.assertEqual(self.client.get(self.url)['ETag'], '"%s"' % self.version.sha256)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(TestCase):
+    def create_package(self, content):
+        package = PricingPackage.objects.create(
+            segment='weekday', package_name='Offer', file=ContentFile(content, name='offer.pdf'),
+        )
+        version = PricingPackageVersion.objects.create(
+            pricing_package=package, version=1, package_name='Offer', file=package.file, uploader='admin',
+        )
+        return package, version
+
+    def test_identical_uploads_share_one_blob(self):
+        first, first_version = self.create_package(b'%PDF-same')
+        second, second_version = self.create_package(b'%PDF-same')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first_version.file.name, first.file.name)
+        self.assertEqual(first_version.sha256, first.file.name.split('/')[2])
+        self.assertNotEqual(self.create_package(b'%PDF-other')[0].file.name, first.file.name)
+
+    def test_concurrent_saves_of_the_same_content_share_the_blob(self):
+        storage = get_package_storage()
+        name = storage.save('packages/offer.pdf', ContentFile(b'%PDF-race'))
+        # The second writer checked for the blob before the first one wrote it
+        with mock.patch.object(storage, 'blob_name', return_value=None):
+            self.assertEqual(storage.save('packages/offer.pdf', ContentFile(b'%PDF-race')), name)
+        self.assertEqual(storage.open(name).read(), b'%PDF-race')
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        first, _ = self.create_package(b'%PDF-shared')
+        second, _ = self.create_package(b'%PDF-shared')
+        name = first.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(first.file.storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(first.file.storage.exists(name))
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Page.objects.create(title='Home', slug='home', content='<p>Welcome</p>')
+        offers = Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        GalleryItem.objects.create(page=offers, media_file='gallery_media/terrace.jpg', caption='Terrace')
+        package = PricingPackage.objects.create(
+            segment='weekday', year=Year.objects.create(year=2025), package_name='Weekday Special',
+            file='packages/weekday.pdf', approved=True,
+        )
+        PricingPackageVersion.objects.create(
+            pricing_package=package, version=1, package_name=package.package_name,
+            file=package.file, uploader='admin', approved=True,
+        )
+
+    async def test_async_views_match_sync_output(self):
+        sync_request = RequestFactory().get('/')
+        async_request = AsyncRequestFactory().get('/')
+        for sync_view, async_view, kwargs in (
+            (views.home, views.home_async, {}),
+            (views.page_detail, views.page_detail_async, {'slug': 'trendy-offers'}),
+        ):
+            expected = await sync_to_async(sync_view)(sync_request, **kwargs)
+            response = await async_view(async_request, **kwargs)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['Last-Modified'], expected['Last-Modified'])
+
+    async def test_unrendered_pages_are_served(self):
+        # Rows written without save(), e.g. existing pages right after migration 0012
+        await Page.objects.filter(slug='trendy-offers').aupdate(render_version=0, rendered_content='')
+        expected = await sync_to_async(views.page_detail)(RequestFactory().get('/'), slug='trendy-offers')
+        cache.clear()
+        response = await views.page_detail_async(AsyncRequestFactory().get('/'), slug='trendy-offers')
+        self.assertContains(response, '<p>Offers</p>')
+        self.assertEqual(response.content, expected.content)
+
+    async def test_missing_page_is_404(self):
+        with self.assertRaises(Http404):
+            await views.page_detail_async(AsyncRequestFactory().get('/'), slug='missing')
+
+
+class CssBundleTests(TestCase):
+    def test_minify_and_purge(self):
+        css = """
+            /* header */
+            .nav a:hover, .unused > li { color : red ; }
+            @media (max-width: 767px) { .unused { display: none; } .nav { margin: 0 auto; } }
+            @font-face { font-family: 'Raleway'; }
+        """
+        self.assertEqual(
+            minify_css(css, used={'nav'}),
+            ".nav a:hover{color:red}@media (max-width:767px){.nav{margin:0 auto}}"
+            "@font-face{font-family:'Raleway'}",
+        )
+
+    def test_identical_sheets_are_processed_once(self):
+        source, output = Path(tempfile.mkdtemp()), Path(tempfile.mkdtemp()) / 'bundles'
+        for prefix in ('', 'trendy-offers_', 'pleasure-to-connect_'):
+            (source / f'index.php_{prefix}bootstrap.min.css').write_text('.btn { color: red; }')
+        (source / 'index.php_trendy-offers_style.css').write_text('.offer { color: blue; }')
+
+        manifest, builder = build_bundles(source, output)
+        self.assertEqual(builder.unique_sheets, 2)
+        self.assertEqual(sorted(manifest), ['home', 'pleasure-to-connect', 'trendy-offers'])
+        bundle = (output / Path(manifest['trendy-offers']).name).read_text()
+        self.assertEqual(bundle, '.btn{color:red}.offer{color:blue}')
+        self.assertEqual(json.loads((output / 'manifest.json').read_text()), manifest)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = Path(tempfile.mkdtemp())
+        (self.root / 'css').mkdir()
+        (self.root / 'css' / 'site.css').write_text('.offer { color: blue; }\n' * 200)
+        precompress(self.root, ['css/site.css'])
+
+    def serve(self, accept_encoding):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return serve_precompressed(request, 'css/site.css', document_root=self.root)
+
+    def test_gzip_sibling_is_served(self):
+        response = self.serve('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode(),
+                         '.offer { color: blue; }\n' * 200)
+
+    def test_identity_without_accept_encoding(self):
+        response = self.serve('')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_large_html_is_compressed_on_the_fly(self):
+        Page.objects.create(title='About', slug='about', content='<p>Ceremony</p>' * 500)
+        response = self.client.get(reverse('cms:page_detail', args=['about']), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertIn(b'<p>Ceremony</p>', gzip.decompress(response.content))
+
+    def test_pages_with_secrets_are_padded_against_breach(self):
+        # The login form carries a CSRF token and varies on Cookie
+        response = self.client.get(reverse('admin:login'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        # Random padding goes in the gzip header's file name field
+        self.assertTrue(response.content[3] & gzip.FNAME)
+        self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+
+    async def test_async_responses_are_compressed_without_a_thread_hop(self):
+        async def get_response(request):
+            return HttpResponse('<p>Ceremony</p>' * 500)
+
+        middleware = CompressionMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(AsyncRequestFactory().get('/', headers={'Accept-Encoding': 'gzip'}))
+        self.assertEqual(gzip.decompress(response.content), b'<p>Ceremony</p>' * 500)
+
+    def test_responses_use_the_fast_dynamic_levels(self):
+        middleware = CompressionMiddleware(lambda request: HttpResponse('<p>Ceremony</p>' * 500))
+        with mock.patch('cms.middleware.compress', wraps=compress) as compress_mock:
+            middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        compress_mock.assert_called_once_with(mock.ANY, 'gzip', DYNAMIC_LEVELS)
+
+    async def test_large_async_responses_are_compressed_off_the_event_loop(self):
+        async def get_response(request):
+            return HttpResponse('<p>Ceremony</p>' * 5000)
+
+        threads = []
+
+        def compress_in_thread(*args):
+            threads.append(threading.get_ident())
+            return compress(*args)
+
+        middleware = CompressionMiddleware(get_response)
+        with mock.patch('cms.middleware.compress', side_effect=compress_in_thread):
+            response = await middleware(AsyncRequestFactory().get('/', headers={'Accept-Encoding': 'gzip'}))
+        self.assertEqual(gzip.decompress(response.content), b'<p>Ceremony</p>' * 5000)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BulkImportExportTests(TestCase):
+    def setUp(self):
+        self.source = Path(tempfile.mkdtemp())
+        for name in ('all.pdf', 'weekday.pdf'):
+            (self.source / name).write_bytes(b'%PDF-' + name.encode())
+        (self.source / 'manifest.csv').write_text(
+            "segment,year,name,file\n"
+            "all_inclusive,2026,All Inclusive,all.pdf\n"
+            "Weekday Package,2026,Weekday,weekday.pdf\n"
+        )
+
+    def test_import_creates_years_packages_and_versions(self):
+        self.assertEqual(import_packages(self.source, 'admin'), (2, 0))
+        self.assertEqual(Year.objects.get().year, 2026)
+        package = PricingPackage.objects.get(segment='weekday')
+        version = package.versions.get()
+        self.assertEqual((version.version, version.uploader), (1, 'admin'))
+        self.assertEqual(version.file.read(), b'%PDF-weekday.pdf')
+        self.assertEqual(version.sha256, version.file.storage.content_hash(version.file.name))
+
+    def test_changed_file_becomes_new_version(self):
+        import_packages(self.source, 'admin')
+        imported_at = PricingPackage.objects.get(segment='weekday').updated_at
+        (self.source / 'weekday.pdf').write_bytes(b'%PDF-weekday-v2')
+        self.assertEqual(import_packages(self.source, 'admin'), (0, 1))
+        package = PricingPackage.objects.get(segment='weekday')
+        self.assertEqual(package.current_version, 2)
+        self.assertGreater(package.updated_at, imported_at)
+        self.assertFalse(package.approved)
+        self.assertEqual(package.versions.count(), 2)
+
+    def test_rows_sharing_a_file_store_it_once(self):
+        with (self.source / 'manifest.csv').open('a') as manifest:
+            manifest.write("venue_inclusive,2026,Venue,weekday.pdf\n")
+        with mock.patch('cms.bulk._store', wraps=bulk._store) as store:
+            self.assertEqual(import_packages(self.source, 'admin'), (3, 0))
+        self.assertEqual(sorted(call.args[1] for call in store.call_args_list), ['all.pdf', 'weekday.pdf'])
+
+    def test_short_csv_rows_report_missing_fields(self):
+        with (self.source / 'manifest.csv').open('a') as manifest:
+            manifest.write("venue_inclusive,2026\n")
+        with self.assertRaises(ValidationError) as raised:
+            import_packages(self.source, 'admin')
+        self.assertEqual(raised.exception.messages, ["Row 3: missing name, file."])
+
+    def test_malformed_json_manifests_are_rejected(self):
+        (self.source / 'manifest.csv').unlink()
+        for text, message in (
+            ('[{"segment": "all_inclusive",', "Invalid JSON in manifest.json"),
+            ('{"segment": "all_inclusive"}', "manifest.json must hold a list of objects."),
+            ('["all.pdf"]', "Row 1: not an object."),
+        ):
+            (self.source / 'manifest.json').write_text(text)
+            with self.assertRaises(ValidationError) as raised:
+                import_packages(self.source, 'admin')
+            self.assertIn(message, raised.exception.messages[0])
+
+    def test_export_round_trips(self):
+        import_packages(self.source, 'admin')
+        archive = Path(tempfile.mkdtemp()) / 'export.zip'
+        archive.write_bytes(b''.join(stream_export(PricingPackage.objects.all())))
+        PricingPackage.objects.all().delete()
+        self.assertEqual(import_packages(archive, 'admin'), (2, 0))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        Page.objects.create(title='Weekday Weddings', slug='weekday', content='<p>Ceremony on any weekday.</p>')
+        Page.objects.create(title='Gallery', slug='gallery', content='<p>Our <b>weekday</b> ceremony photos.</p>')
+        Page.objects.create(title='Private', slug='private', content='<p>Weekday staff rota.</p>', is_public=False)
+
+    def test_ranks_public_pages_and_highlights_matches(self):
+        results = search_pages('weekday')
+        self.assertEqual([r['slug'] for r in results], ['weekday', 'gallery'])
+        self.assertIn('<mark>weekday</mark>', results[1]['snippet'])
+        self.assertNotIn('<b>', results[1]['snippet'])
+
+    def test_index_follows_page_edits(self):
+        page = Page.objects.get(slug='gallery')
+        page.content = '<p>Reception by the lake.</p>'
+        page.save()
+        self.assertEqual([r['slug'] for r in search_pages('ceremony')], ['weekday'])
+        self.assertEqual([r['slug'] for r in search_pages('lake')], ['gallery'])
+        page.delete()
+        self.assertEqual(search_pages('lake'), [])
+
+    def test_search_view_escapes_query(self):
+        response = self.client.get(reverse('cms:search'), {'q': '<ceremony>'})
+        self.assertContains(response, '<mark>Ceremony</mark>')
+        self.assertNotContains(response, '<ceremony>')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StaticExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.output = Path(tempfile.mkdtemp())
+        Page.objects.create(title='Home', slug='home', content='<p>Welcome</p>')
+        self.offers = Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        self.package = PricingPackage.objects.create(
+            segment='weekday', year=Year.objects.create(year=2025), package_name='Weekday',
+            file=ContentFile(b'%PDF-weekday', name='weekday.pdf'), approved=True,
+        )
+        self.version = PricingPackageVersion.objects.create(
+            pricing_package=self.package, version=1, package_name='Weekday',
+            file=self.package.file.name, uploader='admin', approved=True,
+        )
+
+    def export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return export_site(self.output, workers=1)
+
+    def test_exports_pages_and_links_downloads_to_media(self):
+        result = self.export()
+        self.assertEqual(result['rendered'], ['/cms/', '/cms/page/home/', '/cms/page/trendy-offers/'])
+        html = (self.output / 'cms/page/trendy-offers/index.html').read_text()
+        self.assertIn('href="/media/%s"' % self.version.file.name, html)
+        self.assertNotIn('/download/', html)
+        self.assertEqual((self.output / 'media' / self.version.file.name).read_bytes(), b'%PDF-weekday')
+
+    def test_reexport_renders_only_changed_pages(self):
+        self.export()
+        self.assertEqual(self.export()['rendered'], [])
+
+        self.package.package_name = 'Midweek'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.package.save()
+        self.assertEqual(self.export()['rendered'], ['/cms/page/trendy-offers/'])
+        self.assertIn('Midweek', (self.output / 'cms/page/trendy-offers/index.html').read_text())
+
+    def test_unpublished_page_is_removed(self):
+        self.export()
+        self.offers.is_public = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.offers.save()
+        result = self.export()
+        self.assertEqual(result['removed'], ['/cms/page/trendy-offers/'])
+        self.assertFalse((self.output / 'cms/page/trendy-offers/index.html').exists())
+
+    def test_gallery_scrolls_through_exported_json(self):
+        GalleryItem.objects.bulk_create(
+            GalleryItem(page=self.offers, media_file=f'gallery_media/{i}.pdf', caption=f'Brochure {i}')
+            for i in range(GALLERY_PAGE_SIZE * 2 + 1)
+        )
+        self.export()
+        html = (self.output / 'cms/page/trendy-offers/index.html').read_text()
+        next_url = re.search(r'data-next="([^"]+)"', html).group(1)
+        captions = []
+        while next_url:
+            self.assertTrue(next_url.endswith('.json'))
+            data = json.loads((self.output / next_url.lstrip('/')).read_text())
+            captions += [item['caption'] for item in data['items']]
+            next_url = data['next_url']
+        self.assertEqual(captions, [f'Brochure {i}' for i in range(GALLERY_PAGE_SIZE, GALLERY_PAGE_SIZE * 2 + 1)])
+
+        # Files of gallery pages that no longer exist are removed
+        GalleryItem.objects.filter(caption__in=captions).delete()
+        self.export()
+        self.assertEqual(list((self.output / 'cms/page/trendy-offers/gallery').glob('*.json*')), [])
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+        Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        self.url = reverse('cms:page_detail', args=['trendy-offers'])
+
+    def series(self, histogram, label):
+        return {value: (total, count) for value, _, total, count in histogram.samples()}.get(label)
+
+    @override_settings(CMS_SERVER_TIMING=True)
+    def test_records_queries_templates_and_server_timing(self):
+        response = self.client.get(self.url)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=')
+        queries, count = self.series(metrics.DB_QUERIES, 'cms:page_detail')
+        self.assertEqual(count, 1)
+        self.assertGreater(queries, 0)
+        self.assertEqual(self.series(metrics.RESPONSE_BYTES, 'cms:page_detail')[0], len(response.content))
+        self.assertIsNotNone(self.series(metrics.TEMPLATE_SECONDS, 'cms/page_detail.html'))
+        self.assertIsNotNone(self.series(metrics.CONTEXT_PROCESSOR_SECONDS, 'navigation_pages'))
+
+    async def test_async_requests_are_recorded(self):
+        async def get_response(request):
+            await Page.objects.acount()
+            return HttpResponse('<p>Offers</p>')
+
+        middleware = InstrumentationMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(AsyncRequestFactory().get('/'))
+        # The query ran in the ORM's worker thread
+        self.assertEqual(self.series(metrics.DB_QUERIES, 'unresolved'), (1, 1))
+
+    def test_prometheus_endpoint_is_admin_only(self):
+        self.client.get(self.url)
+        metrics_url = reverse('cms:metrics')
+        self.assertEqual(self.client.get(metrics_url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(metrics_url)
+        self.assertContains(response, '# TYPE cms_request_db_queries histogram')
+        self.assertContains(response, 'cms_request_db_queries_count{view="cms:page_detail"} 1')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class GalleryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.page = Page.objects.create(title='Venue', slug='venue', content='<p>Venue</p>')
+        GalleryItem.objects.bulk_create(
+            GalleryItem(page=self.page, media_file=f'gallery_media/{i}.jpg', caption=f'Photo {i}') for i in range(5)
+        )
+        # Ties on uploaded_at are broken by id
+        GalleryItem.objects.update(uploaded_at=timezone.now())
+        self.ids = list(GalleryItem.objects.order_by('id').values_list('id', flat=True))
+
+    def test_keyset_pages_cover_every_item_once(self):
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                result = gallery_page(self.page.pk, cursor, limit=2)
+            seen += [item['id'] for item in result['items']]
+            cursor = result['next']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.ids)
+
+    def test_json_endpoint(self):
+        url = reverse('cms:page_gallery', args=['venue'])
+        first = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual([item['caption'] for item in first['items']], ['Photo 0', 'Photo 1', 'Photo 2'])
+        self.assertEqual(set(first['items'][0]), {
+            'id', 'caption', 'full', 'thumbnail', 'srcset', 'sources', 'width', 'height',
+        })
+        rest = self.client.get(url, {'after': first['next']}).json()
+        self.assertEqual(len(rest['items']), 2)
+        self.assertIsNone(rest['next'])
+        self.assertEqual(self.client.get(url, {'after': 'garbage'}).status_code, 400)
+
+    def test_page_renders_lazy_thumbnails(self):
+        response = self.client.get(reverse('cms:page_detail', args=['venue']))
+        self.assertContains(response, 'loading="lazy"', count=5)
+        self.assertNotContains(response, 'data-next')
+
+    def test_str_uses_joined_page(self):
+        item = GalleryItem.objects.select_related('page').first()
+        with self.assertNumQueries(0):
+            self.assertEqual(str(item), 'Venue - Photo 0')
+
+
+class EdgeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        self.package = PricingPackage.objects.create(
+            segment='weekday', year=Year.objects.create(year=2025),
+            package_name='Weekday Special', file='packages/weekday.pdf', approved=True,
+        )
+        PricingPackageVersion.objects.create(
+            pricing_package=self.package, version=1, package_name=self.package.package_name,
+            file=self.package.file, uploader='admin', approved=True,
+        )
+        self.url = reverse('cms:page_detail', args=['trendy-offers'])
+
+    def test_responses_carry_surrogate_keys(self):
+        for response in (self.client.get(self.url), self.client.get(self.url)):  # miss, then cached hit
+            self.assertEqual(
+                response['Surrogate-Key'].split(), ['page:trendy-offers', 'nav', f'package:{self.package.pk}'],
+            )
+            self.assertIn(f's-maxage={edge.EDGE_MAX_AGE}', response['Cache-Control'])
+            self.assertIn('max-age=0', response['Cache-Control'])
+
+    def test_approval_sends_one_deduplicated_purge(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        approve_url = reverse('admin:cms_pricingpackage_approve', args=[self.package.pk])
+        PricingPackage.objects.update(approved=False)
+        with edge.PurgeStandIn() as proxy:
+            dispatcher = edge.PurgeDispatcher(edge.HTTPPurgeBackend([proxy.url]), window=60)
+            with mock.patch.object(edge, '_dispatcher', dispatcher):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(approve_url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    Page.objects.get(slug='trendy-offers').save()
+                # Nothing is sent until the batching window closes
+                self.assertEqual(proxy.requests, [])
+                dispatcher.flush()
+        self.assertEqual(proxy.requests, [('PURGE', [f'package:{self.package.pk}', 'page:trendy-offers'])])
+
+
+class ApprovalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        year = Year.objects.create(year=2025)
+        self.packages = []
+        for i in range(6):
+            package = PricingPackage.objects.create(
+                segment='weekday', year=year, package_name=f'Package {i}', file=f'packages/{i}.pdf',
+                current_version=2,
+            )
+            PricingPackageVersion.objects.bulk_create(
+                PricingPackageVersion(
+                    pricing_package=package, version=number, package_name=package.package_name,
+                    file=f'packages/versions/{i}-{number}.pdf', uploader='admin',
+                )
+                for number in (1, 2)
+            )
+            self.packages.append(package)
+        self.user = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(self.user)
+        self.changelist = reverse('admin:cms_pricingpackage_changelist')
+
+    def approve_selected(self, packages):
+        return self.client.post(self.changelist, {
+            'action': 'approve_selected', '_selected_action': [package.pk for package in packages],
+        })
+
+    def test_bulk_action_runs_constant_queries(self):
+        with CaptureQueriesContext(connection) as two:
+            self.approve_selected(self.packages[:2])
+        with CaptureQueriesContext(connection) as four:
+            self.approve_selected(self.packages[2:])
+        self.assertEqual(len(two), len(four))
+        self.assertEqual(PricingPackage.objects.filter(approved=True).count(), 6)
+        self.assertEqual(
+            sorted(PricingPackageVersion.objects.filter(approved=True).values_list('version', flat=True)), [2] * 6,
+        )
+
+    def test_repeated_approval_writes_nothing(self):
+        package = self.packages[0]
+        url = reverse('admin:cms_pricingpackage_approve', args=[package.pk])
+        self.client.get(url)
+        first = PricingPackage.objects.values('updated_at', 'approved_at').get(pk=package.pk)
+        version_approved_at = PricingPackageVersion.objects.get(pricing_package=package, version=2).approved_at
+        self.client.get(url)
+        self.assertEqual(PricingPackage.objects.values('updated_at', 'approved_at').get(pk=package.pk), first)
+        self.assertEqual(
+            PricingPackageVersion.objects.get(pricing_package=package, version=2).approved_at, version_approved_at,
+        )
+
+    def test_version_bump_uses_stored_number(self):
+        package = self.packages[0]
+        # Another upload landed after this object was loaded
+        PricingPackage.objects.filter(pk=package.pk).update(current_version=3)
+        package.file = 'packages/new.pdf'
+        version = bump_version(package, 'admin', fields=['file'])
+        self.assertEqual(version.version, 4)
+        self.assertEqual(PricingPackage.objects.get(pk=package.pk).current_version, 4)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.TASKS['test_record'] = lambda **payload: self.calls.append(payload)
+        self.addCleanup(jobs.TASKS.pop, 'test_record')
+
+    def test_idempotency_key_coalesces_queued_jobs(self):
+        jobs.enqueue('test_record', key='same', n=1)
+        jobs.enqueue('test_record', key='same', n=2)
+        self.assertEqual(jobs.work(once=True), 1)
+        self.assertEqual(self.calls, [{'n': 1}])
+        # A finished job runs again when its key is queued again
+        jobs.enqueue('test_record', key='same', n=3)
+        jobs.work(once=True)
+        self.assertEqual(self.calls, [{'n': 1}, {'n': 3}])
+
+    def test_failures_back_off_then_fail(self):
+        def flaky(**payload):
+            raise OSError("storage unavailable")
+        jobs.TASKS['test_record'] = flaky
+        jobs.enqueue('test_record')
+        jobs.work(once=True)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('storage unavailable', job.last_error)
+        # Not due yet
+        self.assertEqual(jobs.work(once=True), 0)
+
+        Job.objects.update(run_at=timezone.now(), attempts=jobs.MAX_ATTEMPTS - 1)
+        jobs.work(once=True)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_upload_processing_leaves_the_request(self):
+        page = Page.objects.create(title='Venue', slug='venue', content='<p>Venue</p>')
+        item = GalleryItem.objects.create(page=page, media_file='gallery_media/cake.jpg')
+        self.assertEqual(list(Job.objects.values_list('task', 'key')), [
+            ('gallery_derivatives', f'derivatives:{item.media_file.name}'),
+        ])
+        with self.settings(CMS_UPLOAD_SCANNERS=['cms.tests.reject_upload']):
+            package = PricingPackage.objects.create(
+                segment='weekday', package_name='Offer', file='packages/offer.pdf', approved=True,
+            )
+            PricingPackageVersion.objects.create(
+                pricing_package=package, version=1, package_name='Offer', file=package.file,
+                uploader='admin', approved=True,
+            )
+            self.assertTrue(Job.objects.filter(task='scan_upload').exists())
+            Job.objects.exclude(task='scan_upload').delete()
+            jobs.work(once=True)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertFalse(PricingPackage.objects.get().approved)
+        self.assertFalse(PricingPackageVersion.objects.get().approved)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PageRenderingTests(TestCase):
+    def test_save_stores_sanitised_rendered_content(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), 'white').save(buffer, format='PNG')
+        name = default_storage.save('uploads/lawn.png', ContentFile(buffer.getvalue()))
+        page = Page.objects.create(title='Venue', slug='venue', content=(
+            '<html><head><title>Scraped</title></head><body>'
+            '<h2 onclick="steal()">The Lawn</h2><script>steal()</script>'
+            f'<p>Ceremony &amp; reception<img src="/media/{name}" alt="Lawn">'
+            '<a href="javascript:steal()">Book</a><a href="/contact/" target="_blank">Contact</a>'
+            '</body></html>'
+        ))
+        self.assertHTMLEqual(page.rendered_content, (
+            '<h2>The Lawn</h2><p>Ceremony &amp; reception'
+            f'<img src="{default_storage.url(name)}" alt="Lawn" loading="lazy" decoding="async" '
+            'width="640" height="480">'
+            '<a>Book</a><a href="/contact/" target="_blank" rel="noopener">Contact</a></p>'
+        ))
+        self.assertEqual(page.excerpt, 'The Lawn Ceremony & reception Book Contact')
+        self.assertEqual(page.render_version, RENDER_VERSION)
+        response = self.client.get(reverse('cms:page_detail', args=['venue']))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertNotContains(response, 'steal()')
+
+    def test_void_and_unclosed_dropped_tags_keep_following_content(self):
+        page = Page.objects.create(title='Venue', slug='venue', content=(
+            '<p>Tour<embed src="tour.swf"> of the lawn</p>'
+            '<div><iframe src="https://maps.example/">Map</div><p>Parking</p>'
+            '<object><object>Nested</object></object><p>Catering</p>'
+        ))
+        self.assertHTMLEqual(
+            page.rendered_content, '<p>Tour of the lawn</p><div></div><p>Parking</p><p>Catering</p>',
+        )
+        self.assertEqual(page.excerpt, 'Tour of the lawn Parking Catering')
+
+    def test_stale_pages_are_rerendered_in_background_batches(self):
+        Page.objects.bulk_create(
+            Page(title=f'Page {i}', slug=f'page-{i}', content=f'<p>Body {i}</p><script>x()</script>')
+            for i in range(3)
+        )
+        # Rows written without save() are rendered on the fly meanwhile
+        self.assertEqual(Page.objects.get(slug='page-0').body, '<p>Body 0</p>')
+        with mock.patch('cms.tasks.RENDER_BATCH_SIZE', 2):
+            queue_render()
+            self.assertEqual(jobs.work(once=True), 2)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertFalse(Page.objects.filter(render_version__lt=RENDER_VERSION).exists())
+        self.assertEqual(Page.objects.get(slug='page-2').rendered_content, '<p>Body 2</p>')
+
+
+class CacheWarmingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for slug in ('home', 'trendy-offers', 'venue'):
+            Page.objects.create(title=slug.title(), slug=slug, content=f'<p>{slug}</p>')
+
+    def test_warm_cache_prefills_every_public_page(self):
+        statuses = warm_cache(workers=1)
+        self.assertEqual(statuses, {'/cms/page/trendy-offers/': 200, '/cms/': 200, '/cms/page/venue/': 200})
+        for url in statuses:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_new_generation_reaches_every_process(self):
+        url = reverse('cms:page_detail', args=['venue'])
+        self.assertContains(self.client.get(url), '<p>venue</p>')
+        self.assertEqual(len(get_navigation()), 3)
+        # Written behind the cache's back, as by a deploy changing templates
+        Page.objects.filter(slug='venue').update(rendered_content='<p>Redesigned</p>')
+        Page.objects.filter(slug='home').update(is_public=False)
+        self.assertContains(self.client.get(url), '<p>venue</p>')
+        bump_generation()
+        self.assertContains(self.client.get(url), 'Redesigned')
+        self.assertEqual(len(get_navigation()), 2)
+
+    def test_approval_queues_pricing_page_warmup(self):
+        package = PricingPackage.objects.create(segment='weekday', package_name='Offer', file='packages/offer.pdf')
+        Job.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_packages([package.pk], 'admin')
+        self.assertEqual(list(Job.objects.values_list('key', flat=True)), ['warm:trendy-offers'])
+        jobs.work(once=True)
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse('cms:page_detail', args=['trendy-offers'])), 'Offer')
+
+
+class StartupBudgetTests(TestCase):
+    # Each boot is a fresh interpreter in the public-only profile
+
+    def test_public_profile_defers_staff_and_optional_imports(self):
+        # Timing depends on the machine; `python -m benchmarks.startup --check` checks it
+        result = startup.boot('public')
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(startup.forbidden_imports(result), [])
+
+    def test_public_profile_serves_no_staff_urls(self):
+        self.assertEqual(startup.boot('public', url='/admin/')['status'], 404)
+        self.assertEqual(startup.boot('public', url='/cms/metrics/')['status'], 403)
+
+
+def reject_upload(storage, name):
+    raise InfectedFile(f"{name}: Eicar-Test-Signature FOUND")
+
+
+def make_pdf(*texts):
+    """
+    Minimal PDF with one page per text, in Helvetica.
+    """
+    pages = len(texts)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % (4 + 2 * i) for i in range(pages)), pages,
+        ),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for i, text in enumerate(texts):
+        stream = b'BT /F1 24 Tf 72 720 Td (%s) Tj ET' % text.encode()
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (5 + 2 * i)
+        )
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+    out, offsets = bytearray(b'%PDF-1.4\n'), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+@skipIf(pdfium is None or Image is None, "pypdfium2 and Pillow are needed for previews")
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PackagePreviewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        self.package = PricingPackage.objects.create(
+            segment='weekday', year=Year.objects.create(year=2025), package_name='Weekday',
+            file=ContentFile(make_pdf('Weekday Package', 'Champagne toast'), name='weekday.pdf'), approved=True,
+        )
+        self.version = PricingPackageVersion.objects.create(
+            pricing_package=self.package, version=1, package_name='Weekday',
+            file=self.package.file.name, uploader='admin', approved=True,
+        )
+
+    def test_upload_job_extracts_metadata_and_preview(self):
+        self.assertTrue(Job.objects.filter(task='package_preview').exists())
+        jobs.work(once=True)
+        version = PricingPackageVersion.objects.get()
+        self.assertEqual(version.page_count, 2)
+        self.assertEqual(version.file_size, self.package.file.size)
+        self.assertIn('Champagne toast', version.text)
+        widths = [variant['width'] for variant in version.preview['variants']['jpeg']]
+        self.assertEqual(widths, [480, 768, 1200])
+        self.assertTrue(all(default_storage.exists(name) for name in derivative_names(version.preview)))
+
+    def test_page_shows_preview_without_reading_the_pdf(self):
+        response = self.client.get(reverse('cms:page_detail', args=['trendy-offers']))
+        self.assertNotContains(response, 'package-preview')
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.work(once=True)
+        with mock.patch('cms.previews.read_pdf') as read_pdf:
+            response = self.client.get(reverse('cms:page_detail', args=['trendy-offers']))
+        read_pdf.assert_not_called()
+        self.assertContains(response, 'class="package-preview"')
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'PDF, 2 pages')
+
+
+# Two separate databases, e.g. DB_ENGINE=django.db.backends.sqlite3 with DB_NAME
+# and DB_REPLICA_NAME set
+SEPARATE_REPLICA = REPLICA in settings.DATABASES and not settings.DATABASES[REPLICA].get('TEST', {}).get('MIRROR')
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', REPLICA} if REPLICA in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        _primary_reads.stop()
+        self.addCleanup(_primary_reads.start)
+        self.url = reverse('cms:page_detail', args=['venue'])
+
+    def test_writes_pin_the_rest_of_the_view_to_the_primary(self):
+        @replica_reads
+        def view(request):
+            before = router.db_for_read(Page)
+            Page.objects.create(title='Venue', slug='venue', content='<p>Venue</p>')
+            return before, router.db_for_read(Page)
+
+        with mock.patch.dict(connections.databases, {REPLICA: connections.databases['default']}):
+            self.assertEqual(view(None), (REPLICA, 'default'))
+        self.assertEqual(router.db_for_read(Page), 'default')
+
+    @skipIf(not SEPARATE_REPLICA, "needs a separate replica database")
+    def test_public_views_read_from_the_replica(self):
+        Page.objects.create(title='Venue', slug='venue', content='<p>Primary</p>')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        Page.objects.using(REPLICA).create(title='Venue', slug='venue', content='<p>Replica</p>')
+        self.assertContains(self.client.get(self.url), 'Replica')
+
+    @skipIf(not SEPARATE_REPLICA, "needs a separate replica database")
+    def test_committed_writes_fence_off_the_replica(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(title='Venue', slug='venue', content='<p>Primary</p>')
+        self.assertContains(self.client.get(self.url), 'Primary')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PricingArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Page.objects.create(title='Trendy Offers', slug='trendy-offers', content='<p>Offers</p>')
+        self.url = reverse('cms:page_detail', args=['trendy-offers'])
+
+    def create_package(self, year, versions, content=None):
+        package = PricingPackage.objects.create(
+            segment='weekday', year=Year.objects.get_or_create(year=year)[0],
+            package_name=f'Offer {year}', file=ContentFile(content or f'%PDF-{year}'.encode(), name='offer.pdf'),
+            current_version=versions, approved=True,
+        )
+        for number in range(1, versions + 1):
+            PricingPackageVersion.objects.create(
+                pricing_package=package, version=number, package_name=package.package_name,
+                file=package.file, uploader='admin', approved=True,
+            )
+        return package
+
+    def test_history_moves_to_the_archive(self):
+        old = self.create_package(2024, 2)
+        current = self.create_package(2026, 3)
+        self.assertEqual(archive_pricing(before_year=2026), (1, 4))
+
+        self.assertFalse(PricingPackage.objects.filter(pk=old.pk).exists())
+        self.assertEqual(ArchivedPricingPackage.objects.get(pk=old.pk).year.year, 2024)
+        self.assertEqual(
+            sorted(ArchivedPricingPackageVersion.objects.values_list('package_id', 'version')),
+            [(old.pk, 1), (old.pk, 2), (current.pk, 1), (current.pk, 2)],
+        )
+        self.assertEqual(list(current.versions.values_list('version', flat=True)), [3])
+        # The pricing page still lists the current version, in as many queries
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Download Package (Version 3)')
+        self.assertNotContains(response, 'Offer 2024')
+        # Nothing left to move
+        self.assertEqual(archive_pricing(before_year=2026), (0, 0))
+
+    def test_id_collision_fails_the_batch(self):
+        current = self.create_package(2026, 2)
+        version = current.versions.get(version=1)
+        ArchivedPricingPackageVersion.objects.create(
+            id=version.pk, package_id=0, version=1, package_name='Other', file='packages/other.pdf',
+            uploader='admin', uploaded_at=timezone.now(), approved=True,
+        )
+        with self.assertRaises(IntegrityError):
+            archive_pricing(before_year=2026)
+        self.assertTrue(PricingPackageVersion.objects.filter(pk=version.pk).exists())
+        self.assertEqual(ArchivedPricingPackageVersion.objects.get(pk=version.pk).package_name, 'Other')
+
+    def test_archived_rows_keep_their_files(self):
+        old = self.create_package(2024, 1, content=b'%PDF-shared')
+        current = self.create_package(2026, 1, content=b'%PDF-shared')
+        name = old.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_pricing(before_year=2026)
+        with self.captureOnCommitCallbacks(execute=True):
+            current.delete()
+        self.assertTrue(old.file.storage.exists(name))
+
+    def test_archive_is_browsable_but_read_only(self):
+        old = self.create_package(2024, 2)
+        archive_pricing(before_year=2026)
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        response = self.client.get(reverse('admin:cms_archivedpricingpackage_changelist'))
+        self.assertContains(response, 'Offer 2024')
+        response = self.client.get(
+            reverse('admin:cms_archivedpricingpackageversion_changelist'), {'package_id': old.pk},
+        )
+        self.assertContains(response, '2 archived pricing package versions')
+        self.assertNotContains(response, 'action-checkbox')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PricingAdminHistoryTests(TestCase):
+    def setUp(self):
+        self.year = Year.objects.create(year=2026)
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+
+    def create_package(self, versions, name='Offer'):
+        package = PricingPackage.objects.create(
+            segment='weekday', year=self.year, package_name=name, file='packages/offer.pdf',
+            current_version=versions,
+        )
+        PricingPackageVersion.objects.bulk_create(
+            PricingPackageVersion(
+                pricing_package=package, version=number, package_name=name,
+                file=f'packages/versions/{number}.pdf', uploader='admin', approved=number < versions,
+            )
+            for number in range(1, versions + 1)
+        )
+        return package
+
+    def test_version_inline_loads_one_page(self):
+        short, long = self.create_package(25, 'Short'), self.create_package(60, 'Long')
+        # Fills the per-process caches of the admin
+        self.client.get(reverse('admin:cms_pricingpackage_change', args=[short.pk]))
+        for package in (short, long):
+            url = reverse('admin:cms_pricingpackage_change', args=[package.pk])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            if package is short:
+                expected = len(queries)
+            self.assertEqual(len(queries), expected)
+            # Newest first, with the approve button for the pending version
+            self.assertContains(response, '/approve_version/', count=1)
+            self.assertContains(response, f'Versions 1–20 of {package.current_version}')
+        response = self.client.get(url, {'versions_page': 3})
+        self.assertContains(response, 'Versions 41–60 of 60')
+        self.assertNotContains(response, '/approve_version/')
+
+    def test_changelist_queries_do_not_scale_with_packages(self):
+        url = reverse('admin:cms_pricingpackage_changelist')
+        counts = []
+        for name in ('First', 'Second', 'Third'):
+            self.create_package(1, name)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertContains(self.client.get(url), name)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_history_export_streams_live_and_archived_versions(self):
+        old = self.create_package(2, 'Old')
+        old.year = Year.objects.create(year=2024)
+        old.save()
+        self.create_package(3, 'Current')
+        archive_pricing(before_year=2026)
+
+        response = self.client.get(reverse('admin:cms_pricingpackage_export', args=['csv']))
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(
+            [(row['package_name'], row['year'], row['version'], row['archived']) for row in rows],
+            [('Current', '2026', '3', 'False'),
+             ('Old', '2024', '1', 'True'), ('Old', '2024', '2', 'True'),
+             ('Current', '2026', '1', 'True'), ('Current', '2026', '2', 'True')],
+        )
+        response = self.client.get(reverse('admin:cms_pricingpackage_export', args=['json']))
+        self.assertEqual(
+            [row['version'] for row in json.loads(b''.join(response.streaming_content))], [3, 1, 2, 1, 2],
+        )
+        self.assertEqual(self.client.get(reverse('admin:cms_pricingpackage_export', args=['xml'])).status_code, 404)
@@ -0,0 +1,273 @@
+# cms/text.py
+
+import html
+import re
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from .storage import SCRAPED_DIR
+
+NON_CONTENT_RE = re.compile(r'<(script|style|noscript)\b.*?</\1\s*>', re.S | re.I)
+TAG_RE = re.compile(r'<[^>]*>')
+
+# Version of render_content(). Bump it whenever its output changes: pages
+# rendered by an older version are re-rendered in the background.
+RENDER_VERSION = 2
+
+# Page columns written by render_content()
+RENDERED_FIELDS = ('rendered_content', 'excerpt', 'render_version')
+
+EXCERPT_LENGTH = 300
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'address', 'article', 'aside', 'b', 'blockquote', 'br', 'caption', 'cite',
+    'code', 'col', 'colgroup', 'dd', 'del', 'details', 'div', 'dl', 'dt', 'em', 'figcaption',
+    'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'i', 'img', 'ins',
+    'li', 'main', 'mark', 'nav', 'ol', 'p', 'picture', 'pre', 'q', 's', 'section', 'small',
+    'source', 'span', 'strong', 'sub', 'summary', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th',
+    'thead', 'time', 'tr', 'u', 'ul',
+}
+
+# Tags dropped together with everything inside them
+DROPPED_TAGS = {
+    'script', 'style', 'noscript', 'template', 'iframe', 'object', 'embed', 'svg', 'math',
+    'form', 'textarea', 'select', 'button', 'head', 'title',
+}
+
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+    'track', 'wbr',
+}
+
+GLOBAL_ATTRIBUTES = {'class', 'id', 'title', 'lang', 'dir', 'style'}
+
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'target', 'rel', 'name'},
+    'blockquote': {'cite'},
+    'col': {'span'},
+    'colgroup': {'span'},
+    'img': {'src', 'srcset', 'sizes', 'alt', 'width', 'height', 'loading', 'decoding'},
+    'ol': {'start', 'type', 'reversed'},
+    'q': {'cite'},
+    'source': {'src', 'srcset', 'sizes', 'type', 'media', 'width', 'height'},
+    'td': {'colspan', 'rowspan', 'headers'},
+    'th': {'colspan', 'rowspan', 'headers', 'scope'},
+    'time': {'datetime'},
+}
+
+URL_ATTRIBUTES = {'href', 'src', 'cite'}
+SRCSET_ATTRIBUTES = {'srcset'}
+
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto', 'tel'}
+
+# Inline styles that can run script in some browsers
+UNSAFE_STYLE_RE = re.compile(r'expression\s*\(|javascript:|behavior\s*:|-moz-binding', re.I)
+
+# Media URLs as the scraped content and the editor write them
+MEDIA_PREFIXES = tuple({'/media/', settings.MEDIA_URL})
+
+
+def page_text(content):
+    """
+    Plain text of a page body: tags, scripts and styles removed,
+    entities decoded and whitespace collapsed.
+    """
+    text = strip_tags(NON_CONTENT_RE.sub(' ', content or ''))
+    return ' '.join(html.unescape(text).split())
+
+
+def _is_safe_url(url):
+    try:
+        return urlsplit(url.strip()).scheme.lower() in ALLOWED_SCHEMES
+    except ValueError:
+        return False
+
+
+def _asset_url(url):
+    """
+    Returns (public URL, local file opener) of a media or scraped static
+    asset, or (url, None) for anything else. Static assets get their
+    fingerprinted name, media files the URL of the default storage (which
+    may be a CDN).
+    """
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return url, None
+    path = unquote(parts.path)
+    for prefix in MEDIA_PREFIXES:
+        if path.startswith(prefix):
+            name = path[len(prefix):]
+            return default_storage.url(name), lambda: default_storage.open(name, 'rb')
+
+    static_prefix = '/' + urlsplit(settings.STATIC_URL).path.strip('/') + '/'
+    if path.startswith(static_prefix):
+        name = path[len(static_prefix):]
+    elif not path.startswith('/'):
+        # Relative links of the scraped site point into its asset tree
+        name = f'{SCRAPED_DIR}/{path.removeprefix("./")}'
+    else:
+        return url, None
+    try:
+        found = finders.find(name)
+        # Raises ValueError for files missing from the collectstatic manifest
+        public = static(name) if found else None
+    except (SuspiciousFileOperation, ValueError):
+        found = None
+    if not found:
+        return url, None
+    return public, lambda: open(found, 'rb')
+
+
+class ContentRenderer(HTMLParser):
+    """
+    Sanitises a page body against an allow-list of tags and attributes,
+    rewrites asset URLs and marks images lazy, in a single pass.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        # Tag whose content is being dropped, and how deep it is nested
+        self.dropping = None
+        self.drop_depth = 0
+        self.image_sizes = {}
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping:
+            if tag == self.dropping:
+                self.drop_depth += 1
+            return
+        if tag in DROPPED_TAGS:
+            # Void tags such as <embed> have no content or end tag
+            if tag not in VOID_TAGS:
+                self.dropping, self.drop_depth = tag, 1
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        self.out.append(self._start_tag(tag, attrs))
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag == self.dropping:
+                self.drop_depth -= 1
+                if not self.drop_depth:
+                    self.dropping = None
+                return
+            if tag not in self.open_tags:
+                return
+            # An enclosing element ends, so the unclosed dropped one ends too
+            self.dropping = None
+        if tag not in self.open_tags:
+            return
+        # Closes elements the scraped HTML left open inside this one
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.out.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(html.escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        self.dropping = None
+        self.out.extend(f'</{tag}>' for tag in reversed(self.open_tags))
+        self.open_tags = []
+        return ''.join(self.out)
+
+    def _start_tag(self, tag, attrs):
+        allowed = GLOBAL_ATTRIBUTES | ALLOWED_ATTRIBUTES.get(tag, set())
+        cleaned = {}
+        opener = None
+        for name, value in attrs:
+            value = value or ''
+            if name not in allowed and not name.startswith(('aria-', 'data-')):
+                continue
+            if name in URL_ATTRIBUTES:
+                if not _is_safe_url(value):
+                    continue
+                value, file_opener = _asset_url(value.strip())
+                if name == 'src':
+                    opener = file_opener
+            elif name in SRCSET_ATTRIBUTES:
+                value = self._srcset(value)
+                if value is None:
+                    continue
+            elif name == 'style' and UNSAFE_STYLE_RE.search(value):
+                continue
+            cleaned[name] = value
+
+        if tag == 'a' and cleaned.get('target') == '_blank':
+            rel = cleaned.get('rel', '').split()
+            cleaned['rel'] = ' '.join(rel if 'noopener' in rel else [*rel, 'noopener'])
+        if tag == 'img':
+            cleaned.setdefault('loading', 'lazy')
+            cleaned.setdefault('decoding', 'async')
+            if opener is not None and not ('width' in cleaned or 'height' in cleaned):
+                size = self._image_size(cleaned['src'], opener)
+                if size:
+                    cleaned['width'], cleaned['height'] = size
+
+        rendered = ''.join(f' {name}="{html.escape(str(value))}"' for name, value in cleaned.items())
+        return f'<{tag}{rendered}>'
+
+    def _srcset(self, value):
+        candidates = []
+        for candidate in value.split(','):
+            url, _, descriptor = candidate.strip().partition(' ')
+            if not url:
+                continue
+            if not _is_safe_url(url):
+                return None
+            candidates.append(f'{_asset_url(url)[0]} {descriptor.strip()}'.strip())
+        return ', '.join(candidates)
+
+    def _image_size(self, url, opener):
+        try:
+            # Imported on use, like in cms/images.py
+            from PIL import Image
+        except ImportError:  # optional; without it <img> tags get no dimensions
+            return None
+        if url not in self.image_sizes:
+            try:
+                with opener() as f, Image.open(f) as image:
+                    # Only the header is read
+                    self.image_sizes[url] = image.size
+            except (OSError, ValueError, SuspiciousFileOperation, Image.DecompressionBombError):
+                self.image_sizes[url] = None
+        return self.image_sizes[url]
+
+
+def render_content(content):
+    """
+    Runs a page body through the rendering pipeline. Returns the values of
+    RENDERED_FIELDS: the sanitised HTML, a plain-text excerpt and the
+    pipeline version that produced them.
+    """
+    renderer = ContentRenderer()
+    renderer.feed(content or '')
+    rendered = renderer.close()
+    return {
+        'rendered_content': rendered,
+        # Tags become spaces so headings and paragraphs don't run together
+        'excerpt': Truncator(' '.join(html.unescape(TAG_RE.sub(' ', rendered)).split())).chars(EXCERPT_LENGTH),
+        'render_version': RENDER_VERSION,
+    }
@@ -1,10 +1,21 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'cms'  # Ensure this is unique and not duplicated in other apps
 
+# ASGI deployments serve the public pages from the async views
+if settings.CMS_ASYNC_VIEWS:
+    home, page_detail = views.home_async, views.page_detail_async
+else:
+    home, page_detail = views.home, views.page_detail
+
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('page/<slug:slug>/', views.page_detail, name='page_detail'),
+    path('', home, name='home'),
+    path('page/<slug:slug>/', page_detail, name='page_detail'),
+    path('page/<slug:slug>/gallery/', views.page_gallery, name='page_gallery'),
+    path('search/', views.search, name='search'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('packages/<int:version_id>/download/', views.package_download, name='package_download'),
     # ...other URL patterns...
 ]
@@ -1,16 +1,159 @@
-from django.shortcuts import render, get_object_or_404
-from .models import Page, PricingPackage
+import hmac
 
+from asgiref.sync import sync_to_async
+
+from django.apps import apps
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import http_date
+
+from .cache import HOME_PAGE_SLUG, PRICING_PAGE_SLUG, aget_navigation, cached_page
+from .downloads import serve_file, weak_etag
+from .edge import NAVIGATION_KEY, package_key, page_key, tag_response
+from .gallery import GALLERY_PAGE_SIZE, MAX_GALLERY_PAGE_SIZE, agallery_page, gallery_page
+from .jobs import enqueue
+from .metrics import render, render_prometheus
+from .models import Page, PricingPackage, PricingPackageVersion
+from .routers import replica_reads
+from .search import search_pages
+
+
+def _last_modified(*timestamps):
+    # Latest of the given datetimes as an HTTP date, ignoring empty values
+    timestamps = [ts for ts in timestamps if ts is not None]
+    return http_date(max(timestamps).timestamp()) if timestamps else None
+
+
+def _pages():
+    # The templates show the pre-rendered body; the raw content is not needed
+    return Page.objects.defer('content', 'search_text')
+
+
+def _render_page(request, context):
+    # Shared by the sync and async views so both produce identical output
+    page = context['page']
+    timestamps = [page.last_updated]
+    timestamps += [package.updated_at for package in context.get('pricing_packages', ())]
+    response = render(request, 'cms/page_detail.html', context)
+    response['Last-Modified'] = _last_modified(*timestamps)
+    keys = [page_key(page.slug), NAVIGATION_KEY]
+    keys += [package_key(package.pk) for package in context.get('pricing_packages', ())]
+    return tag_response(response, keys)
+
+
+@cached_page
+@replica_reads
 def home(request):
     # Loads the page with slug 'home'
-    page = get_object_or_404(Page, slug='home')
-    return render(request, 'cms/page_detail.html', {'page': page})
+    page = get_object_or_404(_pages(), slug=HOME_PAGE_SLUG)
+    return _render_page(request, {'page': page})
+
 
+@cached_page
+@replica_reads
 def page_detail(request, slug):
-    page = get_object_or_404(Page, slug=slug, is_public=True)
-    context = {'page': page}
-    if slug == 'trendy-offers':
+    page = get_object_or_404(_pages(), slug=slug, is_public=True)
+    context = {'page': page, 'gallery': gallery_page(page.pk)}
+    if slug == PRICING_PAGE_SLUG:
         # Query approved pricing packages.
-        pricing_packages = PricingPackage.objects.filter(approved=True)
-        context['pricing_packages'] = pricing_packages
-    return render(request, 'cms/page_detail.html', context)
\ No newline at end of file
+        context['pricing_packages'] = list(PricingPackage.objects.current_offers())
+    return _render_page(request, context)
+
+
+async def _aget_page(**lookup):
+    try:
+        page = await _pages().aget(**lookup)
+    except Page.DoesNotExist:
+        raise Http404("No Page matches the given query.")
+    if not page.render_version:
+        # Page.body renders unrendered rows (e.g. from bulk_create) from the
+        # deferred content, which would otherwise be loaded synchronously
+        await page.arefresh_from_db(fields=['content'])
+    return page
+
+
+@cached_page
+@replica_reads
+async def home_async(request):
+    # Async counterpart of home() for ASGI deployments
+    page = await _aget_page(slug=HOME_PAGE_SLUG)
+    # Resolved up front: the lazy context-processor menu would query synchronously
+    context = {'page': page, 'navigation_pages': await aget_navigation()}
+    # Template loading and the asset/derivative manifest lookups block
+    return await sync_to_async(_render_page)(request, context)
+
+
+@cached_page
+@replica_reads
+async def page_detail_async(request, slug):
+    # Async counterpart of page_detail() for ASGI deployments
+    page = await _aget_page(slug=slug, is_public=True)
+    context = {
+        'page': page,
+        'navigation_pages': await aget_navigation(),
+        'gallery': await agallery_page(page.pk),
+    }
+    if slug == PRICING_PAGE_SLUG:
+        context['pricing_packages'] = [
+            package async for package in PricingPackage.objects.current_offers()
+        ]
+    return await sync_to_async(_render_page)(request, context)
+
+
+@replica_reads
+def page_gallery(request, slug):
+    # Further gallery tiles for infinite scroll, after the ``after`` cursor
+    page = get_object_or_404(Page.objects.only('id'), slug=slug, is_public=True)
+    try:
+        limit = min(int(request.GET.get('limit', GALLERY_PAGE_SIZE)), MAX_GALLERY_PAGE_SIZE)
+        data = gallery_page(page.pk, request.GET.get('after'), max(limit, 1))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid gallery cursor or limit.")
+    return tag_response(JsonResponse(data), [page_key(slug)])
+
+
+@replica_reads
+def package_download(request, version_id):
+    # Only approved versions are downloadable
+    version = get_object_or_404(PricingPackageVersion, id=version_id, approved=True)
+    if version.sha256:
+        etag = '"%s"' % version.sha256
+    else:
+        # Not hashed yet (e.g. uploaded before hashing was introduced): the
+        # job does it rather than this request
+        enqueue('hash_package_version', key=f'hash:{version.pk}', version_id=version.pk)
+        etag = weak_etag(version.file)
+    response = serve_file(
+        request, version.file,
+        etag=etag,
+        last_modified=version.approved_at or version.uploaded_at,
+    )
+    return tag_response(response, [package_key(version.pricing_package_id)])
+
+
+@replica_reads
+def search(request):
+    # Ranked against the precomputed full-text index, never the raw HTML
+    query = request.GET.get('q', '').strip()[:200]
+    results = search_pages(query) if query else []
+    return render(request, 'cms/search.html', {'query': query, 'results': results})
+
+
+def metrics(request):
+    # Admin users, or a scraper presenting CMS_METRICS_TOKEN as a bearer token
+    token = getattr(settings, 'CMS_METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())):
+        if not apps.is_installed('django.contrib.admin'):
+            # Public-only nodes have no sessions to recognise staff by
+            return HttpResponseForbidden("Metrics need the bearer token on this node.")
+        # Imported here: it loads the whole admin, which public-only nodes leave out
+        from django.contrib.admin.views.decorators import staff_member_required
+
+        return staff_member_required(_metrics)(request)
+    return _metrics(request)
+
+
+def _metrics(request):
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
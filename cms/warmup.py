@@ -0,0 +1,88 @@
+# cms/warmup.py
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .cache import HOME_PAGE_SLUG, PRICING_PAGE_SLUG
+from .export import _get_handler, default_host
+from .models import Page
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'venuenouveau-warm-cache'
+
+
+def page_urls(slugs):
+    return [
+        reverse('cms:home') if slug == HOME_PAGE_SLUG else reverse('cms:page_detail', args=[slug])
+        for slug in slugs
+    ]
+
+
+def warm_targets():
+    """
+    URLs of the site root, the pricing page and every other public page,
+    most expensive first.
+    """
+    slugs = list(Page.objects.filter(is_public=True).order_by('pk').values_list('slug', flat=True))
+    urls = page_urls([PRICING_PAGE_SLUG]) if PRICING_PAGE_SLUG in slugs else []
+    # The root serves the home page whether or not it is public
+    urls += page_urls([HOME_PAGE_SLUG])
+    urls += page_urls(slug for slug in slugs if slug not in (PRICING_PAGE_SLUG, HOME_PAGE_SLUG))
+    return urls
+
+
+def _render(url, host):
+    # Rendered here, through the full middleware stack; the page cache
+    # stores the response in the shared cache on the way out.
+    return _get_handler().get_response(RequestFactory(SERVER_NAME=host).get(url)).status_code
+
+
+def _render_in_thread(url, host):
+    try:
+        return _render(url, host)
+    finally:
+        # Each pool thread has its own connection
+        connection.close()
+
+
+def _fetch(url, base_url):
+    request = Request(base_url.rstrip('/') + url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status
+    except HTTPError as e:
+        return e.code
+    except URLError as e:
+        logger.warning("Could not warm %s: %s", url, e.reason)
+        return None
+
+
+def warm_cache(urls=None, workers=4, base_url=None, host=None):
+    """
+    Requests ``urls`` (by default ``warm_targets()``), ``workers`` at a
+    time, so their responses are cached before visitors ask for them.
+
+    Without ``base_url`` the pages are rendered in this process into the
+    shared cache. With it they are requested over HTTP from a running
+    server, which also fills the edge cache and the memo of whichever
+    worker answers. Returns {url: HTTP status, or None if unreachable}.
+    """
+    urls = warm_targets() if urls is None else list(urls)
+    if base_url:
+        fetch, args = _fetch, [base_url] * len(urls)
+    else:
+        host = host or default_host()
+        fetch, args = (_render if workers == 1 else _render_in_thread), [host] * len(urls)
+    if workers == 1 or len(urls) < 2:
+        statuses = map(fetch, urls, args)
+        return dict(zip(urls, statuses))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cms-warm') as pool:
+        return dict(zip(urls, pool.map(fetch, urls, args)))
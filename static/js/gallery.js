@@ -0,0 +1,96 @@
+// Infinite scroll for the page gallery: fetches the next page of tiles from
+// the JSON endpoint (or static export file) in data-next when the end of the
+// grid comes into view.
+(function () {
+    'use strict';
+
+    var grid = document.querySelector('.gallery-grid[data-next]');
+    if (!grid || !('IntersectionObserver' in window)) {
+        return;
+    }
+
+    function element(tag, attributes) {
+        var node = document.createElement(tag);
+        Object.keys(attributes).forEach(function (name) {
+            if (attributes[name] !== null && attributes[name] !== '') {
+                node.setAttribute(name, attributes[name]);
+            }
+        });
+        return node;
+    }
+
+    function tile(item, sizes) {
+        var li = element('li', {'class': 'gallery-item'});
+        var link = element('a', {href: item.full});
+        if (item.thumbnail) {
+            var picture = document.createElement('picture');
+            item.sources.forEach(function (source) {
+                picture.appendChild(element('source', {type: source.type, srcset: source.srcset, sizes: sizes}));
+            });
+            picture.appendChild(element('img', {
+                src: item.thumbnail,
+                srcset: item.srcset,
+                sizes: item.srcset ? sizes : null,
+                width: item.width,
+                height: item.height,
+                alt: item.caption,
+                loading: 'lazy',
+                decoding: 'async'
+            }));
+            link.appendChild(picture);
+        } else {
+            link.textContent = item.caption || 'Download';
+        }
+        li.appendChild(link);
+        if (item.caption) {
+            var caption = element('p', {'class': 'gallery-caption'});
+            caption.textContent = item.caption;
+            li.appendChild(caption);
+        }
+        return li;
+    }
+
+    var sentinel = document.createElement('li');
+    sentinel.className = 'gallery-sentinel';
+    grid.appendChild(sentinel);
+
+    var loading = false;
+    var observer = new IntersectionObserver(function (entries) {
+        var next = grid.getAttribute('data-next');
+        if (loading || !next || !entries.some(function (e) { return e.isIntersecting; })) {
+            return;
+        }
+        loading = true;
+        fetch(next, {headers: {Accept: 'application/json'}})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                data.items.forEach(function (item) {
+                    grid.insertBefore(tile(item, data.sizes), sentinel);
+                });
+                if (data.next) {
+                    // Static exports link their pre-written JSON files instead
+                    var url = data.next_url || next.split('?')[0] + '?after=' + encodeURIComponent(data.next);
+                    grid.setAttribute('data-next', url);
+                    // Re-observing reports the sentinel again if it is still in view
+                    observer.unobserve(sentinel);
+                    observer.observe(sentinel);
+                } else {
+                    grid.removeAttribute('data-next');
+                    observer.disconnect();
+                    sentinel.remove();
+                }
+            })
+            .catch(function () {
+                observer.disconnect();
+            })
+            .then(function () {
+                loading = false;
+            });
+    }, {rootMargin: '800px 0px'});
+    observer.observe(sentinel);
+}());
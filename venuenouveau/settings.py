@@ -41,7 +41,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cms.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'cms.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,23 +73,82 @@ TEMPLATES = [
 
 
 
+# Public-only nodes (CMS_PUBLIC_ONLY=1) serve the public CMS URLs alone,
+# without the admin and the apps and middleware only it needs, so they boot
+# faster. Staff reach the admin through the full profile on other nodes.
+CMS_PUBLIC_ONLY = os.environ.get('CMS_PUBLIC_ONLY') == '1'
+
+if CMS_PUBLIC_ONLY:
+    STAFF_ONLY = (
+        'django.contrib.admin', 'django.contrib.auth', 'django.contrib.sessions', 'django.contrib.messages',
+    )
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in STAFF_ONLY]
+    MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith(STAFF_ONLY)]
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        name for name in TEMPLATES[0]['OPTIONS']['context_processors'] if not name.startswith(STAFF_ONLY)
+    ]
+    ROOT_URLCONF = 'venuenouveau.urls_public'
+
 WSGI_APPLICATION = 'venuenouveau.wsgi.application'
 
+# Serve public CMS pages from async views (set by asgi.py)
+CMS_ASYNC_VIEWS = os.environ.get('CMS_ASYNC_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'vennew',         # The name you chose in PGAdmin 4
-        'USER': 'postgres',    # Your PostgreSQL username
-        'PASSWORD': 'Cr33pm05531',  # Your PostgreSQL password
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.environ.get('DB_NAME', 'vennew'),         # The name you chose in PGAdmin 4
+        'USER': os.environ.get('DB_USER', 'postgres'),    # Your PostgreSQL username
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'Cr33pm05531'),  # Your PostgreSQL password
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Seconds a connection is reused across requests (0 closes it after each)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# DB_POOL=1 uses psycopg's connection pool instead of persistent connections
+# (needs psycopg[pool]); it also suits ASGI, where connections are not reused.
+if os.environ.get('DB_POOL') == '1' and DATABASES['default']['ENGINE'].endswith('postgresql'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {'pool': {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': 10,
+    }}
+
+# A read replica for public pages (see cms/routers.py), given by host (same
+# credentials) or, for SQLite stand-ins, by DB_REPLICA_NAME.
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        # Tests never see replication: a replica of the primary's database
+        # reads the primary's test database, while a separately named one
+        # gets a test database of its own, which the routing tests fill.
+        'TEST': {} if os.environ.get('DB_REPLICA_NAME') else {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['cms.routers.ReplicaRouter']
+
+# Cache for pages, the menu and their version counters, which every worker
+# process and host must share (e.g. CACHE_URL=redis://cache:6379/1); the
+# local-memory default only suits a single process.
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -125,10 +186,87 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+STATICFILES_DIRS = [
+    BASE_DIR / 'static',
+    ('scraped', BASE_DIR / 'scraped'),
+]
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+if not DEBUG:
+    # Long-cache fingerprinted names; run build_css_bundles before collectstatic
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'cms.storage.FingerprintedStaticFilesStorage'},
+    }
+
+# Scraped per-page CSS and the bundles built from it (see cms/assets.py)
+CMS_CSS_SOURCE_DIR = BASE_DIR / 'scraped' / 'css'
+CMS_CSS_BUNDLE_DIR = BASE_DIR / 'static' / 'bundles'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'  # Ensure this directory exists and is writable
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'  # Ensure this directory exists and is writable
+
+# Responsive image derivatives (see cms/images.py)
+CMS_IMAGE_BREAKPOINTS = (480, 768, 1200, 1920)
+
+# Pricing package downloads (see cms/downloads.py). Set CMS_SENDFILE_BACKEND
+# to 'nginx' (X-Accel-Redirect) or 'x-sendfile' to let the front-end server
+# send the file; nginx needs an internal location at CMS_SENDFILE_URL_PREFIX
+# aliased to MEDIA_ROOT.
+CMS_SENDFILE_BACKEND = os.environ.get('CMS_SENDFILE_BACKEND') or None
+CMS_SENDFILE_URL_PREFIX = '/protected-media/'
+CMS_DOWNLOAD_MAX_AGE = 60 * 60 * 24
+
+# Compression (see cms/compression.py and cms/middleware.py). Static files are
+# precompressed at collectstatic; set CMS_SERVE_STATIC to serve STATIC_ROOT
+# through Django when no front-end server does it.
+CMS_COMPRESS_MIN_SIZE = 1024
+CMS_SERVE_STATIC = os.environ.get('CMS_SERVE_STATIC') == '1'
+
+# Static export of the public site (see cms/export.py); nginx serves this
+# directory and proxies only /admin/ to Django.
+CMS_EXPORT_DIR = BASE_DIR / 'export'
+
+# Request instrumentation (see cms/metrics.py). Histograms are exported at
+# /cms/metrics/ to staff users, or to scrapers sending CMS_METRICS_TOKEN as a
+# bearer token; CMS_SERVER_TIMING adds a Server-Timing header to responses.
+CMS_SERVER_TIMING = os.environ.get('CMS_SERVER_TIMING') == '1'
+CMS_METRICS_TOKEN = os.environ.get('CMS_METRICS_TOKEN') or None
+
+# Edge caching (see cms/edge.py). Responses carry Surrogate-Key tags and may
+# be kept by a CDN or Varnish for CMS_EDGE_MAX_AGE seconds; edits purge the
+# affected keys. Set CMS_EDGE_PURGE_BACKEND to 'cms.edge.HTTPPurgeBackend'
+# and list the proxies in CMS_EDGE_PURGE_URLS (comma-separated) to enable it.
+CMS_EDGE_MAX_AGE = 60 * 60 * 6
+CMS_EDGE_PURGE_BACKEND = os.environ.get('CMS_EDGE_PURGE_BACKEND') or None
+CMS_EDGE_PURGE_URLS = [url for url in os.environ.get('CMS_EDGE_PURGE_URLS', '').split(',') if url]
+
+# Background jobs (see cms/jobs.py), run by `manage.py run_jobs`. Failed jobs
+# are retried CMS_JOB_MAX_ATTEMPTS times, CMS_JOB_BACKOFF seconds apart at
+# first and doubling after. CMS_JOBS_EAGER runs them in-process after commit
+# instead. CMS_UPLOAD_SCANNERS lists dotted paths of upload scanner callables
+# (see cms/tasks.py), e.g. a ClamAV client.
+CMS_JOB_MAX_ATTEMPTS = 5
+CMS_JOB_BACKOFF = 10
+CMS_JOBS_EAGER = os.environ.get('CMS_JOBS_EAGER') == '1'
+CMS_UPLOAD_SCANNERS = []
+
+# Public reads stay on the primary this many seconds after a CMS write, to
+# cover replication lag (see cms/routers.py).
+CMS_REPLICA_LAG = 10
+
+# Page bodies are sanitised and pre-rendered on save (see cms/text.py);
+# after a pipeline change the render_pages job re-renders this many pages
+# per run.
+CMS_RENDER_BATCH_SIZE = 200
+
+# Rendered pages each process keeps in memory on top of the shared cache
+# (see cms/cache.py). manage.py warm_cache fills the cache after a deploy;
+# approvals queue a warm_pages job for the pricing page.
+CMS_LOCAL_PAGE_CACHE_SIZE = 64
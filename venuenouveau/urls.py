@@ -15,13 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.conf import settings
-from django.conf.urls.static import static
-from django.urls import path, include
-from django.shortcuts import redirect
-from cms import admin as cms_admin
+from django.urls import path
 
+from .urls_public import urlpatterns as public_urlpatterns
+
+# The admin registers cms.admin through autodiscovery
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('cms/', include(('cms.urls', 'cms'), namespace='cms')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+] + public_urlpatterns
@@ -0,0 +1,22 @@
+"""
+URL configuration of public-only nodes (CMS_PUBLIC_ONLY=1): the CMS pages,
+media and, with CMS_SERVE_STATIC, static files, without the admin.
+venuenouveau/urls.py adds the admin to these for the full profile.
+"""
+import re
+
+from django.conf import settings
+from django.conf.urls.static import static
+from django.urls import path, include, re_path
+from cms.compression import serve_precompressed
+
+urlpatterns = [
+    path('cms/', include(('cms.urls', 'cms'), namespace='cms')),
+] + static(settings.MEDIA_URL, serve_precompressed, document_root=settings.MEDIA_ROOT)
+
+if settings.CMS_SERVE_STATIC:
+    # Unlike static(), also active with DEBUG off
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')),
+                serve_precompressed, {'document_root': settings.STATIC_ROOT}),
+    ]